@@ -0,0 +1,1198 @@
+'''
+This script runs one or more datasets through the Pipeline with
+a pre-determined set of pre-processing and post-processing functions.
+
+Every dataset is configured by its own section of `parameters.json`.
+When several datasets are requested, they run in the same process and
+share the loaded spaCy model and a single worker pool.
+
+Example:
+    python dataset_runner.py sst socc --ngram_context_sizes 1,2,3
+'''
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import json
+import math
+from multiprocessing import Process
+import os
+import random
+from typing import List, Optional, Tuple
+from pipeline import DEFAULT_OUTPUT_NAME, DEFAULT_PROFILE_DIRECTORY, FeatureOutput, Pipeline, create_worker_pool
+from processing_functions import hashed_ngram_extraction, ngram_generation, text_preprocessing as tp, vector_extraction
+from processing_functions.vector_extraction import DocVectorStore
+from utilities.database_utilities import PartitionedTableSaver, RangeReader, TableSaver, create_joined_view, get_saved_size, load_df, load_df_range, load_index_ranges, load_index_values, load_joined_df, open_connection, remove_existing_table, table_exists
+from utilities.estimation_utilities import DEFAULT_BATCH_MEMORY_MB, DEFAULT_SAMPLE_SIZE, RunEstimate, get_estimate_report
+from utilities.import_utilities import lazy_import
+from utilities.join_utilities import join_by_index
+from utilities.sharding_utilities import get_shard_ranges, get_shard_table_name, merge_shards
+from utilities.spacy_utilities import Spacy_Manager
+from utilities.input_validation_utilities import parse_window_sizes, validate_spacy_pos
+from utilities.logging_utilities import get_fn_name
+from utilities.watermark_utilities import get_config_fingerprint, load_watermark, remove_watermark, save_watermark
+
+DEFAULT_PARAMETERS_PATH = './parameters.json'
+DEFAULT_MAX_CONCURRENT_DATASETS = 2
+# `batch_size` value that chooses the batch size from a sample; see `_resolve_batch_size`.
+AUTO_BATCH_SIZE = 'auto'
+# Consecutive rows read together when sampling a table; see `load_sample`.
+SAMPLE_BLOCK_SIZE = 20
+QUARANTINE_TABLE_SUFFIX = 'quarantine'
+METADATA_TABLE_SUFFIX = 'metadata'
+METADATA_VIEW_SUFFIX = '_with_metadata'
+PRE_EXTRACTION_FNS = [
+    tp.remove_punctuation,
+    tp.lowercase_words,
+    tp.normalize_spacing
+]
+
+pd = lazy_import('pandas')
+
+
+def load_parameters(parameters_path: str = DEFAULT_PARAMETERS_PATH) -> dict:
+    with open(parameters_path) as params_fp:
+        return json.load(params_fp)
+
+def get_output_table_names(dataset_params: dict, window_lens: List[int], use_pos_filtering: bool) -> dict:
+    '''
+    Returns a dictionary mapping each ngram context size to the name
+    of its output table.
+    '''
+    output_table_names = dict()
+    for window_len in window_lens:
+        output_table_name = f'{dataset_params["output_table_prefix"]}{window_len}'
+        if use_pos_filtering: output_table_name = f'{output_table_name}_pos-filter'
+        output_table_names[window_len] = output_table_name
+    return output_table_names
+
+def run_dataset(
+    dataset_name: str,
+    params: dict,
+    window_lens: List[int],
+    use_pos_filtering: bool,
+    pool=None,
+    shared_database: bool = False,
+    shard: Optional[Tuple[int, int, int]] = None,
+    incremental: bool = False,
+    doc_vectors_dir: Optional[str] = None,
+    vector_dtype: str = 'float32'):
+    '''
+    Runs a single dataset, described by `params[dataset_name]`, through
+    the Pipeline. Existing output tables are replaced.
+
+    If `doc_vectors_dir` is provided, document vectors (see
+    `run_dataset_doc_vectors`) are written to `doc_vectors_dir/dataset_name`
+    in the same pass, from the same parsed Docs as the ngrams.
+
+    If `incremental` is True and the output tables were last written with the
+    same settings, only input rows appended since then are processed and their
+    ngrams are appended to the existing tables (see `_get_incremental_start`).
+    Otherwise, the output tables are rebuilt.
+
+    `pool` is an optional worker pool shared with other datasets. Set
+    `shared_database` when other datasets use the same database concurrently.
+
+    `shard` is an optional `(shard_id, num_shards, max_index)` tuple. When
+    provided, only the shard's index range of the input table is processed and
+    the output is written to shard tables, which `merge_dataset_shards`
+    combines afterwards. Every shard of a run must use the same `max_index`
+    (see `get_shard_ranges`), so the ranges do not move if rows are appended
+    between shards.
+    '''
+    params = _resolve_batch_size(dataset_name, params, window_lens, use_pos_filtering)
+    dataset_params = params[dataset_name]
+    batch_size = params['batch_size']
+    if doc_vectors_dir is not None and (incremental or shard is not None):
+        raise ValueError('Document vectors are not supported by incremental or sharded runs.')
+
+    database_path = dataset_params['database_path']
+    table_name = dataset_params['text_table_name']
+    text_column_name = dataset_params['text_column_name']
+
+    pos_filter = dataset_params['pos_filter_list']
+    validate_spacy_pos(pos_filter)
+
+    output_table_names = get_output_table_names(dataset_params, window_lens, use_pos_filtering)
+    if shard is not None:
+        shard_id, num_shards, shard_max_index = shard
+        output_table_names = {
+            k: get_shard_table_name(v, shard_id, num_shards)
+            for k, v in output_table_names.items()
+        }
+
+    # Settings that change the output; see `_get_incremental_start`.
+    table_saver_kwargs = _get_table_saver_kwargs(dataset_params, params)
+    extraction_kwargs = _get_extraction_kwargs(dataset_params, use_pos_filtering, table_saver_kwargs)
+    segmentation_kwargs = _get_segmentation_kwargs(params, window_lens)
+    if doc_vectors_dir is not None and len(segmentation_kwargs) > 0:
+        print('Long text segmentation is not supported with document vectors. Texts will not be segmented.')
+        segmentation_kwargs = dict()
+    config_fingerprints = {
+        window_len: _get_config_fingerprint(dataset_params, window_len, extraction_kwargs, table_saver_kwargs, segmentation_kwargs)
+        for window_len in window_lens
+    }
+
+    # Rows that fail feature extraction; see `_create_quarantine_saver`.
+    quarantine_table_name = f'{dataset_params["output_table_prefix"]}{QUARANTINE_TABLE_SUFFIX}'
+    # Each row's metadata, when stored once per row; see `_normalizes_metadata`.
+    metadata_table_name = get_metadata_table_name(dataset_params)
+    if shard is not None:
+        quarantine_table_name = get_shard_table_name(quarantine_table_name, shard_id, num_shards)
+        metadata_table_name = get_shard_table_name(metadata_table_name, shard_id, num_shards)
+    companion_table_names = [metadata_table_name] if _normalizes_metadata(dataset_params) else []
+
+    conn = open_connection(database_path, shared=shared_database)
+    # Only unsharded runs track watermarks.
+    incremental_start = None
+    if incremental and shard is None:
+        incremental_start = _get_incremental_start(
+            conn, table_name, output_table_names, config_fingerprints, companion_table_names, quarantine_table_name)
+
+    # Remove pre-existing tables if necessary.
+    if incremental_start is None:
+        for output_table_name in output_table_names.values():
+            remove_existing_table(output_table_name, conn)
+            remove_watermark(conn, output_table_name)
+        remove_existing_table(quarantine_table_name, conn)
+        for companion_table_name in companion_table_names:
+            remove_existing_table(companion_table_name, conn)
+
+    # Logging
+    log_dict = dict()
+    log_dict['Pipeline Input'] = {
+        'Dataset': dataset_name,
+        'Database Path': database_path,
+        'Table Name': table_name,
+        'Include PoS Filtering': use_pos_filtering
+    }
+    log_dict['ngram Size'] = ', '.join(str(w) for w in window_lens)
+
+    log_dict['Pipeline Output'] = {
+        'Table Name': ', '.join(output_table_names.values())
+    }
+    feature_outputs = dict()
+    if doc_vectors_dir is not None:
+        dataset_output_dir = os.path.join(doc_vectors_dir, dataset_name)
+        feature_outputs['doc_vectors'] = _create_doc_vector_output(
+            dataset_params, conn, dataset_output_dir, window_lens[0], use_pos_filtering, False, vector_dtype)
+        log_dict['Pipeline Output']['Vector Directory'] = dataset_output_dir
+        log_dict['Pipeline Output']['Vector Type'] = vector_dtype
+
+    run_name = ', '.join(output_table_names.values())
+
+    # Get data iterator. A shared database is read through its own connection,
+    # since a connection holding an open read snapshot cannot write once another
+    # connection has written to the database.
+    read_conn = open_connection(database_path, shared=True) if shared_database else conn
+    start_index, end_index = None, None
+    max_input_index = None
+    output_start_indices = None
+    companion_start_indices = {t: 0 for t in companion_table_names}
+    if shard is not None:
+        start_index, end_index = get_shard_ranges(read_conn, table_name, num_shards, shard_max_index)[shard_id]
+        log_dict['Pipeline Input']['Index Range'] = f'[{start_index}, {end_index})'
+    else:
+        # Rows appended while the Pipeline runs are left for the next incremental run.
+        max_input_index = _get_max_index(read_conn, table_name)
+        if max_input_index is not None: end_index = max_input_index + 1
+        if incremental_start is not None:
+            start_index, output_start_indices, companion_start_indices = incremental_start
+            log_dict['Pipeline Input']['Index Range'] = f'[{start_index}, {end_index})'
+            if max_input_index is None or max_input_index < start_index:
+                print(f'{dataset_name} has no new rows since its last run.')
+                if read_conn is not conn: read_conn.close()
+                conn.close()
+                return
+    sql_iter, additional_iters, additional_conns, input_reader = _load_input(
+        dataset_params, read_conn, batch_size, start_index, end_index, log_dict, _get_ranges_per_chunk(params))
+
+    # Call Pipeline with data and processing functions.
+    if shard is not None:
+        # Shard tables are only read back by `merge_dataset_shards`, which builds the indexes.
+        table_saver_kwargs = dict()
+
+    ngram_extraction_fn = _create_ngram_extraction_fn(text_column_name, window_lens, extraction_kwargs)
+
+    partitioned_save_fn = PartitionedTableSaver(
+        conn,
+        output_table_names,
+        ngram_generation.WINDOW_SIZE_COLUMN_NAME,
+        start_indices=output_start_indices,
+        **table_saver_kwargs)
+    if _normalizes_metadata(dataset_params):
+        feature_outputs['metadata'] = _create_metadata_output(
+            dataset_params, conn, metadata_table_name, companion_start_indices[metadata_table_name], shard is None)
+        log_dict['Pipeline Output']['Metadata Table Name'] = metadata_table_name
+
+    p = _create_pipeline(
+        dataset_params,
+        params,
+        partitioned_save_fn,
+        ngram_extraction_fn,
+        'ngram',
+        pool,
+        log_dict,
+        run_name,
+        feature_outputs,
+        _create_quarantine_saver(conn, quarantine_table_name, params),
+        input_reader,
+        segmentation_kwargs)
+    p.start(sql_iter, additional_iters)
+
+    if shard is None and max_input_index is not None:
+        for window_len, output_table_name in output_table_names.items():
+            save_watermark(conn, output_table_name, table_name, max_input_index, config_fingerprints[window_len])
+    if shard is None and _normalizes_metadata(dataset_params):
+        _create_metadata_views(conn, output_table_names, metadata_table_name)
+
+    for additional_conn in additional_conns: additional_conn.close()
+    if read_conn is not conn: read_conn.close()
+    conn.close()
+
+def _get_extraction_kwargs(dataset_params: dict, use_pos_filtering: bool, table_saver_kwargs: dict) -> dict:
+    '''
+    Returns the dataset's `generate_corpus_ngrams` settings.
+    '''
+    extraction_kwargs = dict()
+    # Normalized metadata is saved to its own table instead; see `_create_metadata_output`.
+    if 'include_metadata' in dataset_params and not _normalizes_metadata(dataset_params):
+        extraction_kwargs['include_metadata'] = dataset_params['include_metadata']
+    if 'include_pos' in dataset_params:
+        extraction_kwargs['include_pos'] = dataset_params['include_pos']
+    if use_pos_filtering:
+        extraction_kwargs['pos_filter'] = dataset_params['pos_filter_list']
+    if table_saver_kwargs['clustered']:
+        # The clustered layout is keyed by each ngram's position.
+        extraction_kwargs['include_position'] = True
+    return extraction_kwargs
+
+def _normalizes_metadata(dataset_params: dict) -> bool:
+    '''
+    Returns whether the dataset's `include_metadata` columns are saved once
+    per input row, to its metadata table, instead of with every ngram.
+    '''
+    if 'normalize_metadata' not in dataset_params or not dataset_params['normalize_metadata']:
+        return False
+    return 'include_metadata' in dataset_params and dataset_params['include_metadata'] not in (False, [])
+
+def get_metadata_table_name(dataset_params: dict) -> str:
+    return f'{dataset_params["output_table_prefix"]}{METADATA_TABLE_SUFFIX}'
+
+def _create_metadata_output(dataset_params: dict, conn, metadata_table_name: str, start_index: int, create_indexes: bool) -> FeatureOutput:
+    '''
+    Returns the `FeatureOutput` that saves the `include_metadata` columns
+    of every input row, keyed by `sent_id`, to `metadata_table_name` (see
+    `ngram_generation.generate_corpus_metadata`).
+    '''
+    metadata_saver = TableSaver(
+        conn, metadata_table_name, indexes=['sent_id'] if create_indexes else [], start_index=start_index)
+    return FeatureOutput(_create_metadata_fn(dataset_params), metadata_saver)
+
+def _create_metadata_fn(dataset_params: dict):
+    metadata_fn = partial(
+        ngram_generation.generate_corpus_metadata,
+        col_name=f'{dataset_params["text_column_name"]}_spdocs',
+        include_metadata=dataset_params['include_metadata'])
+    metadata_fn.__name__ = ngram_generation.generate_corpus_metadata.__name__
+    return metadata_fn
+
+def _create_metadata_views(conn, output_table_names: dict, metadata_table_name: str):
+    '''
+    Creates a `{output_table_name}_with_metadata` view for every output
+    table, which joins each ngram to its row's metadata as the output
+    table would hold it without `normalize_metadata`.
+    '''
+    if not table_exists(conn, metadata_table_name): return
+    for output_table_name in output_table_names.values():
+        create_joined_view(conn, f'{output_table_name}{METADATA_VIEW_SUFFIX}', output_table_name, metadata_table_name)
+
+def _create_ngram_extraction_fn(text_column_name: str, window_lens: List[int], extraction_kwargs: dict):
+    ngram_extraction_fn = partial(
+        ngram_generation.generate_corpus_ngrams,
+        col_name=f'{text_column_name}_spdocs',
+        n=window_lens,
+        **extraction_kwargs)
+    ngram_extraction_fn.__name__ = ngram_generation.generate_corpus_ngrams.__name__
+    return ngram_extraction_fn
+
+def _get_config_fingerprint(
+    dataset_params: dict,
+    window_len: int,
+    extraction_kwargs: dict,
+    table_saver_kwargs: dict,
+    segmentation_kwargs: Optional[dict] = None) -> str:
+    '''
+    Returns a fingerprint of every setting that changes an output table's contents.
+    '''
+    config = {
+        'text_column_name': dataset_params['text_column_name'],
+        'additional_tables': dataset_params['additional_tables'] if 'additional_tables' in dataset_params else [],
+        'n': window_len,
+        'model': Spacy_Manager.get_model_name(),
+        'pre_extraction_fns': [get_fn_name(f) for f in PRE_EXTRACTION_FNS],
+        'extraction_kwargs': extraction_kwargs,
+        'clustered': table_saver_kwargs['clustered'],
+    }
+    # Only included when set, so tables written before these settings existed keep their fingerprint.
+    if segmentation_kwargs: config['segmentation'] = segmentation_kwargs
+    if _normalizes_metadata(dataset_params): config['metadata_table'] = dataset_params['include_metadata']
+    return get_config_fingerprint(config)
+
+def _get_incremental_start(
+    conn,
+    input_table_name: str,
+    output_table_names: dict,
+    config_fingerprints: dict,
+    companion_table_names: List[str] = [],
+    quarantine_table_name: Optional[str] = None):
+    '''
+    Returns where an incremental run continues from: the first input index
+    to read and, for each output table and each of the
+    `companion_table_names` (tables keyed by `sent_id` that are written
+    alongside the output tables, e.g. the metadata table), the index its
+    new rows start at.
+
+    Returns None (so the output tables are rebuilt) unless every output table
+    exists and has a watermark for `input_table_name` with the same settings.
+    Output rows of input rows beyond the watermark (left by a run that did
+    not complete) are deleted first, as are the rows of the quarantine table
+    `quarantine_table_name` (keyed by input index) beyond it.
+    '''
+    watermarks = dict()
+    for window_len, output_table_name in output_table_names.items():
+        watermark = load_watermark(conn, output_table_name)
+        if not table_exists(conn, output_table_name) or watermark is None:
+            print(f'{output_table_name} has no watermark. Rebuilding the output tables.')
+            return None
+        if watermark['input_table_name'] != input_table_name or watermark['config_fingerprint'] != config_fingerprints[window_len]:
+            print(f'The settings of {output_table_name} have changed. Rebuilding the output tables.')
+            return None
+        watermarks[window_len] = watermark['max_input_index']
+
+    if len(set(watermarks.values())) != 1:
+        print('The output tables have different watermarks. Rebuilding the output tables.')
+        return None
+    max_input_index = next(iter(watermarks.values()))
+
+    output_start_indices = dict()
+    for window_len, output_table_name in output_table_names.items():
+        output_start_indices[window_len] = _truncate_to_watermark(conn, output_table_name, max_input_index)
+    companion_start_indices = dict()
+    for companion_table_name in companion_table_names:
+        companion_start_indices[companion_table_name] = _truncate_to_watermark(conn, companion_table_name, max_input_index)
+    if quarantine_table_name is not None:
+        _truncate_to_watermark(conn, quarantine_table_name, max_input_index, key_col='index')
+    conn.commit()
+
+    return max_input_index + 1, output_start_indices, companion_start_indices
+
+def _truncate_to_watermark(conn, table_name: str, max_input_index: int, key_col: str = 'sent_id') -> int:
+    '''
+    Deletes the rows of `table_name` whose input index (in column `key_col`)
+    is beyond the watermark and returns the index its next row starts at.
+    '''
+    if not table_exists(conn, table_name): return 0
+    conn.execute('DELETE FROM "{}" WHERE "{}" > ?'.format(table_name, key_col), (max_input_index,))
+    max_output_index = _get_max_index(conn, table_name)
+    return max_output_index + 1 if max_output_index is not None else 0
+
+def _get_max_index(conn, table_name: str, index_col: str = 'index'):
+    return conn.execute('SELECT MAX("{}") FROM "{}"'.format(index_col, table_name)).fetchone()[0]
+
+def run_dataset_doc_vectors(
+    dataset_name: str,
+    params: dict,
+    output_dir: str,
+    window_len: int,
+    use_pos_filtering: bool,
+    include_ngram_vectors: bool = False,
+    vector_dtype: str = 'float32',
+    pool=None):
+    '''
+    Runs a single dataset through the Pipeline, writing a document vector
+    for every row (and, optionally, the mean vector of each ngram window
+    of size 2 * `window_len` + 1) to memory-mapped `.npy` files in
+    `output_dir/dataset_name`. See `vector_extraction.DocVectorStore`.
+    '''
+    params = _resolve_batch_size(dataset_name, params, [window_len], use_pos_filtering)
+    dataset_params = params[dataset_name]
+    database_path = dataset_params['database_path']
+    table_name = dataset_params['text_table_name']
+
+    dataset_output_dir = os.path.join(output_dir, dataset_name)
+    conn = open_connection(database_path)
+    vector_output = _create_doc_vector_output(
+        dataset_params, conn, dataset_output_dir, window_len, use_pos_filtering, include_ngram_vectors, vector_dtype)
+
+    # Logging
+    log_dict = dict()
+    log_dict['Pipeline Input'] = {
+        'Dataset': dataset_name,
+        'Database Path': database_path,
+        'Table Name': table_name,
+        'Include PoS Filtering': use_pos_filtering
+    }
+    log_dict['ngram Size'] = f'{window_len}' if include_ngram_vectors else 'None'
+    log_dict['Pipeline Output'] = {
+        'Vector Directory': dataset_output_dir,
+        'Vector Type': vector_dtype
+    }
+    run_name = f'{dataset_name}_doc-vectors'
+
+    sql_iter, additional_iters, additional_conns, input_reader = _load_input(
+        dataset_params, conn, params['batch_size'], None, None, log_dict, _get_ranges_per_chunk(params))
+
+    p = _create_pipeline(
+        dataset_params,
+        params,
+        vector_output.data_save_fn,
+        vector_output.feature_extraction_fn,
+        vector_output.column_name,
+        pool,
+        log_dict,
+        run_name,
+        input_reader=input_reader)
+    p.start(sql_iter, additional_iters)
+
+    for additional_conn in additional_conns: additional_conn.close()
+    conn.close()
+
+def run_dataset_hashed_ngrams(
+    dataset_name: str,
+    params: dict,
+    output_dir: str,
+    window_lens: List[int],
+    use_pos_filtering: bool,
+    pool=None):
+    '''
+    Runs a single dataset through the Pipeline, writing the hashed ngram
+    windows of every row as sparse CSR shards (`.npz`) to
+    `output_dir/dataset_name`. See `hashed_ngram_extraction`.
+
+    The number of hashed features is set by `hashed_num_features` in
+    `params`, and the dataset's `include_pos` setting hashes each window
+    with the part-of-speech of its central word.
+    '''
+    params = _resolve_batch_size(dataset_name, params, window_lens, use_pos_filtering)
+    dataset_params = params[dataset_name]
+    database_path = dataset_params['database_path']
+    table_name = dataset_params['text_table_name']
+    text_column_name = dataset_params['text_column_name']
+
+    pos_filter = dataset_params['pos_filter_list']
+    validate_spacy_pos(pos_filter)
+
+    dataset_output_dir = os.path.join(output_dir, dataset_name)
+    num_features = params['hashed_num_features'] if 'hashed_num_features' in params else hashed_ngram_extraction.DEFAULT_NUM_FEATURES
+    conn = open_connection(database_path)
+    store = hashed_ngram_extraction.HashedNgramStore(dataset_output_dir)
+
+    # Logging
+    log_dict = dict()
+    log_dict['Pipeline Input'] = {
+        'Dataset': dataset_name,
+        'Database Path': database_path,
+        'Table Name': table_name,
+        'Include PoS Filtering': use_pos_filtering
+    }
+    log_dict['ngram Size'] = ', '.join(str(w) for w in window_lens)
+    log_dict['Pipeline Output'] = {
+        'Shard Directory': dataset_output_dir,
+        'Number of Features': f'{num_features}'
+    }
+    run_name = f'{dataset_name}_hashed-ngrams'
+
+    sql_iter, additional_iters, additional_conns, input_reader = _load_input(
+        dataset_params, conn, params['batch_size'], None, None, log_dict, _get_ranges_per_chunk(params))
+
+    extraction_kwargs = dict()
+    if use_pos_filtering:
+        extraction_kwargs['pos_filter'] = pos_filter
+    if 'include_pos' in dataset_params:
+        extraction_kwargs['include_pos'] = dataset_params['include_pos']
+    hashed_extraction_fn = partial(
+        hashed_ngram_extraction.generate_corpus_hashed_ngrams,
+        col_name=f'{text_column_name}_spdocs',
+        output_dir=dataset_output_dir,
+        n=window_lens,
+        num_features=num_features,
+        **extraction_kwargs)
+    hashed_extraction_fn.__name__ = hashed_ngram_extraction.generate_corpus_hashed_ngrams.__name__
+
+    p = _create_pipeline(
+        dataset_params,
+        params,
+        store,
+        hashed_extraction_fn,
+        'num_windows',
+        pool,
+        log_dict,
+        run_name,
+        input_reader=input_reader)
+    p.start(sql_iter, additional_iters)
+
+    for additional_conn in additional_conns: additional_conn.close()
+    conn.close()
+
+def _create_doc_vector_output(
+    dataset_params: dict,
+    conn,
+    dataset_output_dir: str,
+    window_len: int,
+    use_pos_filtering: bool,
+    include_ngram_vectors: bool,
+    vector_dtype: str) -> FeatureOutput:
+    '''
+    Creates the `DocVectorStore` of a dataset in `dataset_output_dir` and
+    returns the Pipeline output that writes its document vectors.
+    '''
+    pos_filter = dataset_params['pos_filter_list']
+    validate_spacy_pos(pos_filter)
+
+    vector_store = DocVectorStore(
+        dataset_output_dir,
+        load_index_values(conn, dataset_params['text_table_name']),
+        Spacy_Manager.get_vector_size(),
+        dtype=vector_dtype)
+
+    extraction_kwargs = dict()
+    if use_pos_filtering:
+        extraction_kwargs['pos_filter'] = pos_filter
+    vector_extraction_fn = partial(
+        vector_extraction.generate_corpus_doc_vectors,
+        col_name=f'{dataset_params["text_column_name"]}_spdocs',
+        output_dir=dataset_output_dir,
+        include_ngram_vectors=include_ngram_vectors,
+        n=window_len,
+        **extraction_kwargs)
+    vector_extraction_fn.__name__ = vector_extraction.generate_corpus_doc_vectors.__name__
+
+    return FeatureOutput(vector_extraction_fn, vector_store, column_name='vector_row')
+
+def _load_input(
+    dataset_params: dict,
+    read_conn,
+    batch_size: int,
+    start_index,
+    end_index,
+    log_dict: dict,
+    ranges_per_chunk: Optional[int] = None):
+    '''
+    Returns the iterators of input DataFrames for a dataset (the text table
+    and any `additional_tables`), along with any extra connections opened
+    and the Pipeline's `input_reader` (None unless the workers read).
+
+    If `ranges_per_chunk` is provided, the workers read their own rows: the
+    input is an iterator of lists of `ranges_per_chunk` index ranges of
+    `batch_size` rows (see `database_utilities.load_index_ranges`), which a
+    `RangeReader` reads (and joins with the `additional_tables`) in each worker.
+    '''
+    database_path = dataset_params['database_path']
+    table_name = dataset_params['text_table_name']
+
+    additional_tables = dataset_params['additional_tables'] if 'additional_tables' in dataset_params else []
+    additional_conns = []
+    additional_iters = []
+    if ranges_per_chunk is not None:
+        if any(_get_table_database_path(t, database_path) != database_path for t in additional_tables):
+            raise ValueError('Workers can only read additional tables stored in the dataset\'s database.')
+        if len(additional_tables) > 0:
+            log_dict['Pipeline Input']['Joined Tables'] = [t['table_name'] for t in additional_tables]
+        range_iter = load_index_ranges(read_conn, table_name, batch_size, ranges_per_chunk, start_index, end_index)
+        input_reader = RangeReader(database_path, table_name, [t['table_name'] for t in additional_tables])
+        return range_iter, additional_iters, additional_conns, input_reader
+
+    if len(additional_tables) == 0:
+        if start_index is not None or end_index is not None:
+            sql_iter = load_df_range(read_conn, table_name, start_index, end_index, chunksize=batch_size)
+        else:
+            sql_iter = load_df(read_conn, table_name, chunksize=batch_size)
+    elif all(_get_table_database_path(t, database_path) == database_path for t in additional_tables):
+        # Every table lives in the same database, so the join runs in SQLite.
+        log_dict['Pipeline Input']['Joined Tables'] = [t['table_name'] for t in additional_tables]
+        sql_iter = load_joined_df(
+            read_conn,
+            table_name,
+            [t['table_name'] for t in additional_tables],
+            start_index,
+            end_index,
+            chunksize=batch_size)
+    else:
+        # Tables in other databases are streamed and joined by the Pipeline.
+        log_dict['Pipeline Input']['Joined Tables'] = [t['table_name'] for t in additional_tables]
+        sql_iter = load_df_range(read_conn, table_name, start_index, end_index, chunksize=batch_size)
+        for additional_table in additional_tables:
+            additional_conn = open_connection(_get_table_database_path(additional_table, database_path))
+            additional_conns.append(additional_conn)
+            additional_iters.append(load_df_range(
+                additional_conn,
+                additional_table['table_name'],
+                start_index,
+                end_index,
+                chunksize=batch_size))
+
+    return sql_iter, additional_iters, additional_conns, None
+
+def _get_ranges_per_chunk(params: dict) -> Optional[int]:
+    '''
+    Returns the number of index ranges (one per worker) in each chunk when
+    `read_in_workers` is set, or None when the parent reads the input.
+    '''
+    if 'read_in_workers' not in params or not params['read_in_workers']:
+        return None
+    return params['num_processes']
+
+def _get_segmentation_kwargs(params: dict, window_lens: List[int]) -> dict:
+    '''
+    Returns the Pipeline's long text segmentation settings (see
+    `utilities.segmentation_utilities`), or an empty dict unless
+    `max_segment_tokens` is set. Segments overlap by at least the largest
+    ngram window's context, so every ngram sees the same words as it would
+    in the whole text.
+    '''
+    if 'max_segment_tokens' not in params or params['max_segment_tokens'] is None:
+        return dict()
+    overlap = params['segment_overlap_tokens'] if 'segment_overlap_tokens' in params else 0
+    return {
+        'max_segment_tokens': params['max_segment_tokens'],
+        'segment_overlap': max(max(window_lens), overlap),
+    }
+
+def _create_pipeline(
+    dataset_params: dict,
+    params: dict,
+    data_save_fn,
+    feature_extraction_fn,
+    feature_column_name: str,
+    pool,
+    log_dict: dict,
+    run_name: str,
+    feature_outputs: Optional[dict] = None,
+    quarantine_fn=None,
+    input_reader=None,
+    segmentation_kwargs: Optional[dict] = None) -> Pipeline:
+    '''
+    Returns a Pipeline with the pre-processing steps and settings shared
+    by every dataset. `feature_outputs` are extracted alongside
+    `feature_extraction_fn` (see `pipeline.FeatureOutput`). Rows that fail
+    feature extraction are saved with `quarantine_fn`, if provided, and
+    workers read their own rows with `input_reader`, if provided. Long
+    texts are segmented with `segmentation_kwargs` (see
+    `_get_segmentation_kwargs`), if provided.
+    '''
+    if 'spacy' in params:
+        # Parsing settings; see `Spacy_Manager.generate_docs`.
+        Spacy_Manager.configure(**params['spacy'])
+
+    memory_budget = None
+    if 'memory_budget_mb' in params and params['memory_budget_mb'] is not None:
+        memory_budget = params['memory_budget_mb'] * 1024 * 1024
+
+    return Pipeline(
+        data_save_fn=data_save_fn,
+        pre_extraction_fns=PRE_EXTRACTION_FNS,
+        feature_extraction_fn=feature_extraction_fn,
+        post_extraction_fns=[],
+        text_column_name=dataset_params['text_column_name'],
+        ngram_column_name=feature_column_name,
+        batch_size=params['batch_size'],
+        num_processes=params['num_processes'],
+        use_spacy=True,
+        pool=pool,
+        executor=_get_executor(params),
+        start_method=params['start_method'] if 'start_method' in params else None,
+        preload_workers=params['preload_workers'] if 'preload_workers' in params else False,
+        preprocess_in_workers=params['preprocess_in_workers'] if 'preprocess_in_workers' in params else False,
+        memory_budget=memory_budget,
+        task_timeout=params['task_timeout_seconds'] if 'task_timeout_seconds' in params else None,
+        max_retries=params['max_task_retries'] if 'max_task_retries' in params else 0,
+        quarantine_fn=quarantine_fn,
+        input_reader=input_reader,
+        max_tasks_per_worker=params['max_tasks_per_worker'] if 'max_tasks_per_worker' in params else None,
+        max_worker_memory_mb=params['max_worker_memory_mb'] if 'max_worker_memory_mb' in params else None,
+        **(segmentation_kwargs if segmentation_kwargs is not None else dict()),
+        profile=params['profile'] if 'profile' in params else False,
+        profile_directory=params['profile_directory'] if 'profile_directory' in params else DEFAULT_PROFILE_DIRECTORY,
+        feature_outputs=feature_outputs if feature_outputs is not None else dict(),
+        log_dict=log_dict,
+        run_name=run_name
+    )
+
+def _get_table_saver_kwargs(dataset_params: dict, params: dict) -> dict:
+    '''
+    Returns the output table settings (see `database_utilities.TableSaver`):
+    the dataset's `output_indexes`, created once the output is complete, and
+    whether output tables use the clustered `WITHOUT ROWID` layout.
+    '''
+    return {
+        'indexes': dataset_params['output_indexes'] if 'output_indexes' in dataset_params else [],
+        'clustered': params['clustered_output'] if 'clustered_output' in params else False,
+    }
+
+def _create_quarantine_saver(conn, quarantine_table_name: str, params: dict) -> Optional[TableSaver]:
+    '''
+    Returns a `TableSaver` for the rows that fail feature extraction even
+    on their own (see `Pipeline._map_sub_batches`), keyed by input index
+    with their text and error, or None unless `quarantine_failed_rows` is set.
+    '''
+    if 'quarantine_failed_rows' not in params or not params['quarantine_failed_rows']:
+        return None
+    return TableSaver(conn, quarantine_table_name)
+
+def _get_executor(params: dict) -> str:
+    return params['executor'] if 'executor' in params else 'process'
+
+def _create_shared_pool(params: dict):
+    return create_worker_pool(
+        _get_executor(params),
+        params['num_processes'],
+        params['start_method'] if 'start_method' in params else None,
+        params['preload_workers'] if 'preload_workers' in params else False,
+        params['max_tasks_per_worker'] if 'max_tasks_per_worker' in params else None,
+        params['max_worker_memory_mb'] if 'max_worker_memory_mb' in params else None)
+
+def _get_table_database_path(table_params: dict, default_database_path: str) -> str:
+    return table_params['database_path'] if 'database_path' in table_params else default_database_path
+
+def run_datasets(
+    dataset_names: List[str],
+    params: dict,
+    window_lens: List[int],
+    use_pos_filtering: bool,
+    incremental: bool = False,
+    doc_vectors_dir: Optional[str] = None,
+    vector_dtype: str = 'float32'):
+    '''
+    Runs several datasets in one process with a single, shared worker pool.
+    See `run_dataset` for `incremental`, `doc_vectors_dir` and `vector_dtype`.
+
+    Up to `max_concurrent_datasets` (from `params`) datasets run at the same
+    time. While one dataset is reading, pre-processing, parsing or saving a
+    chunk in the parent process, the pool stays busy with the sub-batches of
+    another dataset.
+    '''
+    for dataset_name in dataset_names:
+        if dataset_name not in params:
+            raise ValueError(f'No section named "{dataset_name}" in the parameters file.')
+
+    max_concurrent = params['max_concurrent_datasets'] if 'max_concurrent_datasets' in params else DEFAULT_MAX_CONCURRENT_DATASETS
+    max_concurrent = max(1, min(max_concurrent, len(dataset_names)))
+    # Batch sizes are chosen before any dataset runs, so the samples are measured on their own.
+    dataset_run_params = {
+        dataset_name: _resolve_batch_size(dataset_name, params, window_lens, use_pos_filtering)
+        for dataset_name in dataset_names
+    }
+
+    with _create_shared_pool(params) as pool:
+        if max_concurrent == 1:
+            for dataset_name in dataset_names:
+                run_dataset(
+                    dataset_name, dataset_run_params[dataset_name], window_lens, use_pos_filtering, pool=pool,
+                    incremental=incremental, doc_vectors_dir=doc_vectors_dir, vector_dtype=vector_dtype)
+            return
+
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            futures = [
+                executor.submit(
+                    run_dataset, dataset_name, dataset_run_params[dataset_name], window_lens, use_pos_filtering,
+                    pool, True, None, incremental, doc_vectors_dir, vector_dtype)
+                for dataset_name in dataset_names
+            ]
+            # Surface the first exception, if any.
+            for future in futures:
+                future.result()
+
+def merge_dataset_shards(
+    dataset_name: str,
+    params: dict,
+    window_lens: List[int],
+    use_pos_filtering: bool,
+    num_shards: int,
+    shard_database_paths: Optional[List[str]] = None):
+    '''
+    Merges the output shards of a sharded run into the dataset's final
+    output tables. See `utilities.sharding_utilities.merge_shards`.
+    '''
+    dataset_params = params[dataset_name]
+    output_table_names = get_output_table_names(dataset_params, window_lens, use_pos_filtering)
+
+    # Shards are merged in chunks of `batch_size` rows, or the default chunk size when it is chosen per run.
+    merge_kwargs = {'chunksize': params['batch_size']} if params['batch_size'] != AUTO_BATCH_SIZE else dict()
+    conn = open_connection(dataset_params['database_path'])
+    for output_table_name in output_table_names.values():
+        merge_shards(
+            conn,
+            output_table_name,
+            num_shards,
+            shard_database_paths=shard_database_paths,
+            **merge_kwargs,
+            **_get_table_saver_kwargs(dataset_params, params))
+    if _normalizes_metadata(dataset_params):
+        metadata_table_name = get_metadata_table_name(dataset_params)
+        merge_shards(
+            conn,
+            metadata_table_name,
+            num_shards,
+            shard_database_paths=shard_database_paths,
+            **merge_kwargs,
+            indexes=['sent_id'])
+        _create_metadata_views(conn, output_table_names, metadata_table_name)
+    conn.close()
+
+def estimate_dataset(
+    dataset_name: str,
+    params: dict,
+    window_lens: List[int],
+    use_pos_filtering: bool,
+    sample_size: int = DEFAULT_SAMPLE_SIZE) -> RunEstimate:
+    '''
+    Predicts the output rows, output size (in memory and in the output
+    tables), peak memory per sub-batch and wall time of `run_dataset` from
+    a sample of about `sample_size` rows of the dataset's text table (see
+    `Pipeline.estimate`), without writing anything.
+
+    If `batch_size` is "auto" in `params`, the estimate's batch size is the
+    largest whose sub-batches are projected to use at most `batch_memory_mb`
+    MB while being parsed and featurized.
+    '''
+    dataset_params = params[dataset_name]
+    validate_spacy_pos(dataset_params['pos_filter_list'])
+    output_table_names = get_output_table_names(dataset_params, window_lens, use_pos_filtering)
+    table_saver_kwargs = _get_table_saver_kwargs(dataset_params, params)
+    extraction_kwargs = _get_extraction_kwargs(dataset_params, use_pos_filtering, table_saver_kwargs)
+
+    conn = open_connection(dataset_params['database_path'])
+    sample_df, num_input_rows = load_sample(dataset_params, conn, sample_size)
+    conn.close()
+
+    max_sub_batch_bytes = None
+    estimate_params = dict(params, profile=False)
+    if params['batch_size'] == AUTO_BATCH_SIZE:
+        batch_memory_mb = params['batch_memory_mb'] if 'batch_memory_mb' in params else DEFAULT_BATCH_MEMORY_MB
+        max_sub_batch_bytes = batch_memory_mb * 1024 * 1024
+        estimate_params['batch_size'] = None
+
+    feature_outputs = dict()
+    disk_size_fns = {DEFAULT_OUTPUT_NAME: partial(
+        get_saved_size,
+        create_saver=lambda estimate_conn: PartitionedTableSaver(
+            estimate_conn, output_table_names, ngram_generation.WINDOW_SIZE_COLUMN_NAME, **table_saver_kwargs))}
+    if _normalizes_metadata(dataset_params):
+        metadata_table_name = get_metadata_table_name(dataset_params)
+        feature_outputs['metadata'] = FeatureOutput(_create_metadata_fn(dataset_params), None)
+        disk_size_fns['metadata'] = partial(
+            get_saved_size,
+            create_saver=lambda estimate_conn: TableSaver(estimate_conn, metadata_table_name, indexes=['sent_id']))
+
+    p = _create_pipeline(
+        dataset_params,
+        estimate_params,
+        None,
+        _create_ngram_extraction_fn(dataset_params['text_column_name'], window_lens, extraction_kwargs),
+        'ngram',
+        None,
+        dict(),
+        f'{dataset_name}_estimate',
+        feature_outputs,
+        segmentation_kwargs=_get_segmentation_kwargs(params, window_lens))
+    return p.estimate(sample_df, num_input_rows, max_sub_batch_bytes=max_sub_batch_bytes, disk_size_fns=disk_size_fns)
+
+def load_sample(dataset_params: dict, conn, sample_size: int, block_size: int = SAMPLE_BLOCK_SIZE, seed: int = 0):
+    '''
+    Returns a random sample of about `sample_size` rows of a dataset's text
+    table (joined with its `additional_tables`), in index order, and the
+    table's number of rows.
+
+    The sample is read as randomly chosen blocks of `block_size` consecutive
+    rows (see `database_utilities.load_index_ranges`), so only the index
+    column and the blocks' pages are read from the database.
+    '''
+    table_name = dataset_params['text_table_name']
+    index_ranges = [r for ranges in load_index_ranges(conn, table_name, block_size) for r in ranges]
+    num_rows = sum(r.num_rows for r in index_ranges)
+    num_blocks = min(len(index_ranges), math.ceil(sample_size / block_size))
+
+    sample_dfs = []
+    for index_range in sorted(random.Random(seed).sample(index_ranges, num_blocks)):
+        sql_iter, additional_iters, additional_conns, _ = _load_input(
+            dataset_params, conn, block_size, index_range.start_index, index_range.end_index, {'Pipeline Input': dict()})
+        if len(additional_iters) > 0:
+            sql_iter = join_by_index(sql_iter, additional_iters)
+        sample_dfs.extend(sql_iter)
+        for additional_conn in additional_conns: additional_conn.close()
+    if len(sample_dfs) == 0:
+        raise ValueError(f'{table_name} has no rows to sample.')
+    return pd.concat(sample_dfs, axis=0), num_rows
+
+def print_estimate(dataset_name: str, estimate: RunEstimate):
+    print(f'Estimate for {dataset_name}:')
+    for description, value in get_estimate_report(estimate).items():
+        print(f'    {description}: {value}')
+
+def _resolve_batch_size(dataset_name: str, params: dict, window_lens: List[int], use_pos_filtering: bool) -> dict:
+    '''
+    Returns `params`, with `batch_size` chosen from a sample of the dataset
+    (see `estimate_dataset`) if it is "auto".
+    '''
+    if params['batch_size'] != AUTO_BATCH_SIZE: return params
+    estimate = estimate_dataset(dataset_name, params, window_lens, use_pos_filtering)
+    print(f'Using a batch size of {estimate.batch_size} for {dataset_name}.')
+    return dict(params, batch_size=estimate.batch_size)
+
+def run_local_shards(
+    dataset_name: str,
+    params: dict,
+    window_lens: List[int],
+    use_pos_filtering: bool,
+    num_shards: int):
+    '''
+    Runs every shard of a dataset as a separate process on this machine,
+    then merges the shards. The `num_processes` workers are divided between
+    the shard processes.
+
+    This mirrors a multi-host run, where each host would run a single
+    shard (`--shard_id`) before a final `--merge_shards` step.
+    '''
+    shard_params = dict(params)
+    shard_params['num_processes'] = max(1, params['num_processes'] // num_shards)
+
+    # All shards split the rows present now, so they agree on their ranges.
+    dataset_params = params[dataset_name]
+    conn = open_connection(dataset_params['database_path'], shared=True)
+    max_index = _get_max_index(conn, dataset_params['text_table_name'])
+    conn.close()
+
+    shard_processes = []
+    for shard_id in range(num_shards):
+        shard_process = Process(
+            target=run_dataset,
+            args=(dataset_name, shard_params, window_lens, use_pos_filtering),
+            kwargs={'shared_database': True, 'shard': (shard_id, num_shards, max_index)})
+        shard_process.start()
+        shard_processes.append(shard_process)
+
+    for shard_process in shard_processes:
+        shard_process.join()
+    failed_shards = [i for i, sp in enumerate(shard_processes) if sp.exitcode != 0]
+    if len(failed_shards) > 0:
+        raise RuntimeError(f'Shards {failed_shards} of {dataset_name} failed. The shards were not merged.')
+
+    merge_dataset_shards(dataset_name, params, window_lens, use_pos_filtering, num_shards)
+
+def create_arg_parser(description: str) -> argparse.ArgumentParser:
+    '''
+    Returns an argument parser with the ngram settings shared by
+    every dataset script.
+    '''
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        'ngram_context_size',
+        metavar='N',
+        type=parse_window_sizes,
+        default=[2],
+        nargs='?',
+        help='''
+            the size of the resulting ngrams will be 2 * N + 1. A comma-separated list
+            (e.g. 1,2,3) generates every size from a single pass over the data
+            ''')
+    parser.add_argument(
+        'use_pos_filtering',
+        metavar='P',
+        type=bool,
+        default=False,
+        nargs='?',
+        help='''
+            if set to True, ngram generation will only occur for ngrams centered on words
+            that are defined in parameters.json
+            '''
+    )
+    return parser
+
+def run_dataset_script(dataset_name: str, dataset_description: str):
+    '''
+    Entry point used by the single-dataset scripts.
+    '''
+    parser = create_arg_parser(f'''
+        Normalizes, processes, and extracts ngrams from the {dataset_description} dataset.
+
+        The raw text data is expected to be saved to a SQLite3 database. Settings for this
+        scripts can be found in the "{dataset_name}" section of `parameters.json`.
+        ''')
+    args = parser.parse_args()
+
+    params = load_parameters()
+    run_datasets([dataset_name], params, args.ngram_context_size, args.use_pos_filtering)
+
+
+if __name__ == '__main__':
+    # Parse command-line arguments.
+    parser = argparse.ArgumentParser(description='''
+        Normalizes, processes, and extracts ngrams from one or more datasets.
+
+        The raw text data is expected to be saved to a SQLite3 database. Each dataset
+        is configured by the section of the parameters file with the same name.
+        ''')
+    parser.add_argument(
+        'datasets',
+        nargs='+',
+        help='names of the dataset sections (e.g. "sst socc") to run')
+    parser.add_argument(
+        '--ngram_context_sizes',
+        type=parse_window_sizes,
+        default=[2],
+        help='comma-separated ngram context sizes; the size of each ngram will be 2 * N + 1')
+    parser.add_argument(
+        '--use_pos_filtering',
+        action='store_true',
+        help='only generate ngrams centered on words with a part-of-speech defined in the parameters file')
+    parser.add_argument(
+        '--parameters',
+        default=DEFAULT_PARAMETERS_PATH,
+        help='path to the parameters file')
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='only process input rows added since the last run with the same settings, appending to the output tables')
+
+    # Sharded execution.
+    parser.add_argument(
+        '--num_shards',
+        type=int,
+        default=None,
+        help='split each input table into this many index-range shards')
+    shard_mode = parser.add_mutually_exclusive_group()
+    shard_mode.add_argument(
+        '--shard_id',
+        type=int,
+        default=None,
+        help='only process this shard (0-based) and write it to its own shard tables')
+    parser.add_argument(
+        '--shard_max_index',
+        type=int,
+        default=None,
+        help='with --shard_id, the highest input index of the run; every shard must be given the same value')
+    shard_mode.add_argument(
+        '--merge_shards',
+        action='store_true',
+        help='merge previously written shard tables into the final output tables')
+    shard_mode.add_argument(
+        '--run_local_shards',
+        action='store_true',
+        help='run every shard as a separate process on this machine, then merge them')
+    parser.add_argument(
+        '--shard_databases',
+        nargs='+',
+        default=None,
+        help='with --merge_shards, the database holding each shard (in shard order)')
+
+    # Document vector extraction.
+    parser.add_argument(
+        '--doc_vectors',
+        metavar='OUTPUT_DIR',
+        default=None,
+        help='write document vectors to memory-mapped .npy files in OUTPUT_DIR instead of ngram tables')
+    parser.add_argument(
+        '--ngram_vectors',
+        action='store_true',
+        help='with --doc_vectors, also write the mean vector of every ngram window')
+    parser.add_argument(
+        '--with_ngram_tables',
+        action='store_true',
+        help='with --doc_vectors, also write the ngram tables, from a single pass over the data')
+    parser.add_argument(
+        '--vector_dtype',
+        choices=['float16', 'float32'],
+        default='float32',
+        help='with --doc_vectors, the storage type of the vectors')
+
+    # Hashed ngram extraction.
+    parser.add_argument(
+        '--hashed_ngrams',
+        metavar='OUTPUT_DIR',
+        default=None,
+        help='write hashed ngram window counts as sparse .npz shards in OUTPUT_DIR instead of ngram tables')
+
+    # Planning.
+    parser.add_argument(
+        '--estimate',
+        metavar='SAMPLE_SIZE',
+        type=int,
+        nargs='?',
+        const=DEFAULT_SAMPLE_SIZE,
+        default=None,
+        help='print the output size, memory use and duration each dataset\'s run is expected to have, from a sample of SAMPLE_SIZE rows, without running it')
+
+    # Profiling.
+    parser.add_argument(
+        '--profile',
+        metavar='PROFILE_DIR',
+        nargs='?',
+        const=DEFAULT_PROFILE_DIRECTORY,
+        default=None,
+        help='profile every Pipeline stage (in the parent and each worker) and save the profiles to PROFILE_DIR')
+
+    args = parser.parse_args()
+    params = load_parameters(args.parameters)
+    if args.profile is not None:
+        params['profile'] = True
+        params['profile_directory'] = args.profile
+
+    if args.incremental and (args.doc_vectors is not None or args.num_shards is not None):
+        parser.error('--incremental does not support --doc_vectors or sharded execution')
+
+    if args.with_ngram_tables and args.doc_vectors is None:
+        parser.error('--with_ngram_tables requires --doc_vectors')
+
+    if args.estimate is not None:
+        if args.doc_vectors is not None or args.hashed_ngrams is not None or args.num_shards is not None:
+            parser.error('--estimate only supports ngram table runs')
+        for dataset_name in args.datasets:
+            print_estimate(dataset_name, estimate_dataset(
+                dataset_name, params, args.ngram_context_sizes, args.use_pos_filtering, args.estimate))
+    elif args.hashed_ngrams is not None:
+        if args.doc_vectors is not None or args.num_shards is not None or args.incremental:
+            parser.error('--hashed_ngrams does not support --doc_vectors, --incremental or sharded execution')
+        with _create_shared_pool(params) as pool:
+            for dataset_name in args.datasets:
+                run_dataset_hashed_ngrams(
+                    dataset_name, params, args.hashed_ngrams, args.ngram_context_sizes,
+                    args.use_pos_filtering, pool=pool)
+    elif args.doc_vectors is not None and args.with_ngram_tables:
+        if args.num_shards is not None or args.ngram_vectors:
+            parser.error('--with_ngram_tables does not support --ngram_vectors or sharded execution')
+        run_datasets(
+            args.datasets, params, args.ngram_context_sizes, args.use_pos_filtering,
+            doc_vectors_dir=args.doc_vectors, vector_dtype=args.vector_dtype)
+    elif args.doc_vectors is not None:
+        if args.num_shards is not None:
+            parser.error('--doc_vectors does not support sharded execution')
+        if len(args.ngram_context_sizes) > 1:
+            parser.error('--doc_vectors supports a single ngram context size')
+        with _create_shared_pool(params) as pool:
+            for dataset_name in args.datasets:
+                run_dataset_doc_vectors(
+                    dataset_name, params, args.doc_vectors, args.ngram_context_sizes[0],
+                    args.use_pos_filtering, args.ngram_vectors, args.vector_dtype, pool=pool)
+    elif args.num_shards is None:
+        if args.shard_id is not None or args.merge_shards or args.run_local_shards:
+            parser.error('--num_shards is required for sharded execution')
+        run_datasets(args.datasets, params, args.ngram_context_sizes, args.use_pos_filtering, args.incremental)
+    else:
+        for dataset_name in args.datasets:
+            if args.shard_id is not None:
+                if args.shard_max_index is None:
+                    parser.error('--shard_id requires --shard_max_index')
+                run_dataset(
+                    dataset_name, params, args.ngram_context_sizes, args.use_pos_filtering,
+                    shard=(args.shard_id, args.num_shards, args.shard_max_index))
+            elif args.merge_shards:
+                merge_dataset_shards(
+                    dataset_name, params, args.ngram_context_sizes, args.use_pos_filtering,
+                    args.num_shards, args.shard_databases)
+            elif args.run_local_shards:
+                run_local_shards(
+                    dataset_name, params, args.ngram_context_sizes, args.use_pos_filtering,
+                    args.num_shards)
+            else:
+                parser.error('--num_shards requires --shard_id, --merge_shards or --run_local_shards')
@@ -1,13 +1,58 @@
-import json
-from multiprocessing import Pool
+from __future__ import annotations
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+import inspect
+import itertools
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import datetime
-import os
-from typing import Callable, Iterable, Iterator, List
-import pandas as pd
+import math
+import threading
+import time
+import numpy as np
+from typing import AsyncIterable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from utilities.estimation_utilities import DEFAULT_PARSE_SAMPLE_SIZE, RunEstimate, SampleCosts, extrapolate, measure_peak_memory, suggest_batch_size
+from utilities.import_utilities import lazy_import
 from utilities.spacy_utilities import Spacy_Manager
-from utilities.logging_utilities import get_fn_name
+from utilities.join_utilities import join_by_index
+from utilities.logging_utilities import append_log_record, get_fn_name
+from utilities.parse_scheduling_utilities import estimate_token_counts
+from utilities.profiling_utilities import ProfiledTask, StageProfiler, get_profile_directory, merge_profiles, summarize_profile
+from utilities.segmentation_utilities import SEGMENT_SENT_ID_COLUMN, concat_segments, is_segmented, segment_long_texts
+from utilities.spill_utilities import DataFrameSpool, get_df_size
+from utilities.worker_utilities import TrackedTask, WorkerPool
+
+DEFAULT_OUTPUT_LOG_PATH = './pipeline_log.jsonl'
+DEFAULT_PROFILE_DIRECTORY = './profiles'
+DEFAULT_MAX_IN_FLIGHT = 2
+DEFAULT_OUTPUT_NAME = 'default'
+EXECUTORS = ('process', 'thread', 'serial')
+
+pd = lazy_import('pandas')
+
+class FeatureOutput:
+    '''
+    A named output of a Pipeline: a feature extraction function, the
+    post-extraction functions applied to its `column_name` column and the
+    `data_save_fn` its output is saved with.
+
+    Every output of a Pipeline is extracted from the same pre-processed
+    (and parsed) sub-batches, in the same worker call.
+    '''
+    def __init__(
+        self,
+        feature_extraction_fn: Callable[[pd.DataFrame], pd.DataFrame],
+        data_save_fn: Callable[[pd.DataFrame], None],
+        post_extraction_fns: Iterable[Callable[[pd.DataFrame], pd.DataFrame]] = [],
+        column_name: Optional[str] = None):
+        self.feature_extraction_fn = feature_extraction_fn
+        self.data_save_fn = data_save_fn
+        self.post_extraction_fns = post_extraction_fns
+        self.column_name = column_name
 
-DEFAULT_OUTPUT_LOG_PATH = './pipeline_log.json'
 class Pipeline():
     '''
     This class defines a Pipeline object that uses generators
@@ -16,6 +61,38 @@ class Pipeline():
     text-based dataset.
     
     Pipeline objects apply operations on pandas DataFrames. 
+
+    Besides the output described by `feature_extraction_fn`, `data_save_fn`,
+    `post_extraction_fns` and `ngram_column_name`, the `feature_outputs`
+    keyword argument accepts a dictionary of named `FeatureOutput`s. Every
+    output is extracted from the same sub-batches, so the data is read,
+    pre-processed and parsed once. `feature_extraction_fn` and `data_save_fn`
+    can be None when `feature_outputs` is provided.
+
+    Sub-batches that fail can be retried and isolated without redoing the
+    rest of their chunk; see `_map_sub_batches` and the `task_timeout`,
+    `max_retries` and `quarantine_fn` keyword arguments.
+
+    With the `input_reader` keyword argument (e.g. a
+    `utilities.database_utilities.RangeReader`), every chunk is a list of
+    `IndexRange`s instead of a DataFrame, and each worker reads its own
+    sub-batch (one range) with the reader before pre-processing, parsing
+    and extracting it. The parent never holds the input rows, so
+    `preprocess_in_workers` is implied and `additional_df_generators` are
+    not supported (the reader can join tables instead).
+
+    With `max_segment_tokens`, texts longer than `max_segment_tokens`
+    tokens are split into segments that overlap by `segment_overlap` tokens
+    after pre-processing (see `utilities.segmentation_utilities`). Segments
+    are parsed and featurized as separate rows, so the segments of a long
+    text are spread over several sub-batches (and workers). With
+    `preprocess_in_workers`, the workers pre-process and segment their
+    sub-batches first and the parent re-splits the segments (see
+    `_segment_in_workers`). The feature extraction function must map
+    segments back to their texts, as `generate_corpus_ngrams` does.
+
+    `estimate` predicts a run's output size, memory use and duration from
+    a sample of its input, without saving anything.
     '''
 
     def __init__(
@@ -28,59 +105,435 @@ class Pipeline():
         ngram_column_name: str,
         **kwargs
         ):
-        self._data_save_fn = data_save_fn
         self._pre_extraction_fns = pre_extraction_fns
-        self._feature_extraction_fn = feature_extraction_fn
-        self._post_extraction_fns = post_extraction_fns
         self._input_column_name = text_column_name
-        self._feature_column_name = ngram_column_name
+
+        # Every output, keyed by name. See `FeatureOutput`.
+        self._outputs: Dict[str, FeatureOutput] = dict()
+        if feature_extraction_fn is not None:
+            self._outputs[DEFAULT_OUTPUT_NAME] = FeatureOutput(
+                feature_extraction_fn, data_save_fn, post_extraction_fns, ngram_column_name)
+        feature_outputs = kwargs['feature_outputs'] if 'feature_outputs' in kwargs else dict()
+        for name, output in feature_outputs.items():
+            if name in self._outputs:
+                raise ValueError(f'The output name "{name}" is reserved for the Pipeline\'s feature_extraction_fn.')
+            self._outputs[name] = output
+        if len(self._outputs) == 0:
+            raise ValueError('The Pipeline needs a feature_extraction_fn or at least one feature output.')
 
         # Process additional keyword arguments.
         self._batch_size = kwargs['batch_size'] if 'batch_size' in kwargs else None
         self._num_processes = kwargs['num_processes'] if 'num_processes' in kwargs else None
         self._use_spacy = kwargs['use_spacy'] if 'use_spacy' in kwargs else False
+        self._pool = kwargs['pool'] if 'pool' in kwargs else None
+        self._executor = kwargs['executor'] if 'executor' in kwargs else 'process'
+        if self._executor not in EXECUTORS:
+            raise ValueError(f'The "executor" parameter must be one of {EXECUTORS}.')
+        # Run pre-extraction and parsing in the workers, on each sub-batch. See `WorkerTask`.
+        self._preprocess_in_workers = kwargs['preprocess_in_workers'] if 'preprocess_in_workers' in kwargs else False
+        # Workers read their own sub-batches from index ranges.
+        self._input_reader = kwargs['input_reader'] if 'input_reader' in kwargs else None
+        if self._input_reader is not None:
+            self._preprocess_in_workers = True
+        # Long text segmentation. See `utilities.segmentation_utilities`.
+        self._max_segment_tokens = kwargs['max_segment_tokens'] if 'max_segment_tokens' in kwargs else None
+        self._segment_overlap = kwargs['segment_overlap'] if 'segment_overlap' in kwargs else 0
+        if self._max_segment_tokens is not None and not self._use_spacy:
+            raise ValueError('Segmenting long texts requires use_spacy.')
+        if self._max_segment_tokens is not None and self._max_segment_tokens <= 2 * self._segment_overlap:
+            raise ValueError('The "max_segment_tokens" parameter must be larger than twice the "segment_overlap" parameter.')
+        # Process workers only. See `utilities.worker_utilities.WorkerPool`.
+        self._start_method = kwargs['start_method'] if 'start_method' in kwargs else None
+        self._preload_workers = kwargs['preload_workers'] if 'preload_workers' in kwargs else False
+        # Worker recycling, for the pool created by `start`. See `WorkerPool`.
+        self._max_tasks_per_worker = kwargs['max_tasks_per_worker'] if 'max_tasks_per_worker' in kwargs else None
+        self._max_worker_memory_mb = kwargs['max_worker_memory_mb'] if 'max_worker_memory_mb' in kwargs else None
+
+        # Fault isolation. See `_map_sub_batches`.
+        self._task_timeout = kwargs['task_timeout'] if 'task_timeout' in kwargs else None
+        self._max_retries = kwargs['max_retries'] if 'max_retries' in kwargs else 0
+        self._quarantine_fn = kwargs['quarantine_fn'] if 'quarantine_fn' in kwargs else None
+        self._task_ids = itertools.count()
+        self._num_failed_attempts = 0
+        self._num_quarantined_rows = 0
+        self._pending_quarantine: List[pd.DataFrame] = []
+
+        # Memory budget (in bytes) for the output (not the parsed input) of each chunk. See `_process_with_budget`.
+        self._memory_budget = kwargs['memory_budget'] if 'memory_budget' in kwargs else None
+        self._spill_directory = kwargs['spill_directory'] if 'spill_directory' in kwargs else None
+        self._output_bytes_per_input_unit = None
+        self._total_input_units = 0
+        self._total_output_bytes = 0
+        self._num_spills = 0
+        self._feature_extraction_seconds = 0.0
+        # Guards the run totals above, which `start_async` updates from several threads.
+        self._stats_lock = threading.Lock()
 
         # Logging
         self._log_path: str = kwargs['log_filepath'] if 'log_filepath' in kwargs else DEFAULT_OUTPUT_LOG_PATH
         self._pipeline_log: dict[str, str] = kwargs['log_dict'] if 'log_dict' in kwargs else {'Pipeline Input': 'None'}
         self._run_name: str = kwargs['run_name'] if 'run_name' in kwargs else str(datetime.datetime.now())
+
+        # Profiling: each stage is profiled with cProfile, in the parent and in every worker.
+        self._profiler = None
+        if 'profile' in kwargs and kwargs['profile']:
+            profile_directory = kwargs['profile_directory'] if 'profile_directory' in kwargs else DEFAULT_PROFILE_DIRECTORY
+            self._profiler = StageProfiler(get_profile_directory(profile_directory, self._run_name))
         self._create_log()
 
-    def _process(self, df: pd.DataFrame) -> pd.DataFrame:
-        print(f'Processing DataFrame with shape: {df.shape}')
-        # Run pre-extraction functions.
-        for fn in self._pre_extraction_fns:
-            try:
-                df.loc[:, self._input_column_name] = fn(df.loc[:, self._input_column_name])
-            except BaseException:
-                print(f'Pre-extraction function {fn.__name__} failed with an unexpected error.')
-                raise
-        
-        # Run feature extraction function using multiprocessing.
-        if self._use_spacy:
-            docs_col_name = '{}_spdocs'.format(self._input_column_name)
-            df.loc[:, docs_col_name] = list(Spacy_Manager.generate_docs(df.loc[:, self._input_column_name]))
-        batched_dfs = self._split_df(df)
+    def _process(self, df: pd.DataFrame, pool) -> Dict[str, Iterable[pd.DataFrame]]:
+        '''
+        Runs a chunk through the Pipeline and returns the output of each
+        feature output, keyed by name, as an iterable of DataFrames (in
+        order). Without a memory budget, each output is a single DataFrame.
+        '''
+        if self._input_reader is not None:
+            # `df` is a list of index ranges; every worker reads its own.
+            print(f'Processing {len(df)} index ranges with {self._get_num_input_rows(df)} rows')
+        else:
+            print(f'Processing DataFrame with shape: {df.shape}')
+        if self._input_reader is None and not self._preprocess_in_workers:
+            # Run pre-extraction functions.
+            with self._profile_stage('pre_extraction'):
+                df = run_pre_extraction_fns(df, self._pre_extraction_fns, self._input_column_name)
+            if self._max_segment_tokens is not None:
+                with self._profile_stage('segmentation'):
+                    df = segment_texts(df, self._input_column_name, self._max_segment_tokens, self._segment_overlap)
+
+            # Run feature extraction function using multiprocessing.
+            if self._use_spacy:
+                # The spaCy model may be shared by several Pipelines running in one process.
+                with Spacy_Manager.lock, self._profile_stage('parse'):
+                    df.loc[:, get_docs_column_name(self._input_column_name)] = list(
+                        Spacy_Manager.generate_docs(df.loc[:, self._input_column_name]))
+        batched_dfs = list(df) if self._input_reader is not None else self._split_df(df)
+        if self._segments_in_workers():
+            batched_dfs = self._segment_in_workers(pool, batched_dfs)
+
+        if self._memory_budget is not None:
+            return self._process_with_budget(batched_dfs, pool)
         
-        pool_size = self._num_processes if self._num_processes is not None else 1
-        with Pool(pool_size) as p:
-            try:
-                res = p.map(self._feature_extraction_fn, batched_dfs)
-            except BaseException:
-                print(f'Feature extraction function {self._feature_extraction_fn.__name__} failed with an unexpected error.')
-                raise
-        feature_df = pd.concat(res, ignore_index=True, axis=0)
-
-        # Run post-extraction functions.
-        for fn in self._post_extraction_fns:
+        extraction_start = time.perf_counter()
+        try:
+            res = [self._get_output_dfs(r) for _, r in self._map_sub_batches(pool, batched_dfs)]
+        except BaseException:
+            print(f'Feature extraction function {self._get_extraction_fn_names()} failed with an unexpected error.')
+            raise
+        with self._stats_lock:
+            self._feature_extraction_seconds += time.perf_counter() - extraction_start
+
+        processed_dfs = dict()
+        for name in self._outputs:
+            feature_df = pd.concat([r[name] for r in res], ignore_index=True, axis=0)
+            processed_dfs[name] = [self._run_post_extraction_fns(name, feature_df)]
+        return processed_dfs
+
+    def _process_with_budget(self, batched_dfs: List[pd.DataFrame], pool) -> Dict[str, DataFrameSpool]:
+        '''
+        Runs feature and post-extraction on each sub-batch while keeping at most
+        `memory_budget` bytes of output in memory. Output beyond the budget is
+        spilled to temporary files and later streamed to `data_save_fn` in pieces.
+        With several feature outputs, the budget is divided evenly between them.
+
+        Sub-batches whose output is projected (from the output size per input
+        character seen so far) to exceed the budget are split further first.
+
+        Note: post-extraction functions are applied to each sub-batch's output
+        separately, so they must operate row by row. Sub-batches read by the
+        workers (see `input_reader`) are not split further.
+
+        The budget only covers the feature output. Unless `preprocess_in_workers`
+        is set, the whole chunk is pre-processed and parsed in the parent before
+        it is split, so its Docs are held in memory regardless of the budget.
+        '''
+        reads_in_workers = len(batched_dfs) > 0 and self._is_read_by_workers(batched_dfs[0])
+        if not reads_in_workers:
+            batched_dfs = self._split_for_budget(batched_dfs)
+
+        output_budget = max(1, self._memory_budget // len(self._outputs))
+        spools = {name: DataFrameSpool(output_budget, self._spill_directory) for name in self._outputs}
+        extraction_start = time.perf_counter()
+        try:
+            for batch_df, result in self._map_sub_batches(pool, batched_dfs, lazy=True):
+                output_bytes = 0
+                for name, feature_df in self._get_output_dfs(result).items():
+                    feature_df = self._run_post_extraction_fns(name, feature_df.reset_index(drop=True))
+                    spools[name].append(feature_df)
+                    output_bytes += get_df_size(feature_df)
+                if not reads_in_workers:
+                    self._update_output_size_projection(batch_df, output_bytes)
+        except BaseException:
+            print(f'Feature extraction function {self._get_extraction_fn_names()} failed with an unexpected error.')
+            for spool in spools.values(): spool.close()
+            raise
+        with self._stats_lock:
+            self._feature_extraction_seconds += time.perf_counter() - extraction_start
+
+        num_spills = sum(spool.num_spills for spool in spools.values())
+        if num_spills > 0:
+            print(f'Output exceeded the memory budget; spilled {num_spills} pieces to disk.')
+        with self._stats_lock:
+            self._num_spills += num_spills
+        return spools
+
+    def _map_sub_batches(self, pool, batched_dfs: List[pd.DataFrame], lazy: bool = False, worker_fn=None) -> Iterator[Tuple[pd.DataFrame, object]]:
+        '''
+        Runs the worker function (`_get_worker_fn`, unless `worker_fn` is
+        provided) on every sub-batch and yields each sub-batch with its
+        result, in order. With `lazy`, results are collected as they are
+        consumed (`imap`) instead of all at once (`map`).
+
+        With fault isolation (a `task_timeout`, `max_retries` or a
+        `quarantine_fn`), each sub-batch is submitted on its own, so one that
+        fails (or takes longer than `task_timeout` seconds) is retried up to
+        `max_retries` times without redoing the other sub-batches of the chunk.
+        If it still fails and a `quarantine_fn` is set, the failing rows are
+        isolated by bisection (see `_run_isolated`); otherwise the error is
+        raised. Yielded sub-batches are then the pieces that succeeded.
+
+        A process worker that crashes or hangs is only detected with a
+        `task_timeout`. Hung process workers are killed and replaced; a hung
+        thread worker cannot be stopped and stays busy.
+        '''
+        worker_fn = worker_fn if worker_fn is not None else self._get_worker_fn(prepared=self._segments_in_workers())
+        if not self._isolates_failures():
+            results = pool.imap(worker_fn, batched_dfs) if lazy else pool.map(worker_fn, batched_dfs)
+            return zip(batched_dfs, results)
+        return self._map_isolated(pool, TrackedTask(worker_fn), batched_dfs)
+
+    def _map_isolated(self, pool, task: TrackedTask, batched_dfs: List[pd.DataFrame]):
+        submitted = [self._submit(pool, task, batch_df) for batch_df in batched_dfs]
+        for batch_df, batch_submitted in zip(batched_dfs, submitted):
+            yield from self._run_isolated(pool, task, batch_df, batch_submitted)
+
+    def _run_isolated(self, pool, task: TrackedTask, df: pd.DataFrame, submitted=None, max_retries: Optional[int] = None) -> list:
+        '''
+        Returns `[(df, result)]` once the worker function succeeds on `df`,
+        trying it up to `max_retries` more times. If it still fails, `df` is
+        split in half and each half is tried once, and split again if it fails,
+        until the failing rows are isolated and quarantined. The pieces that
+        succeeded are returned in order, with their results.
+        '''
+        max_retries = self._max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            if submitted is None: submitted = self._submit(pool, task, df)
             try:
-                feature_df.loc[:, self._feature_column_name] = fn(feature_df.loc[:, self._feature_column_name])
-            except BaseException:
-                print(f'Post-extraction function {fn.__name__} failed with an unexpected error.')
-                raise
+                return [(df, self._wait(pool, submitted))]
+            except Exception as e:
+                error = e
+                submitted = None
+                with self._stats_lock:
+                    self._num_failed_attempts += 1
+                print(f'A sub-batch of {self._get_num_input_rows(df)} rows failed (attempt {attempt + 1} of {max_retries + 1}): {e!r}')
+
+        if self._quarantine_fn is None:
+            raise error
+        if self._get_num_input_rows(df) <= 1:
+            self._quarantine(df, error)
+            return []
+
+        halves = self._split_in_half(df)
+        submitted_halves = [self._submit(pool, task, half) for half in halves]
+        return [
+            piece
+            for half, half_submitted in zip(halves, submitted_halves)
+            for piece in self._run_isolated(pool, task, half, half_submitted, max_retries=0)
+        ]
+
+    def _submit(self, pool, task: TrackedTask, df: pd.DataFrame):
+        task_id = (id(self), next(self._task_ids))
+        return task_id, pool.apply_async(task, (task_id, df))
+
+    def _wait(self, pool, submitted):
+        task_id, async_result = submitted
+        try:
+            return async_result.get(self._task_timeout)
+        except multiprocessing.TimeoutError:
+            # The pool replaces a killed worker; the sub-batch is retried elsewhere.
+            if isinstance(pool, WorkerPool): pool.kill_task_worker(task_id)
+            raise multiprocessing.TimeoutError(f'The sub-batch did not finish within {self._task_timeout} seconds.') from None
+        finally:
+            if isinstance(pool, WorkerPool): pool.forget_task(task_id)
+
+    def _split_in_half(self, df: pd.DataFrame) -> list:
+        if self._is_read_by_workers(df): return self._input_reader.split(df)
+        middle = df.shape[0] // 2
+        return [df.iloc[:middle], df.iloc[middle:]]
+
+    def _quarantine(self, df: pd.DataFrame, error: Exception):
+        if self._is_read_by_workers(df):
+            df = self._input_reader(df)
+            if df.shape[0] == 0: return
+        # A segment of a long text is quarantined under its text's index.
+        index = pd.Index(df.loc[:, SEGMENT_SENT_ID_COLUMN]) if SEGMENT_SENT_ID_COLUMN in df.columns else df.index
+        print(f'Quarantining row {index[0]}: {error!r}')
+        quarantined_df = pd.DataFrame({
+            self._input_column_name: df.loc[:, self._input_column_name].astype(str).to_numpy(),
+            'error': repr(error),
+        }, index=index)
+        with self._stats_lock:
+            self._num_quarantined_rows += df.shape[0]
+            self._pending_quarantine.append(quarantined_df)
+
+    def _pop_quarantined(self) -> List[pd.DataFrame]:
+        '''
+        Returns the rows quarantined since the last call, to be saved with
+        `quarantine_fn` by the thread saving the output.
+        '''
+        with self._stats_lock:
+            quarantined = self._pending_quarantine
+            self._pending_quarantine = []
+        return quarantined
+
+    def _get_num_input_rows(self, batch) -> int:
+        '''
+        Returns the number of input rows in a chunk or sub-batch: a DataFrame,
+        or with an `input_reader`, an index range or a list of them.
+        '''
+        if not self._is_read_by_workers(batch): return batch.shape[0]
+        if hasattr(batch, 'num_rows'): return batch.num_rows
+        return sum(r.num_rows for r in batch)
+
+    def _is_read_by_workers(self, batch) -> bool:
+        '''
+        Returns whether a chunk or sub-batch is an index range (or a list of
+        them) for the workers to read, rather than a DataFrame.
+        '''
+        return self._input_reader is not None and not isinstance(batch, pd.DataFrame)
+
+    def _segments_in_workers(self) -> bool:
+        return self._preprocess_in_workers and self._max_segment_tokens is not None
+
+    def _segment_in_workers(self, pool, batched_dfs: list) -> List[pd.DataFrame]:
+        '''
+        Reads, pre-processes and segments every sub-batch in the workers and
+        re-splits the segments into sub-batches of `batch_size` rows, so the
+        segments of a long text are parsed and featurized by several workers
+        instead of the one that segmented it. The pre-processed rows are sent
+        back to the parent, even with an `input_reader`.
+        '''
+        task = WorkerTask(self._get_preparation_steps(), copy_input=self._input_reader is None)
+        prepared_dfs = [r for _, r in self._map_sub_batches(pool, batched_dfs, worker_fn=task)]
+        if not any(is_segmented(d) for d in prepared_dfs): return prepared_dfs
+        return self._split_df(concat_segments(prepared_dfs))
+
+    def _isolates_failures(self) -> bool:
+        return self._task_timeout is not None or self._max_retries > 0 or self._quarantine_fn is not None
+
+    def _run_post_extraction_fns(self, output_name: str, feature_df: pd.DataFrame) -> pd.DataFrame:
+        output = self._outputs[output_name]
+        with self._profile_stage(get_stage_name('post_extraction', output_name)):
+            for fn in output.post_extraction_fns:
+                try:
+                    feature_df.loc[:, output.column_name] = fn(feature_df.loc[:, output.column_name])
+                except BaseException:
+                    print(f'Post-extraction function {fn.__name__} failed with an unexpected error.')
+                    raise
 
         return feature_df
 
+    def _get_worker_fn(self, prepared: bool = False):
+        '''
+        Returns the function run by the worker pool on each sub-batch. With
+        `prepared`, sub-batches were already read, pre-processed and
+        segmented by `_segment_in_workers`.
+        '''
+        steps = [] if prepared else self._get_preparation_steps()
+        if self._preprocess_in_workers and self._use_spacy:
+            steps.append(self._profile_task(partial(
+                parse_docs,
+                column_name=self._input_column_name,
+                parse_settings=Spacy_Manager.get_parse_settings()), 'parse'))
+
+        # Each output's extraction function is profiled as its own stage.
+        extraction_fns = {
+            name: self._profile_task(output.feature_extraction_fn, get_stage_name('feature_extraction', name))
+            for name, output in self._outputs.items()
+        }
+        if len(extraction_fns) == 1:
+            steps.append(next(iter(extraction_fns.values())))
+        else:
+            steps.append(MultiFeatureTask(extraction_fns))
+
+        if len(steps) == 1: return steps[0]
+        # Sub-batches read by the workers are never shared with the parent.
+        return WorkerTask(steps, copy_input=prepared or self._input_reader is None)
+
+    def _get_preparation_steps(self) -> list:
+        '''
+        Returns the steps run by the workers on each sub-batch before parsing.
+        '''
+        steps = []
+        if self._input_reader is not None:
+            steps.append(self._profile_task(self._input_reader, 'read'))
+        if self._preprocess_in_workers:
+            steps.append(self._profile_task(partial(
+                run_pre_extraction_fns,
+                pre_extraction_fns=self._pre_extraction_fns,
+                column_name=self._input_column_name), 'pre_extraction'))
+            if self._max_segment_tokens is not None:
+                steps.append(self._profile_task(partial(
+                    segment_texts,
+                    column_name=self._input_column_name,
+                    max_tokens=self._max_segment_tokens,
+                    overlap=self._segment_overlap), 'segmentation'))
+        return steps
+
+    def _profile_task(self, fn, stage: str):
+        if self._profiler is None: return fn
+        return ProfiledTask(fn, self._profiler.profile_dir, stage)
+
+    def _get_output_dfs(self, result) -> Dict[str, pd.DataFrame]:
+        '''
+        Returns a worker's output for a sub-batch, keyed by output name.
+        '''
+        if isinstance(result, dict): return result
+        return {next(iter(self._outputs)): result}
+
+    def _get_extraction_fn_names(self) -> str:
+        return ', '.join(get_fn_name(output.feature_extraction_fn) for output in self._outputs.values())
+
+    def _profile_stage(self, stage: str):
+        if self._profiler is None: return nullcontext()
+        return self._profiler.profile(stage)
+
+    def _get_input_size(self, df: pd.DataFrame) -> int:
+        '''
+        Returns the number of characters in a sub-batch's input text, or its
+        number of rows if the input column does not contain text.
+        '''
+        try:
+            return int(df.loc[:, self._input_column_name].str.len().sum())
+        except AttributeError:
+            return df.shape[0]
+
+    def _update_output_size_projection(self, batch_df: pd.DataFrame, output_bytes: int):
+        input_units = self._get_input_size(batch_df)
+        with self._stats_lock:
+            self._total_input_units += input_units
+            self._total_output_bytes += output_bytes
+            if self._total_input_units > 0:
+                self._output_bytes_per_input_unit = self._total_output_bytes / self._total_input_units
+
+    def _split_for_budget(self, batched_dfs: List[pd.DataFrame]) -> List[pd.DataFrame]:
+        '''
+        Splits any sub-batch whose projected output exceeds the memory budget.
+        '''
+        if self._output_bytes_per_input_unit is None: return batched_dfs
+
+        split_dfs = []
+        for batch_df in batched_dfs:
+            projected_bytes = self._get_input_size(batch_df) * self._output_bytes_per_input_unit
+            num_pieces = min(batch_df.shape[0], math.ceil(projected_bytes / self._memory_budget))
+            if num_pieces <= 1:
+                split_dfs.append(batch_df)
+                continue
+
+            piece_size = math.ceil(batch_df.shape[0] / num_pieces)
+            for i in range(0, batch_df.shape[0], piece_size):
+                split_dfs.append(batch_df.iloc[i:i + piece_size])
+        return split_dfs
+
     def _split_df(self, df: pd.DataFrame) -> List[pd.DataFrame]:
         '''
         Splits a DataFrame into batches based on the Pipeline's batch size.
@@ -94,60 +547,558 @@ class Pipeline():
         
         return batched_dfs
 
+    def estimate(
+        self,
+        sample_df: pd.DataFrame,
+        num_input_rows: int,
+        parse_sample_size: int = DEFAULT_PARSE_SAMPLE_SIZE,
+        max_sub_batch_bytes: Optional[int] = None,
+        disk_size_fns: Optional[Dict[str, Callable[[pd.DataFrame], int]]] = None) -> RunEstimate:
+        '''
+        Predicts the totals of a run over `num_input_rows` input rows from
+        `sample_df`, a sample of them (see `utilities.estimation_utilities`).
+
+        Every sample row is pre-processed (and segmented) and tokenized with
+        spaCy's tokenizer, which is much cheaper than parsing. Only about
+        `parse_sample_size` of them, spread over the sample, are parsed and
+        featurized in this process (once timed and once traced for their peak
+        memory). Each output's saved size is measured by its function in
+        `disk_size_fns`, keyed by output name, if provided. Nothing is saved.
+
+        If `max_sub_batch_bytes` is provided, the estimate's `batch_size` is
+        the largest whose sub-batches are projected to peak below it (see
+        `suggest_batch_size`); otherwise it is the Pipeline's `batch_size`.
+        '''
+        if sample_df.shape[0] == 0:
+            raise ValueError('The sample has no rows to estimate from.')
+
+        pre_extraction_start = time.perf_counter()
+        df = run_pre_extraction_fns(sample_df.copy(), self._pre_extraction_fns, self._input_column_name)
+        if self._max_segment_tokens is not None:
+            df = segment_texts(df, self._input_column_name, self._max_segment_tokens, self._segment_overlap)
+        pre_extraction_seconds = time.perf_counter() - pre_extraction_start
+
+        texts = df.loc[:, self._input_column_name]
+        if self._use_spacy:
+            tokenizer = Spacy_Manager.get_nlp().tokenizer
+            token_counts = np.array([len(tokenizer(t)) if isinstance(t, str) else 1 for t in texts], dtype=np.int64)
+        else:
+            token_counts = estimate_token_counts(texts)
+        step = max(1, math.ceil(df.shape[0] / parse_sample_size))
+        parse_df = df.iloc[::step]
+
+        parse_seconds, extraction_seconds, output_dfs = self._run_sample(parse_df)
+        _, peak_bytes = measure_peak_memory(lambda: self._run_sample(parse_df))
+
+        disk_size_fns = disk_size_fns if disk_size_fns is not None else dict()
+        costs = SampleCosts(
+            num_rows=sample_df.shape[0],
+            num_tokens=int(token_counts.sum()),
+            pre_extraction_seconds=pre_extraction_seconds,
+            num_parsed_rows=parse_df.shape[0],
+            num_parsed_tokens=int(token_counts[::step].sum()),
+            parse_seconds=parse_seconds,
+            extraction_seconds=extraction_seconds,
+            peak_bytes=peak_bytes,
+            output_rows={name: output_df.shape[0] for name, output_df in output_dfs.items()},
+            output_bytes={name: get_df_size(output_df) for name, output_df in output_dfs.items()},
+            output_disk_bytes={name: fn(output_dfs[name]) for name, fn in disk_size_fns.items()})
+
+        num_processes = self._num_processes if self._num_processes is not None else 1
+        batch_size = self._batch_size
+        if max_sub_batch_bytes is not None:
+            batch_size = suggest_batch_size(costs, max_sub_batch_bytes, num_input_rows, num_processes)
+        return extrapolate(
+            costs,
+            num_input_rows,
+            batch_size,
+            num_processes,
+            self._preprocess_in_workers,
+            Spacy_Manager.n_process)
+
+    def _run_sample(self, df: pd.DataFrame) -> Tuple[float, float, Dict[str, pd.DataFrame]]:
+        '''
+        Parses and featurizes a pre-processed sample in this process and
+        returns the seconds spent parsing, the seconds spent on feature and
+        post-extraction, and each output's DataFrame.
+        '''
+        df = df.copy()
+        parse_start = time.perf_counter()
+        if self._use_spacy:
+            df = parse_docs(df, self._input_column_name, Spacy_Manager.get_parse_settings())
+        extraction_start = time.perf_counter()
+        output_dfs = dict()
+        for name, output in self._outputs.items():
+            feature_df = output.feature_extraction_fn(df)
+            feature_df = feature_df.copy() if feature_df is df else feature_df
+            for fn in output.post_extraction_fns:
+                feature_df.loc[:, output.column_name] = fn(feature_df.loc[:, output.column_name])
+            output_dfs[name] = feature_df
+        return extraction_start - parse_start, time.perf_counter() - extraction_start, output_dfs
+
     def start(
         self, 
         df_generator: Iterable[pd.DataFrame], 
         additional_df_generators: Iterable[Iterator[pd.DataFrame]] = []):
-        start_idx = 0
+        '''
+        Runs every DataFrame from `df_generator` through the Pipeline.
+
+        Each iterator in `additional_df_generators` is joined to `df_generator`
+        by index (see `utilities.join_utilities.join_by_index`). All sources must
+        be ordered by index, but they do not need matching chunk sizes.
+
+        With an `input_reader`, `df_generator` yields lists of index ranges
+        (e.g. from `utilities.database_utilities.load_index_ranges`).
+
+        If a worker pool was passed in with the `pool` keyword argument, it is
+        used (and left open) so several Pipelines can share it. Otherwise, a pool
+        of `num_processes` workers of the requested `executor` type is created
+        for the duration of the run (see `create_worker_pool`).
+        '''
+        if self._pool is not None:
+            self._run(self._pool, df_generator, additional_df_generators)
+        else:
+            pool_size = self._num_processes if self._num_processes is not None else 1
+            with create_worker_pool(
+                self._executor, pool_size, self._start_method, self._preload_workers,
+                self._max_tasks_per_worker, self._max_worker_memory_mb) as p:
+                if isinstance(p, WorkerPool):
+                    self._pipeline_log['Worker Startup'] = p.get_startup_report()
+                self._run(p, df_generator, additional_df_generators)
+
+    def _run(
+        self,
+        pool,
+        df_generator: Iterable[pd.DataFrame],
+        additional_df_generators: Iterable[Iterator[pd.DataFrame]]):
+        if len(additional_df_generators) > 0 and self._input_reader is not None:
+            raise ValueError('Additional DataFrame generators are not supported with an input_reader.')
+        if len(additional_df_generators) > 0:
+            # Join all DataFrames by index, regardless of how each source is chunked.
+            df_generator = join_by_index(df_generator, list(additional_df_generators))
+
+        self._log_event('start', settings=self._pipeline_log)
+        # Each output's index continues from the previous chunk's.
+        start_indices = {name: 0 for name in self._outputs}
         for (i, current_df) in enumerate(df_generator):
-            if len(additional_df_generators) > 0:
-                # Join all DataFrames by index
-                current_additional_dfs = list(map(next, additional_df_generators))
-                current_df = current_df.join(
-                    current_additional_dfs,
-                    how='inner')
+            num_input_rows = self._get_num_input_rows(current_df)
+            if num_input_rows == 0:
+                print(f'Pipeline step {i} has no rows. Skipping it.')
+                continue
 
-            processed_df = self._process(current_df)
-            processed_df.index = range(start_idx, start_idx + processed_df.shape[0])
+            chunk_start = time.perf_counter()
+            num_output_rows = 0
+            for name, processed_dfs in self._process(current_df, pool).items():
+                data_save_fn = self._outputs[name].data_save_fn
+                for processed_df in processed_dfs:
+                    start_idx = start_indices[name]
+                    processed_df.index = range(start_idx, start_idx + processed_df.shape[0])
 
-            self._data_save_fn(processed_df)
-            start_idx += processed_df.shape[0]
+                    with self._profile_stage(get_stage_name('save', name)):
+                        data_save_fn(processed_df)
+                    start_indices[name] += processed_df.shape[0]
+                    num_output_rows += processed_df.shape[0]
+            for quarantined_df in self._pop_quarantined():
+                self._quarantine_fn(quarantined_df)
 
+            self._log_chunk(i, num_input_rows, num_output_rows, time.perf_counter() - chunk_start)
             print(f'Pipeline step {i} complete.')
+
+        # Save functions can complete their output once every batch is saved.
+        for name, output in self._outputs.items():
+            finalize_fn = getattr(output.data_save_fn, 'finalize', None)
+            if callable(finalize_fn):
+                with self._profile_stage(get_stage_name('save', name)):
+                    finalize_fn()
+        finalize_fn = getattr(self._quarantine_fn, 'finalize', None)
+        if callable(finalize_fn): finalize_fn()
         
         print('Pipeline complete.')
-        self._save_log()
+        self._save_log(pool)
+
+    async def start_async(
+        self,
+        df_source: Union[AsyncIterable[pd.DataFrame], Iterable[pd.DataFrame]],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        '''
+        An `asyncio` version of `start`, for DataFrames read from asynchronous
+        sources (e.g. a socket or a queue server).
+
+        `df_source` can be an async iterator or a regular iterable of DataFrames.
+        `data_save_fn` can be a coroutine function; if so, each save is awaited.
+
+        Each chunk is processed (pre-extraction, parsing and the worker pool) in a
+        background thread through `run_in_executor`, so the event loop keeps
+        reading the source while up to `max_in_flight` chunks are processed.
+        Once `max_in_flight` chunks are in flight, the source is not read again
+        until the oldest chunk has been saved. Chunks are saved in source order,
+        with the same contiguous output index as `start`.
+
+        Profiling requires `max_in_flight` to be 1, since a stage's profile
+        cannot be recorded by several threads at once.
+        '''
+        if max_in_flight < 1:
+            raise ValueError('The "max_in_flight" parameter must be at least 1.')
+        if self._profiler is not None and max_in_flight > 1:
+            raise ValueError('Profiling requires "max_in_flight" to be 1.')
+
+        if self._pool is not None:
+            await self._run_async(self._pool, df_source, max_in_flight)
+        else:
+            pool_size = self._num_processes if self._num_processes is not None else 1
+            with create_worker_pool(
+                self._executor, pool_size, self._start_method, self._preload_workers,
+                self._max_tasks_per_worker, self._max_worker_memory_mb) as p:
+                if isinstance(p, WorkerPool):
+                    self._pipeline_log['Worker Startup'] = p.get_startup_report()
+                await self._run_async(p, df_source, max_in_flight)
+
+    async def _run_async(self, pool, df_source, max_in_flight: int):
+        self._log_event('start', settings=self._pipeline_log)
+        loop = asyncio.get_running_loop()
+
+        # Chunks in source order: (step, input rows, start time, future of the processed DataFrames).
+        in_flight = deque()
+        start_indices = {name: 0 for name in self._outputs}
+        with ThreadPoolExecutor(max_workers=max_in_flight) as chunk_executor:
+            i = 0
+            async for current_df in _iterate_async(df_source):
+                num_input_rows = self._get_num_input_rows(current_df)
+                if num_input_rows == 0:
+                    print(f'Pipeline step {i} has no rows. Skipping it.')
+                else:
+                    chunk_start = time.perf_counter()
+                    future = loop.run_in_executor(chunk_executor, self._process_chunk, current_df, pool)
+                    in_flight.append((i, num_input_rows, chunk_start, future))
+                i += 1
+
+                # Backpressure: wait for the oldest chunk before reading further.
+                if len(in_flight) >= max_in_flight:
+                    await self._save_chunk_async(in_flight.popleft(), start_indices)
+
+            while len(in_flight) > 0:
+                await self._save_chunk_async(in_flight.popleft(), start_indices)
+
+        for name, output in self._outputs.items():
+            finalize_fn = getattr(output.data_save_fn, 'finalize', None)
+            if callable(finalize_fn):
+                with self._profile_stage(get_stage_name('save', name)):
+                    result = finalize_fn()
+                    if inspect.isawaitable(result): await result
+        finalize_fn = getattr(self._quarantine_fn, 'finalize', None)
+        if callable(finalize_fn):
+            result = finalize_fn()
+            if inspect.isawaitable(result): await result
+
+        print('Pipeline complete.')
+        self._save_log(pool)
+
+    def _process_chunk(self, df: pd.DataFrame, pool) -> Dict[str, Iterable[pd.DataFrame]]:
+        # Spilled output stays on disk until it is saved.
+        return {
+            name: processed_dfs if isinstance(processed_dfs, DataFrameSpool) else list(processed_dfs)
+            for name, processed_dfs in self._process(df, pool).items()
+        }
+
+    async def _save_chunk_async(self, chunk, start_indices: Dict[str, int]):
+        '''
+        Waits for a chunk to be processed and saves its output. `start_indices`
+        (the index each output's next rows start at) is updated.
+        '''
+        i, num_input_rows, chunk_start, future = chunk
+        num_output_rows = 0
+        for name, processed_dfs in (await future).items():
+            data_save_fn = self._outputs[name].data_save_fn
+            for processed_df in processed_dfs:
+                start_idx = start_indices[name]
+                processed_df.index = range(start_idx, start_idx + processed_df.shape[0])
+
+                with self._profile_stage(get_stage_name('save', name)):
+                    result = data_save_fn(processed_df)
+                    if inspect.isawaitable(result): await result
+                start_indices[name] += processed_df.shape[0]
+                num_output_rows += processed_df.shape[0]
+        for quarantined_df in self._pop_quarantined():
+            result = self._quarantine_fn(quarantined_df)
+            if inspect.isawaitable(result): await result
+
+        self._log_chunk(i, num_input_rows, num_output_rows, time.perf_counter() - chunk_start)
+        print(f'Pipeline step {i} complete.')
 
     # Logging
     def _create_log(self):
         self._pipeline_log['Pre-Extraction Functions'] = [get_fn_name(f) for f in self._pre_extraction_fns]
-        self._pipeline_log['Feature Extraction Function'] = get_fn_name(self._feature_extraction_fn)
-        self._pipeline_log['Post-Extraction Functions'] = [get_fn_name(f) for f in self._post_extraction_fns]
+        if DEFAULT_OUTPUT_NAME in self._outputs:
+            default_output = self._outputs[DEFAULT_OUTPUT_NAME]
+            self._pipeline_log['Feature Extraction Function'] = get_fn_name(default_output.feature_extraction_fn)
+            self._pipeline_log['Post-Extraction Functions'] = [get_fn_name(f) for f in default_output.post_extraction_fns]
+            self._pipeline_log['Output Column Name'] = default_output.column_name
+        if len(self._outputs) > 1 or DEFAULT_OUTPUT_NAME not in self._outputs:
+            self._pipeline_log['Feature Outputs'] = {
+                name: {
+                    'Feature Extraction Function': get_fn_name(output.feature_extraction_fn),
+                    'Post-Extraction Functions': [get_fn_name(f) for f in output.post_extraction_fns],
+                    'Output Column Name': output.column_name,
+                    'Save Function': get_fn_name(output.data_save_fn),
+                }
+                for name, output in self._outputs.items()
+            }
 
         self._pipeline_log['Pipeline Settings'] = {
             'Using spaCy': f'{self._use_spacy}',
             'Batch Size': f'{self._batch_size}',
+            'Shared Pool': f'{self._pool is not None}',
+            'Executor': self._executor,
+            'Number of Workers': f'{self._num_processes}',
+            'Start Method': f'{self._start_method}',
+            'Preloaded Workers': f'{self._preload_workers}',
+            'Memory Budget': f'{self._memory_budget}',
+            'Preprocessing in Workers': f'{self._preprocess_in_workers}',
+            'Reading in Workers': f'{self._input_reader is not None}',
+            'Max Segment Tokens': f'{self._max_segment_tokens}',
+            'Segment Overlap': f'{self._segment_overlap}',
+            'Task Timeout': f'{self._task_timeout}',
+            'Max Retries': f'{self._max_retries}',
+            'Quarantine': f'{self._quarantine_fn is not None}',
+            'Max Tasks per Worker': f'{self._max_tasks_per_worker}',
+            'Max Worker Memory (MB)': f'{self._max_worker_memory_mb}',
+            'Profiling': f'{self._profiler is not None}',
         }
 
         self._pipeline_log['Input Text Column Name'] = self._input_column_name
-        self._pipeline_log['Output Column Name'] = self._feature_column_name
 
         self._pipeline_log['Start Time'] = str(datetime.datetime.now())
 
-    def _save_log(self):
+    def _log_chunk(self, chunk_id: int, num_input_rows: int, num_output_rows: int, seconds: float):
+        '''
+        Logs the metrics of a completed chunk, so long runs can be monitored
+        while they are running.
+        '''
+        self._log_event(
+            'chunk',
+            chunk=chunk_id,
+            input_rows=num_input_rows,
+            output_rows=num_output_rows,
+            seconds=round(seconds, 3),
+            input_rows_per_second=round(num_input_rows / seconds, 1) if seconds > 0 else None,
+            total_feature_extraction_seconds=round(self._feature_extraction_seconds, 3),
+            total_spilled_pieces=self._num_spills,
+            total_failed_attempts=self._num_failed_attempts,
+            total_quarantined_rows=self._num_quarantined_rows)
+
+    def _save_log(self, pool=None):
         self._pipeline_log['End Time'] = str(datetime.datetime.now())
+        self._pipeline_log['Feature Extraction Seconds'] = f'{self._feature_extraction_seconds:.3f}'
+        if self._memory_budget is not None:
+            self._pipeline_log['Spilled Pieces'] = f'{self._num_spills}'
+        if self._isolates_failures():
+            self._pipeline_log['Failed Sub-Batch Attempts'] = f'{self._num_failed_attempts}'
+            self._pipeline_log['Quarantined Rows'] = f'{self._num_quarantined_rows}'
+        if isinstance(pool, WorkerPool):
+            # Counted over the pool's lifetime, which a shared pool spans several Pipelines.
+            self._pipeline_log['Recycled Workers'] = f'{pool.get_num_recycled_workers()}'
+        if self._profiler is not None:
+            self._pipeline_log['Profile'] = self._summarize_profiles()
 
-        if os.path.exists(self._log_path):
-            with open(self._log_path, mode='r+') as fp:
-                try:
-                    existing_log = json.load(fp)
-                except:
-                    existing_log = dict()
-                
-                existing_log[self._run_name] = self._pipeline_log
-        else:
-            existing_log = dict()
-            existing_log[self._run_name] = self._pipeline_log
-        
-        with open(self._log_path, mode='w') as fp_w:
-            json.dump(existing_log, fp_w)
+        self._log_event('end', log=self._pipeline_log)
+
+    def _summarize_profiles(self) -> dict:
+        '''
+        Saves the parent's profiles, merges them with the workers' profiles
+        and returns the top functions (by cumulative time) of each stage.
+        '''
+        self._profiler.dump()
+        merged = merge_profiles(self._profiler.profile_dir)
+        summary = {'Directory': self._profiler.profile_dir}
+        for stage, stats in merged.items():
+            summary[stage] = summarize_profile(stats)
+        return summary
+
+    def _log_event(self, event: str, **fields):
+        '''
+        Appends a record to the run log, a JSON-lines file shared by every run
+        (see `utilities.logging_utilities.append_log_record`). Each run writes
+        a "start" record, a "chunk" record per chunk and an "end" record with
+        the complete log.
+        '''
+        record = {'run_name': self._run_name, 'event': event, 'time': str(datetime.datetime.now())}
+        record.update(fields)
+        append_log_record(self._log_path, record)
+
+
+async def _iterate_async(df_source):
+    '''
+    Iterates over an async iterator or a regular iterable of DataFrames.
+    Regular iterables are read in the event loop's thread, since some
+    sources (e.g. SQLite cursors) can only be used by the thread that
+    created them.
+    '''
+    if hasattr(df_source, '__aiter__'):
+        async for df in df_source:
+            yield df
+    else:
+        for df in df_source:
+            yield df
+
+def get_stage_name(stage: str, output_name: str) -> str:
+    '''
+    Returns the profiling stage name of a feature output's `stage`. The
+    stages of the default output keep their plain names.
+    '''
+    if output_name == DEFAULT_OUTPUT_NAME: return stage
+    return f'{stage}-{output_name}'
+
+def get_docs_column_name(text_column_name: str) -> str:
+    '''
+    Returns the name of the column the Pipeline stores spaCy Docs in.
+    '''
+    return '{}_spdocs'.format(text_column_name)
+
+def run_pre_extraction_fns(df: pd.DataFrame, pre_extraction_fns, column_name: str) -> pd.DataFrame:
+    '''
+    Applies each pre-extraction function, in order, to column `column_name` of `df`.
+    '''
+    for fn in pre_extraction_fns:
+        try:
+            df.loc[:, column_name] = fn(df.loc[:, column_name])
+        except BaseException:
+            print(f'Pre-extraction function {get_fn_name(fn)} failed with an unexpected error.')
+            raise
+    return df
+
+def parse_docs(df: pd.DataFrame, column_name: str, parse_settings: Optional[dict] = None) -> pd.DataFrame:
+    '''
+    Adds a column with a spaCy Doc for each text in column `column_name` of `df`,
+    parsed in the calling process (pool workers cannot start processes of their own).
+
+    `parse_settings` are passed to `Spacy_Manager.generate_docs`, so workers
+    parse with the parent's settings whatever their start method.
+    '''
+    parse_settings = parse_settings if parse_settings is not None else dict()
+    with Spacy_Manager.lock:
+        docs = list(Spacy_Manager.generate_docs(df.loc[:, column_name], n_threads=1, **parse_settings))
+    df.loc[:, get_docs_column_name(column_name)] = docs
+    return df
+
+def segment_texts(df: pd.DataFrame, column_name: str, max_tokens: int, overlap: int) -> pd.DataFrame:
+    '''
+    Splits the texts of column `column_name` of `df` longer than `max_tokens`
+    tokens into segments (see `utilities.segmentation_utilities.segment_long_texts`),
+    using the spaCy model's tokenizer, which may be shared by several threads.
+    '''
+    with Spacy_Manager.lock:
+        return segment_long_texts(df, column_name, max_tokens, overlap)
+
+class WorkerTask:
+    '''
+    Runs several steps on a sub-batch in one worker call, e.g. the
+    pre-extraction functions, spaCy parsing and the feature extraction
+    function, so each sub-batch only has to be sent to a worker once.
+
+    With the Pipeline's `preprocess_in_workers` setting, pre-extraction runs
+    on each sub-batch instead of on the whole chunk. The output is the same
+    as long as the pre-extraction functions operate row by row, as every
+    function in `processing_functions.text_preprocessing` does.
+    '''
+    def __init__(self, steps: List[Callable[[pd.DataFrame], pd.DataFrame]], copy_input: bool = True):
+        self._steps = steps
+        self._copy_input = copy_input
+        self.__name__ = get_fn_name(steps[-1])
+
+    def __call__(self, df: pd.DataFrame):
+        # Sub-batches are views of the chunk when workers share the parent's memory.
+        if self._copy_input: df = df.copy()
+        for step in self._steps:
+            df = step(df)
+        return df
+
+class MultiFeatureTask:
+    '''
+    Runs the extraction function of every feature output on the same
+    sub-batch and returns their output DataFrames, keyed by output name.
+    '''
+    def __init__(self, extraction_fns: Dict[str, Callable[[pd.DataFrame], pd.DataFrame]]):
+        self._extraction_fns = extraction_fns
+        self.__name__ = ', '.join(get_fn_name(fn) for fn in extraction_fns.values())
+
+    def __call__(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        outputs = dict()
+        for name, fn in self._extraction_fns.items():
+            feature_df = fn(df)
+            # Post-extraction functions modify each output in place.
+            outputs[name] = feature_df.copy() if feature_df is df else feature_df
+        return outputs
+
+def create_worker_pool(
+    executor: str,
+    pool_size: int,
+    start_method=None,
+    preload_workers=False,
+    max_tasks_per_worker: Optional[int] = None,
+    max_worker_memory_mb: Optional[float] = None):
+    '''
+    Returns a worker pool used to run feature extraction, as a context manager.
+
+    `executor` can be:
+    - `"process"`: a `multiprocessing.Pool` (a `WorkerPool`). Batches are pickled
+    and sent to separate processes. `start_method` and `preload_workers` control
+    whether workers load their own copy of the spaCy model or share a preloaded
+    parent's copy (see `utilities.worker_utilities.WorkerPool`). Workers are
+    replaced after `max_tasks_per_worker` tasks, or after a task leaves them
+    using more than `max_worker_memory_mb` MB of private memory.
+    - `"thread"`: a `multiprocessing.pool.ThreadPool`. Workers share the process
+    (and its single spaCy model), which suits stages that release the GIL, such
+    as spaCy's Cython components, NumPy vector operations and SQLite I/O.
+    - `"serial"`: runs every batch inline, in order, in the calling thread.
+    '''
+    if executor == 'process':
+        return WorkerPool(
+            pool_size, start_method=start_method, preload=preload_workers,
+            maxtasksperchild=max_tasks_per_worker, max_worker_memory_mb=max_worker_memory_mb)
+    elif executor == 'thread':
+        return ThreadPool(pool_size)
+    elif executor == 'serial':
+        return SerialPool()
+    raise ValueError(f'The "executor" parameter must be one of {EXECUTORS}.')
+
+class SerialPool:
+    '''
+    Runs work inline, with the subset of the `multiprocessing.Pool`
+    interface used by the Pipeline.
+    '''
+    def map(self, fn, iterable):
+        return list(map(fn, iterable))
+
+    def imap(self, fn, iterable):
+        return map(fn, iterable)
+
+    def apply_async(self, fn, args=()):
+        return SerialResult(fn, args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class SerialResult:
+    '''
+    The result of `SerialPool.apply_async`. The work runs when `get` is
+    first called; `timeout` is ignored, since it runs in the calling thread.
+    '''
+    def __init__(self, fn, args):
+        self._fn = fn
+        self._args = args
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def get(self, timeout=None):
+        if not self._done:
+            try:
+                self._value = self._fn(*self._args)
+            except Exception as e:
+                self._error = e
+            self._done = True
+        if self._error is not None: raise self._error
+        return self._value
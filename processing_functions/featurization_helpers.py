@@ -2,8 +2,13 @@
 This file contains a series of functions used to help with
 feature extraction and ngram creation.
 '''
-from typing import Iterable
-from spacy.tokens.doc import Doc as sp_Doc
+from __future__ import annotations
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, List
+import numpy as np
+
+if TYPE_CHECKING:
+    from spacy.tokens.doc import Doc as sp_Doc
 
 # Part-of-Speech functions
 def generate_pos_tags(docs: Iterable[sp_Doc], is_ngrams=True):
@@ -24,6 +29,77 @@ def generate_pos_tags(docs: Iterable[sp_Doc], is_ngrams=True):
         word_pos_tags = _generate_pos_tags(docs)
     return word_pos_tags
 
+def get_pos_ids(docs: Iterable[sp_Doc], is_ngrams=True):
+    '''
+    Batched version of `generate_pos_tags` that returns spaCy
+    part-of-speech IDs (see `spacy.parts_of_speech`) as NumPy arrays,
+    read from each Doc with `Doc.to_array`.
+
+    By default, returns a (`len(docs)`,) array with the ID of the word in
+    the center of each Doc (0, i.e. no tag, for empty Docs).
+
+    If `is_ngrams` is set to False, returns the ID of every word in `docs`
+    as a flat array, along with an offsets array: the IDs of the `i`th Doc
+    are `pos_ids[offsets[i]:offsets[i + 1]]`.
+
+    Use `decode_pos_ids` to convert IDs to part-of-speech strings.
+    '''
+    from spacy.attrs import POS
+    doc_pos_ids = [d.to_array(POS) for d in docs]
+    lengths = np.array([len(ids) for ids in doc_pos_ids], dtype=np.int64)
+    offsets = np.zeros(len(doc_pos_ids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    pos_ids = np.concatenate(doc_pos_ids) if len(doc_pos_ids) > 0 else np.empty(0, dtype=np.uint64)
+
+    if not is_ngrams:
+        return pos_ids, offsets
+
+    center_pos_ids = np.zeros(len(doc_pos_ids), dtype=np.uint64)
+    non_empty = lengths > 0
+    center_pos_ids[non_empty] = pos_ids[offsets[:-1][non_empty] + lengths[non_empty] // 2]
+    return center_pos_ids
+
+def decode_pos_ids(pos_ids: np.ndarray) -> np.ndarray:
+    '''
+    Converts an array of spaCy part-of-speech IDs (from `get_pos_ids`)
+    into an array of part-of-speech strings, e.g. "NOUN".
+    '''
+    return get_pos_decode_table()[np.asarray(pos_ids, dtype=np.int64)]
+
+@lru_cache(maxsize=None)
+def get_pos_decode_table() -> np.ndarray:
+    '''
+    Returns an array mapping each spaCy part-of-speech ID to its string.
+    '''
+    from spacy.parts_of_speech import NAMES as POS_NAMES
+    table = np.full(max(POS_NAMES) + 1, '', dtype=object)
+    for pos_id, name in POS_NAMES.items():
+        table[pos_id] = name
+    return table
+
+def get_pos_filter_indices(docs: Iterable[sp_Doc], pos_filter: Iterable[str]) -> List[np.ndarray]:
+    '''
+    Returns, for each Doc in `docs`, the indices of the words whose
+    part-of-speech is included in `pos_filter`.
+    '''
+    from spacy.parts_of_speech import IDS as POS_IDS
+    pos_ids, offsets = get_pos_ids(docs, is_ngrams=False)
+    filter_ids = np.array([POS_IDS[p] for p in pos_filter if p in POS_IDS], dtype=np.uint64)
+    is_valid = np.isin(pos_ids, filter_ids)
+    return [np.flatnonzero(is_valid[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+def _create_tag_filter(tags, tag_filter):
+    '''
+    Returns a list of valid indices given a tag-based filter.
+    '''
+    texts_idx = []
+    for text_tags in tags:
+        idx = []
+        for i, pos in enumerate(text_tags):
+            if pos in tag_filter: idx.append(i)
+        texts_idx.append(idx)
+    return texts_idx
+
 def _generate_pos_tags_ngram(docs: Iterable[sp_Doc], return_hash=False):
     ''' 
     Returns tag of middle word for each document. 
@@ -0,0 +1,231 @@
+'''
+These functions extract hashed ngram features (a bag of ngram windows
+per text) from a generic input text dataset, for use with linear models.
+
+Each ngram window (as created by `ngram_generation.generate_ngrams`) is
+hashed from its words' spaCy hashes into one of `num_features` columns,
+so the ngram strings are never built. Every batch is written to its own
+shard in the output directory: a `scipy.sparse` CSR matrix (`.npz`) with
+one row per text and the `sent_id` of each row (`.sent_ids.npy`).
+
+Requires SciPy.
+'''
+
+from __future__ import annotations
+import os
+from typing import List, Tuple, Union
+import numpy as np
+from processing_functions.featurization_helpers import get_pos_filter_indices, get_pos_ids
+from utilities.import_utilities import is_module_available, lazy_import
+from utilities.segmentation_utilities import is_segmented
+
+pd = lazy_import('pandas')
+# Only needed by the functions in this file.
+sparse = lazy_import('scipy.sparse') if is_module_available('scipy') else None
+
+DEFAULT_NUM_FEATURES = 2 ** 20
+SHARD_MATRIX_SUFFIX = '.npz'
+SHARD_SENT_IDS_SUFFIX = '.sent_ids.npy'
+
+# 64-bit FNV-1a constants, used to combine the hashes of a window's words.
+_FNV_OFFSET = np.uint64(14695981039346656037)
+_FNV_PRIME = np.uint64(1099511628211)
+# Finalizer constants (from MurmurHash3's fmix64), which spread the bits of
+# a combined hash before it is reduced to a column.
+_MIX_SHIFT = np.uint64(33)
+_MIX_MULTIPLIER = np.uint64(0xff51afd7ed558ccd)
+
+
+class HashedNgramStore:
+    '''
+    Manages the shards written by `generate_corpus_hashed_ngrams` to
+    `output_dir`. Creating a store removes any shards of a previous run.
+
+    A store can be used as a Pipeline's `data_save_fn`: it receives the
+    rows written by each batch and counts them. Use `load_hashed_ngrams`
+    to read the shards back as a single matrix.
+    '''
+    def __init__(self, output_dir: str):
+        self.__name__ = 'save_hashed_ngrams'
+        self._output_dir = output_dir
+        self.num_written = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+        for filename in os.listdir(output_dir):
+            if filename.endswith(SHARD_MATRIX_SUFFIX) or filename.endswith(SHARD_SENT_IDS_SUFFIX):
+                os.remove(os.path.join(output_dir, filename))
+
+    def __call__(self, df: pd.DataFrame):
+        self.num_written += df.shape[0]
+
+def generate_corpus_hashed_ngrams(
+    input_df: pd.DataFrame,
+    col_name: str,
+    output_dir: str,
+    n: Union[int, List[int]] = 2,
+    pad_word='inv',
+    num_features: int = DEFAULT_NUM_FEATURES,
+    **kwargs) -> pd.DataFrame:
+    '''
+    Hashes every ngram window of the spaCy Docs in column `col_name` of
+    `input_df` and writes the batch's counts as a shard in `output_dir`:
+    a (`len(input_df)`, `num_features`) CSR matrix whose row `i` counts the
+    windows of the `i`th Doc. The index of `input_df` is used as each
+    row's `sent_id`.
+
+    `n` and `pad_word` follow `ngram_generation.generate_corpus_ngrams`.
+    When `n` is a list, the windows of every size are counted in the same
+    row (windows of different sizes hash to different features).
+
+    `kwargs` supports the `"pos_filter"` and `"idx_filter"` arguments of
+    `generate_corpus_ngrams`. If `"include_pos"` is True, the part-of-speech
+    of each window's central word is hashed with the window, so the same
+    window with a different central part-of-speech is a different feature.
+
+    Returns a `pd.DataFrame` with the `sent_id`, `shard` and `shard_row`
+    of each Doc and its `num_windows`.
+    '''
+    if sparse is None:
+        raise ImportError('Hashed ngram extraction requires SciPy.')
+
+    if is_segmented(input_df):
+        raise ValueError('Hashed ngram extraction is not supported for segmented texts.')
+    sp_docs = list(input_df.loc[:, col_name])
+    sent_ids = np.asarray(input_df.index, dtype=np.int64)
+    window_lens = [n] if isinstance(n, int) else list(n)
+
+    if 'pos_filter' in kwargs:
+        idx_filters = get_pos_filter_indices(sp_docs, kwargs['pos_filter'])
+    elif 'idx_filter' in kwargs:
+        idx_filters = list(kwargs['idx_filter'])
+    else:
+        idx_filters = [None] * len(sp_docs)
+    pos_ids = None
+    if 'include_pos' in kwargs and kwargs['include_pos']:
+        pos_ids, _ = get_pos_ids(sp_docs, is_ngrams=False)
+
+    rows, features = hash_ngram_windows(sp_docs, idx_filters, window_lens, pad_word, num_features, pos_ids)
+    matrix = sparse.csr_matrix(
+        (np.ones(rows.shape[0], dtype=np.float32), (rows, features)),
+        shape=(len(sp_docs), num_features))
+    matrix.sum_duplicates()
+
+    shard_name = _save_shard(output_dir, sent_ids, matrix)
+    return pd.DataFrame({
+        'sent_id': input_df.index,
+        'shard': shard_name,
+        'shard_row': np.arange(len(sp_docs), dtype=np.int64),
+        'num_windows': np.bincount(rows, minlength=len(sp_docs)),
+    })
+
+def hash_ngram_windows(sp_docs, idx_filters, window_lens: List[int], pad_word: str, num_features: int, pos_ids=None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the Doc (row) and hashed feature (column) of every ngram window
+    of `sp_docs`, for each window size in `window_lens`. Windows are only
+    centered on the positions in each Doc's `idx_filter` (every position
+    if None), as in `ngram_generation.generate_ngrams`.
+
+    `pos_ids`, if provided, holds the part-of-speech ID of every word in
+    `sp_docs` (see `featurization_helpers.get_pos_ids`); the ID of each
+    window's central word is then included in its hash.
+
+    Every Doc's word hashes are concatenated into one array, padded with
+    `max(window_lens)` copies of `pad_word`'s hash before and after each
+    Doc, so the windows of the whole batch are hashed at once.
+    '''
+    from spacy.attrs import ORTH
+    from spacy.strings import hash_string
+    max_n = max(window_lens)
+    word_hashes = [d.to_array(ORTH) for d in sp_docs]
+    lengths = np.array([len(h) for h in word_hashes], dtype=np.int64)
+    pad_hashes = np.full(max_n, hash_string(pad_word), dtype=np.uint64)
+
+    padded = []
+    for h in word_hashes:
+        padded.extend([pad_hashes, h.astype(np.uint64)])
+    padded.append(pad_hashes)
+    padded = np.concatenate(padded) if len(padded) > 0 else np.empty(0, dtype=np.uint64)
+
+    # Each Doc starts after its own padding and the previous Docs (with their leading padding).
+    doc_starts = np.zeros(len(sp_docs), dtype=np.int64)
+    if len(sp_docs) > 0:
+        doc_starts[1:] = np.cumsum(lengths[:-1] + max_n)
+    doc_starts += max_n
+
+    positions, counts = [], []
+    for length, idx_filter in zip(lengths, idx_filters):
+        doc_positions = np.arange(length, dtype=np.int64) if idx_filter is None else np.asarray(idx_filter, dtype=np.int64)
+        positions.append(doc_positions)
+        counts.append(len(doc_positions))
+    counts = np.array(counts, dtype=np.int64)
+    doc_rows = np.repeat(np.arange(len(sp_docs), dtype=np.int64), counts)
+    positions = np.concatenate(positions) if len(positions) > 0 else np.empty(0, dtype=np.int64)
+    centers = np.repeat(doc_starts, counts) + positions
+
+    center_pos_ids = None
+    if pos_ids is not None:
+        word_offsets = np.zeros(len(sp_docs), dtype=np.int64)
+        if len(sp_docs) > 0:
+            word_offsets[1:] = np.cumsum(lengths[:-1])
+        center_pos_ids = np.asarray(pos_ids, dtype=np.uint64)[np.repeat(word_offsets, counts) + positions]
+
+    rows, features = [], []
+    for window_len in window_lens:
+        window_hashes = np.full(centers.shape[0], _FNV_OFFSET, dtype=np.uint64)
+        for offset in range(-window_len, window_len + 1):
+            window_hashes ^= padded[centers + offset]
+            window_hashes *= _FNV_PRIME
+        if center_pos_ids is not None:
+            window_hashes ^= center_pos_ids
+            window_hashes *= _FNV_PRIME
+        rows.append(doc_rows)
+        features.append(_mix(window_hashes) % np.uint64(num_features))
+
+    rows = np.concatenate(rows) if len(rows) > 0 else np.empty(0, dtype=np.int64)
+    features = np.concatenate(features).astype(np.int64) if len(features) > 0 else np.empty(0, dtype=np.int64)
+    return rows, features
+
+def load_hashed_ngrams(output_dir: str):
+    '''
+    Reads every shard in `output_dir` and returns a single CSR matrix of
+    hashed ngram counts, with rows sorted by `sent_id`, and the array of
+    `sent_id`s keying its rows.
+    '''
+    if sparse is None:
+        raise ImportError('Hashed ngram extraction requires SciPy.')
+
+    matrices, sent_ids = [], []
+    for shard_name in list_shards(output_dir):
+        shard_matrix, shard_sent_ids = load_shard(output_dir, shard_name)
+        matrices.append(shard_matrix)
+        sent_ids.append(shard_sent_ids)
+    if len(matrices) == 0:
+        return sparse.csr_matrix((0, 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    sent_ids = np.concatenate(sent_ids)
+    order = np.argsort(sent_ids, kind='stable')
+    return sparse.vstack(matrices, format='csr')[order], sent_ids[order]
+
+def list_shards(output_dir: str) -> List[str]:
+    return sorted(f[:-len(SHARD_MATRIX_SUFFIX)] for f in os.listdir(output_dir) if f.endswith(SHARD_MATRIX_SUFFIX))
+
+def load_shard(output_dir: str, shard_name: str):
+    '''
+    Returns a shard's CSR matrix and the `sent_id` of each of its rows.
+    '''
+    shard_path = os.path.join(output_dir, shard_name)
+    return sparse.load_npz(shard_path + SHARD_MATRIX_SUFFIX), np.load(shard_path + SHARD_SENT_IDS_SUFFIX)
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    hashes ^= hashes >> _MIX_SHIFT
+    hashes *= _MIX_MULTIPLIER
+    hashes ^= hashes >> _MIX_SHIFT
+    return hashes
+
+def _save_shard(output_dir: str, sent_ids: np.ndarray, matrix) -> str:
+    if len(sent_ids) == 0: return ''
+    shard_name = f'{sent_ids[0]:012d}'
+    shard_path = os.path.join(output_dir, shard_name)
+    np.save(shard_path + SHARD_SENT_IDS_SUFFIX, sent_ids)
+    sparse.save_npz(shard_path + SHARD_MATRIX_SUFFIX, matrix)
+    return shard_name
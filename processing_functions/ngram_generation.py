@@ -2,12 +2,24 @@
 These functions are used to create ngrams from
 a generic input text dataset.
 '''
-from spacy.tokens.doc import Doc as sp_Doc
-import pandas as pd
-from processing_functions.featurization_helpers import generate_pos_tags
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional, Union
+import numpy as np
+from processing_functions.featurization_helpers import decode_pos_ids, get_pos_filter_indices, get_pos_ids
+from utilities.import_utilities import lazy_import
+from utilities.segmentation_utilities import SEGMENT_COLUMNS, get_core_idx_filters, get_segment_offsets, get_sent_ids, is_segmented
 
+if TYPE_CHECKING:
+    from spacy.tokens.doc import Doc as sp_Doc
 
-def generate_corpus_ngrams(input_df: pd.DataFrame, col_name: str, n=2, pad_word='inv', **kwargs):
+pd = lazy_import('pandas')
+
+WINDOW_SIZE_COLUMN_NAME = 'n'
+POS_COLUMN_NAME = 'pos'
+POSITION_COLUMN_NAME = 'position'
+
+
+def generate_corpus_ngrams(input_df: pd.DataFrame, col_name: str, n: Union[int, List[int]]=2, pad_word='inv', **kwargs):
     '''
     Manages ngram generation across a set of texts. These texts
     should be passed in as a `pd.DataFrame` object. The texts must
@@ -17,6 +29,12 @@ def generate_corpus_ngrams(input_df: pd.DataFrame, col_name: str, n=2, pad_word=
     The id of the corresponding sentence is included. 
     The number of these entries is equal to `len(texts)`.
 
+    `n` can either be a single context size or a list of context sizes. When a
+    list is provided, ngrams for every size are generated from the same Docs and
+    an additional `n` column records the context size of each ngram. Rows are
+    grouped by context size (in the order given in `n`), so selecting the rows
+    for one size reproduces the output of a single-size call.
+
     `kwargs` supports the following arguments:
     1. `"pos_filter"`, which must be a list of valid parts-of-speech from spaCy,
     will limit ngram creation to ngrams where the central "target" word has a
@@ -27,65 +45,146 @@ def generate_corpus_ngrams(input_df: pd.DataFrame, col_name: str, n=2, pad_word=
     set to True, all columns, except `col_name` in `input_df` are joined to the returned
     DataFrame. If a list of column names are provided, then only those columns are
     joined with the returned DataFrame.
+    4. `"include_pos"`, if set to True, adds a `pos` column with the
+    part-of-speech of the central "target" word of each ngram.
+    5. `"include_position"`, if set to True, adds a `position` column with the
+    index of the central "target" word of each ngram in its Doc. Together with
+    `sent_id` (and `n`), it uniquely identifies each ngram.
+
+    If `input_df` holds the segments of long texts (see
+    `utilities.segmentation_utilities.segment_long_texts`), only the ngrams
+    centered on each segment's core are created, and `sent_id` and `position`
+    refer to the original text. The output is then the same as for the
+    whole texts, apart from parts-of-speech near the edges of segments.
 
     Return schema:
     - `ngram`
     - `sent_id`: the index of the sentence the ngram was 
     extracted from
+    - `n`: only if a list of context sizes was provided
+    - `pos`: only if `"include_pos"` is True
+    - `position`: only if `"include_position"` is True
     - if requested, metadata columns (see above)
     '''
     sp_docs = input_df.loc[:, col_name]
+    sent_ids = get_sent_ids(input_df)
     
     if 'pos_filter' in kwargs:
         # Create part-of-speech filter and get indices at which the filter is valid.
-        pos_tags = generate_pos_tags(sp_docs, is_ngrams=False)
-        pos_idx_filter = _create_tag_filter(pos_tags, set(kwargs['pos_filter']))
-        zipped_ngram_iterator = zip(sp_docs, input_df.index, pos_idx_filter)
+        idx_filters = get_pos_filter_indices(sp_docs, kwargs['pos_filter'])
     elif 'idx_filter' in kwargs:
         # Simply use the existing index-based filter.
-        zipped_ngram_iterator = zip(sp_docs, input_df.index, kwargs['idx_filter'])
+        idx_filters = list(kwargs['idx_filter'])
     else:
-        zipped_ngram_iterator = zip(sp_docs, input_df.index)
+        idx_filters = [None] * len(sp_docs)
+    if is_segmented(input_df):
+        # Every token is in exactly one segment's core.
+        idx_filters = get_core_idx_filters(input_df, sp_docs, idx_filters)
 
-    # Calculate ngrams at valid indices.
-    ngrams = []
-    for i in zipped_ngram_iterator:
-        if len(i) == 3:
-            d, sent_id, idx_filter = i
-        else:
-            d, sent_id = i
-            idx_filter = None
+    if isinstance(n, int):
+        ngrams_df = _generate_ngrams_df(sp_docs, sent_ids, idx_filters, n, pad_word)
+    else:
+        # Every context size reuses the same Docs and filters.
+        ngrams_dfs = []
+        for window_len in n:
+            window_df = _generate_ngrams_df(sp_docs, sent_ids, idx_filters, window_len, pad_word)
+            window_df[WINDOW_SIZE_COLUMN_NAME] = window_len
+            ngrams_dfs.append(window_df)
+        ngrams_df = pd.concat(ngrams_dfs, ignore_index=True)
+
+    num_windows = 1 if isinstance(n, int) else len(n)
+    if 'include_pos' in kwargs and kwargs['include_pos']:
+        center_pos = _get_center_pos(sp_docs, idx_filters)
+        ngrams_df[POS_COLUMN_NAME] = np.tile(center_pos, num_windows)
+    if 'include_position' in kwargs and kwargs['include_position']:
+        positions, counts = _get_center_positions(sp_docs, idx_filters)
+        positions += np.repeat(get_segment_offsets(input_df), counts)
+        ngrams_df[POSITION_COLUMN_NAME] = np.tile(positions, num_windows)
 
-        text_ngrams = generate_ngrams(d, n=n, pad_word=pad_word, idx_filter=idx_filter)
-        sent_ids = [sent_id] * len(text_ngrams)
-        ngrams.append(pd.DataFrame({'ngram': text_ngrams, 'sent_id': sent_ids}))
-    
-    ngrams_df: pd.DataFrame = pd.concat(ngrams, ignore_index=True)
     if 'include_metadata' in kwargs:
-        if type(kwargs['include_metadata']) == list:
-            metadata_cols = kwargs['include_metadata']
-            return ngrams_df.join(input_df.loc[:, metadata_cols], on='sent_id', how='inner')
-        elif kwargs['include_metadata'] == True:
-            metadata_cols = set(input_df.columns) - {col_name}
-            return ngrams_df.join(input_df.loc[:, metadata_cols], on='sent_id', how='inner')
-        elif kwargs['include_metadata'] == False:
-            return ngrams_df
-        else:
-            raise ValueError('The "include_metadata" parameter must be a list or boolean.')
+        metadata_cols = _get_metadata_cols(input_df, col_name, kwargs['include_metadata'])
+        if metadata_cols is not None:
+            return ngrams_df.join(_get_metadata_df(input_df, metadata_cols), on='sent_id', how='inner')
     
     return ngrams_df
 
-def _create_tag_filter(tags, tag_filter):
+def generate_corpus_metadata(input_df: pd.DataFrame, col_name: str, include_metadata: Union[bool, List[str]] = True) -> pd.DataFrame:
+    '''
+    Returns the metadata that `generate_corpus_ngrams` joins to every ngram
+    with the same `include_metadata` argument, once per text: a
+    `pd.DataFrame` with a `sent_id` column followed by the metadata columns.
+
+    Saved to its own table, this stores each text's metadata once instead
+    of once per ngram. Joining it (on `sent_id`, keeping only matching
+    rows) with the output of `generate_corpus_ngrams` without
+    `include_metadata` reproduces the output with `include_metadata`.
+    '''
+    if is_segmented(input_df):
+        # A text's segments can be in different batches; only its first segment's row is kept.
+        input_df = input_df.loc[get_segment_offsets(input_df) == 0]
+    metadata_cols = _get_metadata_cols(input_df, col_name, include_metadata)
+    if metadata_cols is None: metadata_cols = []
+    return _get_metadata_df(input_df, metadata_cols).rename_axis('sent_id').reset_index()
+
+def _get_metadata_cols(input_df: pd.DataFrame, col_name: str, include_metadata: Union[bool, List[str]]) -> Optional[List[str]]:
+    '''
+    Returns the metadata columns requested by `include_metadata`, or None
+    if it is False.
+    '''
+    if type(include_metadata) == list:
+        return include_metadata
+    elif include_metadata == True:
+        return [c for c in input_df.columns if c != col_name and c not in SEGMENT_COLUMNS]
+    elif include_metadata == False:
+        return None
+    raise ValueError('The "include_metadata" parameter must be a list or boolean.')
+
+def _get_metadata_df(input_df: pd.DataFrame, metadata_cols: List[str]) -> pd.DataFrame:
+    '''
+    Returns the metadata columns of `input_df`, indexed by `sent_id`
+    (once per original text, if `input_df` holds segments).
+    '''
+    metadata_df = input_df.loc[:, metadata_cols]
+    if not is_segmented(input_df): return metadata_df
+    metadata_df = metadata_df.set_axis(get_sent_ids(input_df), axis=0)
+    return metadata_df.loc[~metadata_df.index.duplicated()]
+
+def _generate_ngrams_df(sp_docs, sent_ids, idx_filters, n, pad_word) -> pd.DataFrame:
+    '''
+    Calculates ngrams at valid indices for each Doc and returns them
+    as a single `pd.DataFrame` with `ngram` and `sent_id` columns.
+    '''
+    ngrams = []
+    for d, sent_id, idx_filter in zip(sp_docs, sent_ids, idx_filters):
+        text_ngrams = generate_ngrams(d, n=n, pad_word=pad_word, idx_filter=idx_filter)
+        doc_sent_ids = [sent_id] * len(text_ngrams)
+        ngrams.append(pd.DataFrame({'ngram': text_ngrams, 'sent_id': doc_sent_ids}))
+    return pd.concat(ngrams, ignore_index=True)
+
+def _get_center_positions(sp_docs, idx_filters):
+    '''
+    Returns the position (in its Doc) of the central word of every ngram
+    created by `_generate_ngrams_df`, in the same order, along with the
+    number of ngrams created from each Doc.
+    '''
+    positions = []
+    for d, idx_filter in zip(sp_docs, idx_filters):
+        if idx_filter is None:
+            positions.append(np.arange(len(d), dtype=np.int64))
+        else:
+            positions.append(np.asarray(idx_filter, dtype=np.int64))
+    counts = np.array([len(p) for p in positions], dtype=np.int64)
+    positions = np.concatenate(positions) if len(positions) > 0 else np.empty(0, dtype=np.int64)
+    return positions, counts
+
+def _get_center_pos(sp_docs, idx_filters) -> np.ndarray:
     '''
-    Returns a list of valid indices given a tag-based filter.
+    Returns the part-of-speech of the central word of every ngram created
+    by `_generate_ngrams_df` (in the same order), for a whole batch at once.
     '''
-    texts_idx = []
-    for text_tags in tags:
-        idx = []
-        for i, pos in enumerate(text_tags):
-            if pos in tag_filter: idx.append(i)
-        texts_idx.append(idx)
-    return texts_idx
+    pos_ids, offsets = get_pos_ids(sp_docs, is_ngrams=False)
+    positions, counts = _get_center_positions(sp_docs, idx_filters)
+    return decode_pos_ids(pos_ids[np.repeat(offsets[:-1], counts) + positions])
 
 def generate_ngrams(doc: sp_Doc, n=2, pad_word='inv', idx_filter=None) -> list[str]:
     '''
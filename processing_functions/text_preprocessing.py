@@ -3,16 +3,20 @@ These functions apply generic text preprocessing functions
 to a pandas Series.
 '''
 
+from __future__ import annotations
+from functools import lru_cache
 from string import punctuation
-import pandas as pd
-from nltk.corpus import stopwords
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def lowercase_words(texts: pd.Series) -> pd.Series:
     return texts.str.lower()
 
 def remove_punctuation(texts: pd.Series) -> pd.Series:
-    return texts.str.translate(str.maketrans('', '', punctuation))
+    return texts.str.translate(get_punctuation_table())
 
 def normalize_spacing(texts: pd.Series) -> pd.Series:
     return texts.str.split().str.join(' ')
@@ -24,8 +28,23 @@ def remove_stopwords(texts: pd.Series) -> pd.Series:
     Returns a pandas Series object, with all stopwords removed.
     '''
     split_text = texts.str.split()
-    stop = set(stopwords.words('english'))
+    stop = get_stopword_set()
 
     split_text = split_text.apply(lambda x: [w for w in x if w not in stop])
 
-    return split_text.str.join(' ')
\ No newline at end of file
+    return split_text.str.join(' ')
+
+@lru_cache(maxsize=None)
+def get_punctuation_table() -> dict:
+    '''
+    Returns the (cached) translate table used to remove punctuation.
+    '''
+    return str.maketrans('', '', punctuation)
+
+@lru_cache(maxsize=None)
+def get_stopword_set() -> frozenset:
+    '''
+    Returns the (cached) set of NLTK English stopwords.
+    '''
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
\ No newline at end of file
@@ -0,0 +1,229 @@
+'''
+These functions extract word-vector based features (document vectors
+and ngram window vectors) from a generic input text dataset.
+
+Vectors are written straight into preallocated, memory-mapped `.npy`
+files instead of being returned, so a corpus' vectors never have to
+be held in memory. Rows are keyed by `sent_id`: row `i` of
+`doc_vectors.npy` belongs to `sent_ids.npy[i]`.
+'''
+
+from __future__ import annotations
+import os
+from typing import TYPE_CHECKING, List
+import numpy as np
+from processing_functions.featurization_helpers import get_pos_filter_indices
+from utilities.import_utilities import lazy_import
+from utilities.segmentation_utilities import is_segmented
+from utilities.spacy_utilities import get_token_vectors
+
+if TYPE_CHECKING:
+    from spacy.tokens.doc import Doc as sp_Doc
+
+pd = lazy_import('pandas')
+
+SENT_IDS_FILENAME = 'sent_ids.npy'
+DOC_VECTORS_FILENAME = 'doc_vectors.npy'
+NGRAM_VECTORS_FILENAME = 'ngram_vectors.npy'
+NGRAM_OFFSETS_FILENAME = 'ngram_offsets.npy'
+NGRAM_POSITIONS_FILENAME = 'ngram_positions.npy'
+NGRAM_PIECES_DIRNAME = 'ngram_vector_pieces'
+
+
+class DocVectorStore:
+    '''
+    Manages the output files of `generate_corpus_doc_vectors` for one corpus.
+
+    Creating a store preallocates `doc_vectors.npy`, a (`len(sent_ids)`,
+    `vector_size`) array of `dtype` (float16 or float32), and saves the
+    sorted `sent_ids` used to key its rows.
+
+    A store can be used as a Pipeline's `data_save_fn`: it receives the
+    rows written by each batch and counts them. Once the Pipeline completes,
+    call `finalize` to combine per-ngram vectors (if requested) into
+    `ngram_vectors.npy`, with `ngram_offsets.npy` marking each document's
+    vectors: the ngram vectors of row `i` are
+    `ngram_vectors[ngram_offsets[i]:ngram_offsets[i + 1]]`.
+    '''
+    def __init__(self, output_dir: str, sent_ids, vector_size: int, dtype='float32'):
+        self.__name__ = 'save_doc_vectors'
+        self._output_dir = output_dir
+        self._dtype = np.dtype(dtype)
+        self.num_written = 0
+
+        os.makedirs(output_dir, exist_ok=True)
+        sent_ids = np.sort(np.asarray(sent_ids, dtype=np.int64))
+        np.save(os.path.join(output_dir, SENT_IDS_FILENAME), sent_ids)
+
+        doc_vectors = np.lib.format.open_memmap(
+            os.path.join(output_dir, DOC_VECTORS_FILENAME),
+            mode='w+',
+            dtype=self._dtype,
+            shape=(len(sent_ids), vector_size))
+        doc_vectors.flush()
+        del doc_vectors
+
+    def __call__(self, df: pd.DataFrame):
+        self.num_written += df.shape[0]
+
+    def finalize(self):
+        '''
+        Combines the per-batch ngram vector pieces, if any, into a single
+        memory-mapped array with an offsets array. Pieces are read one at a time.
+        '''
+        pieces_dir = os.path.join(self._output_dir, NGRAM_PIECES_DIRNAME)
+        if not os.path.isdir(pieces_dir): return
+
+        piece_paths = sorted(os.path.join(pieces_dir, f) for f in os.listdir(pieces_dir))
+        num_docs = np.load(os.path.join(self._output_dir, SENT_IDS_FILENAME), mmap_mode='r').shape[0]
+        # Ngram vectors have the same size as the document vectors.
+        vector_size = np.load(os.path.join(self._output_dir, DOC_VECTORS_FILENAME), mmap_mode='r').shape[1]
+
+        # First pass: count the ngram vectors of every document. Only the
+        # arrays read from a piece (`.npz`) are loaded.
+        counts = np.zeros(num_docs, dtype=np.int64)
+        for piece_path in piece_paths:
+            with np.load(piece_path) as piece:
+                counts[piece['rows']] = piece['counts']
+        offsets = np.zeros(num_docs + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        np.save(os.path.join(self._output_dir, NGRAM_OFFSETS_FILENAME), offsets)
+
+        # Second pass: copy each piece into place.
+        ngram_vectors = np.lib.format.open_memmap(
+            os.path.join(self._output_dir, NGRAM_VECTORS_FILENAME),
+            mode='w+',
+            dtype=self._dtype,
+            shape=(offsets[-1], vector_size))
+        ngram_positions = np.lib.format.open_memmap(
+            os.path.join(self._output_dir, NGRAM_POSITIONS_FILENAME),
+            mode='w+',
+            dtype=np.int32,
+            shape=(offsets[-1],))
+        for piece_path in piece_paths:
+            with np.load(piece_path) as piece:
+                rows, piece_offsets = piece['rows'], np.concatenate([[0], np.cumsum(piece['counts'])])
+                piece_vectors, piece_positions = piece['vectors'], piece['positions']
+                for i, row in enumerate(rows):
+                    start, end = offsets[row], offsets[row + 1]
+                    ngram_vectors[start:end] = piece_vectors[piece_offsets[i]:piece_offsets[i + 1]]
+                    ngram_positions[start:end] = piece_positions[piece_offsets[i]:piece_offsets[i + 1]]
+            os.remove(piece_path)
+        os.rmdir(pieces_dir)
+
+        ngram_vectors.flush()
+        ngram_positions.flush()
+        del ngram_vectors, ngram_positions
+
+
+def generate_corpus_doc_vectors(
+    input_df: pd.DataFrame,
+    col_name: str,
+    output_dir: str,
+    include_ngram_vectors=False,
+    n=2,
+    pad_word='inv',
+    **kwargs) -> pd.DataFrame:
+    '''
+    Writes a document vector (the mean of its word vectors) for every
+    spaCy Doc in column `col_name` of `input_df` into the `doc_vectors.npy`
+    file of the `DocVectorStore` in `output_dir`. The index of `input_df`
+    is used as each document's `sent_id`.
+
+    If `include_ngram_vectors` is True, the mean vector of every ngram
+    window (as created by `ngram_generation.generate_ngrams` with the
+    same `n` and `pad_word`) is also saved. `kwargs` supports the
+    `"pos_filter"` and `"idx_filter"` arguments of `generate_corpus_ngrams`
+    to limit which ngram windows are used. Per-ngram vectors are written to
+    a piece file per batch and combined by `DocVectorStore.finalize`.
+
+    Returns a `pd.DataFrame` with the `sent_id` and `vector_row` of each
+    document (and `num_ngram_vectors`, if requested).
+    '''
+    if is_segmented(input_df):
+        raise ValueError('Document vectors are not supported for segmented texts.')
+    sp_docs = list(input_df.loc[:, col_name])
+    sent_ids = np.load(os.path.join(output_dir, SENT_IDS_FILENAME), mmap_mode='r')
+    batch_sent_ids = np.asarray(input_df.index, dtype=np.int64)
+    rows = np.searchsorted(sent_ids, batch_sent_ids)
+    if np.any(rows >= sent_ids.shape[0]) or np.any(sent_ids[np.minimum(rows, sent_ids.shape[0] - 1)] != batch_sent_ids):
+        raise ValueError('Every sent_id in the batch must have been provided to the DocVectorStore.')
+
+    doc_vectors = np.load(os.path.join(output_dir, DOC_VECTORS_FILENAME), mmap_mode='r+')
+    token_vectors = [get_token_vectors(d) for d in sp_docs]
+    batch_vectors = np.zeros((len(sp_docs), doc_vectors.shape[1]), dtype=np.float32)
+    for i, v in enumerate(token_vectors):
+        if v.shape[0] > 0: batch_vectors[i] = v.mean(axis=0)
+    doc_vectors[rows] = batch_vectors.astype(doc_vectors.dtype)
+    doc_vectors.flush()
+    del doc_vectors
+
+    output_df = pd.DataFrame({'sent_id': input_df.index, 'vector_row': rows})
+    if not include_ngram_vectors:
+        return output_df
+
+    if 'pos_filter' in kwargs:
+        idx_filters = get_pos_filter_indices(sp_docs, kwargs['pos_filter'])
+    elif 'idx_filter' in kwargs:
+        idx_filters = list(kwargs['idx_filter'])
+    else:
+        idx_filters = [range(len(d)) for d in sp_docs]
+
+    pad_vector = _get_pad_vector(sp_docs, pad_word)
+    window_vectors = []
+    positions = []
+    for v, idx_filter in zip(token_vectors, idx_filters):
+        doc_positions = np.asarray(idx_filter, dtype=np.int32)
+        window_vectors.append(generate_window_mean_vectors(v, pad_vector, n, doc_positions))
+        positions.append(doc_positions)
+
+    counts = np.array([len(p) for p in positions], dtype=np.int64)
+    _save_ngram_vector_piece(
+        output_dir,
+        rows,
+        counts,
+        np.concatenate(positions) if len(positions) > 0 else np.empty(0, dtype=np.int32),
+        np.concatenate(window_vectors).astype(np.float32) if len(window_vectors) > 0 else np.empty((0, batch_vectors.shape[1]), dtype=np.float32))
+
+    output_df['num_ngram_vectors'] = counts
+    return output_df
+
+def generate_window_mean_vectors(token_vectors: np.ndarray, pad_vector: np.ndarray, n: int, positions: List[int]) -> np.ndarray:
+    '''
+    Returns the mean vector of the 2`n` + 1 window centered on each position
+    in `positions`, given a Doc's (`len(doc)`, vector size) token vector matrix.
+    Windows follow `ngram_generation.generate_ngrams`: windows extending past
+    either end of the Doc are padded with `pad_vector` (the vector of `pad_word`).
+
+    Window sums are taken from a prefix sum over the padded matrix, so the
+    cost is linear in the length of the Doc regardless of `n`.
+    '''
+    positions = np.asarray(positions, dtype=np.int64)
+    vector_size = token_vectors.shape[1]
+    window_len = 2 * n + 1
+
+    padded = np.empty((token_vectors.shape[0] + 2 * n, vector_size), dtype=np.float64)
+    padded[:n] = pad_vector
+    padded[n:n + token_vectors.shape[0]] = token_vectors
+    padded[n + token_vectors.shape[0]:] = pad_vector
+
+    # prefix_sums[i] holds the sum of the first i rows of the padded matrix.
+    prefix_sums = np.zeros((padded.shape[0] + 1, vector_size), dtype=np.float64)
+    np.cumsum(padded, axis=0, out=prefix_sums[1:])
+
+    # Position `pos` in the Doc is at `pos + n` in the padded matrix, so its
+    # window covers padded rows `pos` to `pos + 2n` (inclusive).
+    window_sums = prefix_sums[positions + window_len] - prefix_sums[positions]
+    return (window_sums / window_len).astype(np.float32)
+
+def _get_pad_vector(sp_docs: List[sp_Doc], pad_word: str) -> np.ndarray:
+    if len(sp_docs) == 0: return np.empty(0, dtype=np.float32)
+    vocab = sp_docs[0].vocab
+    return np.asarray(vocab.get_vector(pad_word), dtype=np.float32).reshape(vocab.vectors_length)
+
+def _save_ngram_vector_piece(output_dir: str, rows, counts, positions, vectors):
+    if len(rows) == 0: return
+    pieces_dir = os.path.join(output_dir, NGRAM_PIECES_DIRNAME)
+    os.makedirs(pieces_dir, exist_ok=True)
+    piece_name = f'{rows[0]:012d}.npz'
+    np.savez(os.path.join(pieces_dir, piece_name), rows=rows, counts=counts, positions=positions, vectors=vectors)
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import pandas as pd
+from utilities.database_utilities import IndexRange, PartitionedTableSaver, RangeReader, TableSaver, create_joined_view, get_saved_size, load_df, load_index_ranges, load_joined_df, save_df
+
+class DatabaseUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.conn = sqlite3.connect(':memory:')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        return super().tearDown()
+
+    def test_partitioned_table_saver(self):
+        table_names = {1: 'out=1', 2: 'out=2'}
+        saver = PartitionedTableSaver(self.conn, table_names, 'n')
+
+        saver(pd.DataFrame({'ngram': ['a', 'b', 'c', 'd'], 'n': [1, 1, 2, 2]}))
+        saver(pd.DataFrame({'ngram': ['e', 'f', 'g'], 'n': [1, 2, 2]}))
+
+        for n, expected in [(1, ['a', 'b', 'e']), (2, ['c', 'd', 'f', 'g'])]:
+            result = pd.concat(load_df(self.conn, table_names[n], chunksize=10))
+            assert(list(result.columns) == ['ngram'])
+            assert(list(result.loc[:, 'ngram']) == expected)
+            assert(list(result.index) == list(range(len(expected))))
+
+    def test_load_joined_df(self):
+        save_df(pd.DataFrame({'text': ['a', 'b', 'c', 'd']}), self.conn, 'primary')
+        save_df(pd.DataFrame({'x': [10, 30]}, index=[1, 3]), self.conn, 'secondary')
+        save_df(pd.DataFrame({'y': [0.0, 1.0, 3.0]}, index=[0, 1, 3]), self.conn, 'tertiary')
+
+        result = pd.concat(load_joined_df(self.conn, 'primary', ['secondary', 'tertiary'], chunksize=1))
+        assert(list(result.columns) == ['text', 'x', 'y'])
+        assert(list(result.index) == [1, 3])
+        assert(list(result.loc[:, 'text']) == ['b', 'd'])
+
+        ranged_result = pd.concat(load_joined_df(self.conn, 'primary', ['secondary'], start_index=2, chunksize=1))
+        assert(list(ranged_result.index) == [3])
+
+        # Columns other than the index must not appear in more than one table.
+        save_df(pd.DataFrame({'x': [1.0]}, index=[1]), self.conn, 'overlapping')
+        with self.assertRaises(ValueError):
+            load_joined_df(self.conn, 'primary', ['secondary', 'overlapping'])
+
+    def test_table_saver(self):
+        saver = TableSaver(self.conn, 'out=1', indexes=['sent_id', ['sent_id', 'ngram']])
+        saver(pd.DataFrame({'ngram': ['a', 'b'], 'sent_id': [0, 0]}))
+
+        # Indexes are only created once the table is complete.
+        assert(self._get_index_names('out=1') == [])
+        saver(pd.DataFrame({'ngram': ['c'], 'sent_id': [1]}, index=[2]))
+        saver.finalize()
+
+        assert(self._get_index_names('out=1') == ['ix_out=1_index', 'ix_out=1_sent_id', 'ix_out=1_sent_id_ngram'])
+        result = pd.concat(load_df(self.conn, 'out=1', chunksize=10))
+        assert(list(result.loc[:, 'ngram']) == ['a', 'b', 'c'])
+        assert(list(result.index) == [0, 1, 2])
+        # ANALYZE was run.
+        assert(self.conn.execute('SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = ?', ('out=1',)).fetchone()[0] > 0)
+
+    def test_get_saved_size(self):
+        df = pd.DataFrame({'ngram': [f'ngram {i}' for i in range(5000)], 'sent_id': range(5000)})
+        size = get_saved_size(df, lambda conn: TableSaver(conn, 'out=1'))
+        indexed_size = get_saved_size(df, lambda conn: TableSaver(conn, 'out=1', indexes=['ngram']))
+        assert(0 < size < indexed_size)
+        assert(get_saved_size(df.iloc[:0], lambda conn: TableSaver(conn, 'out=1')) == 0)
+        # Only the in-memory database is written.
+        assert(not self.conn.execute("SELECT name FROM sqlite_master WHERE name = 'out=1'").fetchone())
+
+    def test_clustered_table_saver(self):
+        saver = TableSaver(self.conn, 'out=2', clustered=True)
+        saver(pd.DataFrame({'ngram': ['b', 'a'], 'sent_id': [1, 0], 'position': [0, 0]}))
+        saver(pd.DataFrame({'ngram': ['c'], 'sent_id': [0], 'position': [1]}, index=[2]))
+        saver.finalize()
+
+        create_sql = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'out=2'").fetchone()[0]
+        assert('WITHOUT ROWID' in create_sql)
+        # Rows are stored in (sent_id, position) order.
+        result = pd.concat(load_df(self.conn, 'out=2', chunksize=10))
+        assert(list(result.loc[:, 'ngram']) == ['a', 'c', 'b'])
+        assert(list(result.index) == [1, 2, 0])
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            saver(pd.DataFrame({'ngram': ['d'], 'sent_id': [0], 'position': [1]}))
+
+    def _get_index_names(self, table_name):
+        rows = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? ORDER BY name",
+            (table_name,))
+        return [r[0] for r in rows]
+
+    def test_partitioned_table_saver_start_indices(self):
+        table_names = {1: 'out=1', 2: 'out=2'}
+        PartitionedTableSaver(self.conn, table_names, 'n')(pd.DataFrame({'ngram': ['a', 'b'], 'n': [1, 2]}))
+
+        # A second saver continues the existing tables.
+        saver = PartitionedTableSaver(self.conn, table_names, 'n', start_indices={1: 1, 2: 1})
+        saver(pd.DataFrame({'ngram': ['c', 'd'], 'n': [1, 1]}))
+        saver.finalize()
+
+        result = pd.concat(load_df(self.conn, 'out=1', chunksize=10))
+        assert(list(result.loc[:, 'ngram']) == ['a', 'c', 'd'])
+        assert(list(result.index) == [0, 1, 2])
+
+    def test_create_joined_view(self):
+        TableSaver(self.conn, 'out=1')(pd.DataFrame({'ngram': ['a', 'b', 'c'], 'sent_id': [0, 0, 2]}))
+        # The metadata table continues an earlier table's index.
+        TableSaver(self.conn, 'metadata', start_index=5)(pd.DataFrame({'sent_id': [0, 1, 2], 'meta': ['x', 'y', 'z']}))
+        assert(list(pd.concat(load_df(self.conn, 'metadata', chunksize=10)).index) == [5, 6, 7])
+
+        create_joined_view(self.conn, 'out=1_with_metadata', 'out=1', 'metadata')
+        create_joined_view(self.conn, 'out=1_with_metadata', 'out=1', 'metadata')
+        result = pd.read_sql('SELECT * FROM "out=1_with_metadata" ORDER BY "index"', self.conn)
+        assert(list(result.columns) == ['index', 'ngram', 'sent_id', 'meta'])
+        assert(list(result.loc[:, 'meta']) == ['x', 'x', 'z'])
+
+    def test_load_index_ranges(self):
+        save_df(pd.DataFrame({'text': list('abcdefg')}, index=[0, 1, 2, 5, 6, 9, 10]), self.conn, 'primary')
+
+        chunks = list(load_index_ranges(self.conn, 'primary', rows_per_range=2, ranges_per_chunk=2))
+        assert(chunks == [
+            [IndexRange(0, 2, 2), IndexRange(2, 6, 2)],
+            [IndexRange(6, 10, 2), IndexRange(10, 11, 1)],
+        ])
+        chunks = list(load_index_ranges(self.conn, 'primary', rows_per_range=3, start_index=2, end_index=10))
+        assert(chunks == [[IndexRange(2, 9, 3)], [IndexRange(9, 10, 1)]])
+        assert(list(load_index_ranges(self.conn, 'primary', rows_per_range=3, start_index=20)) == [])
+
+    def test_range_reader(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            database_path = os.path.join(temp_dir, 'test.db')
+            conn = sqlite3.connect(database_path)
+            save_df(pd.DataFrame({'text': list('abcde')}, index=[0, 1, 2, 5, 6]), conn, 'primary')
+            save_df(pd.DataFrame({'x': [10, 20, 50]}, index=[1, 2, 5]), conn, 'secondary')
+            conn.close()
+
+            reader = RangeReader(database_path, 'primary')
+            assert(list(reader(IndexRange(1, 6, 3)).loc[:, 'text']) == ['b', 'c', 'd'])
+            assert(reader.split(IndexRange(1, 7, 4)) == [IndexRange(1, 5, 2), IndexRange(5, 7, 2)])
+
+            joined_reader = RangeReader(database_path, 'primary', ['secondary'])
+            result = joined_reader(IndexRange(0, 6, 4))
+            assert(list(result.columns) == ['text', 'x'])
+            assert(list(result.index) == [1, 2, 5])
+
+            # The connection is read-only.
+            with self.assertRaises(sqlite3.OperationalError):
+                reader._get_connection().execute('DELETE FROM "primary"')
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+from utilities import estimation_utilities as eu
+
+class EstimationUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        # 100 rows of 10 tokens, 20 of which were parsed into 400 output rows.
+        self.costs = eu.SampleCosts(
+            num_rows=100,
+            num_tokens=1000,
+            pre_extraction_seconds=1.0,
+            num_parsed_rows=20,
+            num_parsed_tokens=200,
+            parse_seconds=4.0,
+            extraction_seconds=2.0,
+            peak_bytes=2000,
+            output_rows={'default': 400},
+            output_bytes={'default': 8000},
+            output_disk_bytes={'default': 6000})
+        return super().setUp()
+
+    def test_extrapolate(self):
+        estimate = eu.extrapolate(self.costs, 1000, batch_size=50, num_processes=4)
+        assert(estimate.num_tokens == 10000)
+        assert(estimate.output_rows == {'default': 20000})
+        assert(estimate.output_bytes == {'default': 400000})
+        assert(estimate.output_disk_bytes == {'default': 300000})
+        # 10 bytes per token, 100 tokens per row.
+        assert(estimate.peak_sub_batch_bytes == 5000)
+        # Pre-extraction and parsing run in the parent; extraction in the 4 workers.
+        assert(np.isclose(estimate.seconds, 10 + 200 + 100 / 4))
+
+        estimate = eu.extrapolate(self.costs, 1000, batch_size=None, num_processes=4, preprocess_in_workers=True)
+        assert(estimate.batch_size == 1000)
+        assert(estimate.peak_sub_batch_bytes == 100000)
+        assert(np.isclose(estimate.seconds, (10 + 200 + 100) / 4))
+
+    def test_suggest_batch_size(self):
+        assert(eu.suggest_batch_size(self.costs, 5000, 1000) == 50)
+        assert(eu.suggest_batch_size(self.costs, 5099, 1000) == 50)
+        assert(eu.suggest_batch_size(self.costs, 1, 1000) == 1)
+        # Every worker gets a sub-batch.
+        assert(eu.suggest_batch_size(self.costs, 10 ** 9, 1000, num_processes=8) == 125)
+
+    def test_measure_peak_memory(self):
+        result, peak_bytes = eu.measure_peak_memory(lambda: len(np.ones(10 ** 6)))
+        assert(result == 10 ** 6)
+        assert(peak_bytes >= 8 * 10 ** 6)
+
+    def test_estimate_report(self):
+        report = eu.get_estimate_report(eu.extrapolate(self.costs, 1000, batch_size=50))
+        assert(report['Output Rows (default)'] == '20,000')
+        assert(report['Output Size on Disk (default)'] == '293.0 KB')
+        assert(eu.format_bytes(3 * 1024 ** 3) == '3.0 GB')
@@ -0,0 +1,44 @@
+import unittest
+import numpy as np
+from processing_functions import featurization_helpers
+from utilities.spacy_utilities import Spacy_Manager
+
+class FeaturizationHelpersTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_strings = [
+            "Lorem ipsum may be used as a placeholder",
+            "It is also used",
+            ""
+        ]
+        self.test_docs = list(Spacy_Manager.generate_docs(self.test_strings))
+        # Assign parts-of-speech directly, so the tests do not depend on the tagger.
+        pos_cycle = ['NOUN', 'VERB', 'ADJ', 'DET']
+        for d in self.test_docs:
+            for i, w in enumerate(d):
+                w.pos_ = pos_cycle[i % len(pos_cycle)]
+
+        return super().setUp()
+
+    def test_get_pos_ids_ngrams(self):
+        center_pos_ids = featurization_helpers.get_pos_ids(self.test_docs)
+        expected = list(featurization_helpers.generate_pos_tags(self.test_docs[:2]))
+        assert(center_pos_ids.shape == (len(self.test_docs),))
+        assert(list(featurization_helpers.decode_pos_ids(center_pos_ids[:2])) == expected)
+        # Empty Docs have no tag.
+        assert(featurization_helpers.decode_pos_ids(center_pos_ids[2:])[0] == '')
+
+    def test_get_pos_ids_all_words(self):
+        pos_ids, offsets = featurization_helpers.get_pos_ids(self.test_docs, is_ngrams=False)
+        assert(list(offsets) == [0, 8, 12, 12])
+        decoded = featurization_helpers.decode_pos_ids(pos_ids)
+        for i, tags in enumerate(featurization_helpers.generate_pos_tags(self.test_docs, is_ngrams=False)):
+            assert(list(decoded[offsets[i]:offsets[i + 1]]) == list(tags))
+
+    def test_get_pos_filter_indices(self):
+        pos_filter = ['NOUN', 'ADJ']
+        result = featurization_helpers.get_pos_filter_indices(self.test_docs, pos_filter)
+        expected = featurization_helpers._create_tag_filter(
+            featurization_helpers.generate_pos_tags(self.test_docs, is_ngrams=False),
+            set(pos_filter))
+        assert([list(r) for r in result] == expected)
+        assert(isinstance(result[0], np.ndarray))
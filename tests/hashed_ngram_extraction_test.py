@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from processing_functions import hashed_ngram_extraction, ngram_generation
+from utilities.spacy_utilities import Spacy_Manager
+
+class HashedNgramExtractionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_strings = [
+            "hello world this is it",
+            "an article",
+            "x",
+            "hello world this is it hello world"
+        ]
+        self.test_docs = list(Spacy_Manager.generate_docs(self.test_strings))
+        self.test_df = pd.DataFrame({'test': self.test_docs}, index=[4, 7, 8, 12])
+
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._temp_dir.name
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_hash_ngram_windows(self):
+        # Windows hash to the same feature exactly when their ngram strings are equal.
+        for n in [1, 2]:
+            rows, features = hashed_ngram_extraction.hash_ngram_windows(
+                self.test_docs, [None] * len(self.test_docs), [n], 'inv', 2 ** 20)
+            ngrams = [g for d in self.test_docs for g in ngram_generation.generate_ngrams(d, n=n)]
+            assert(list(rows) == [i for i, d in enumerate(self.test_docs) for _ in range(len(d))])
+            assert(len(set(zip(ngrams, features))) == len(set(ngrams)) == len(set(features)))
+
+        # Windows of different sizes are different features.
+        _, features = hashed_ngram_extraction.hash_ngram_windows(self.test_docs[2:3], [None], [1, 2], 'inv', 2 ** 20)
+        assert(len(set(features)) == 2)
+
+    def test_generate_corpus_hashed_ngrams(self):
+        store = hashed_ngram_extraction.HashedNgramStore(self.output_dir)
+        for batch_df in [self.test_df.iloc[2:], self.test_df.iloc[:2]]:
+            result = hashed_ngram_extraction.generate_corpus_hashed_ngrams(batch_df, 'test', self.output_dir, n=1, num_features=2 ** 16)
+            assert(list(result.loc[:, 'sent_id']) == list(batch_df.index))
+            assert(list(result.loc[:, 'num_windows']) == [len(d) for d in batch_df.loc[:, 'test']])
+            store(result)
+        assert(store.num_written == self.test_df.shape[0])
+        assert(len(hashed_ngram_extraction.list_shards(self.output_dir)) == 2)
+
+        matrix, sent_ids = hashed_ngram_extraction.load_hashed_ngrams(self.output_dir)
+        assert(list(sent_ids) == [4, 7, 8, 12])
+        assert(matrix.shape == (4, 2 ** 16))
+        assert(list(np.asarray(matrix.sum(axis=1)).ravel()) == [5, 2, 1, 7])
+        # "hello world this" appears in the first and last texts only.
+        _, features = hashed_ngram_extraction.hash_ngram_windows(self.test_docs[:1], [[1]], [1], 'inv', 2 ** 16)
+        assert(list(matrix[:, features[0]].toarray().ravel()) == [1, 0, 0, 1])
+
+        # A new store removes the previous run's shards.
+        hashed_ngram_extraction.HashedNgramStore(self.output_dir)
+        assert(len(os.listdir(self.output_dir)) == 0)
+
+    def test_include_pos(self):
+        idx_filter = [[0, 2], [1], [], [0]]
+        result = hashed_ngram_extraction.generate_corpus_hashed_ngrams(
+            self.test_df, 'test', self.output_dir, n=[1, 2], idx_filter=idx_filter, include_pos=True)
+        assert(list(result.loc[:, 'num_windows']) == [4, 2, 0, 2])
+
+        matrix, _ = hashed_ngram_extraction.load_hashed_ngrams(self.output_dir)
+        assert(matrix.shape == (4, hashed_ngram_extraction.DEFAULT_NUM_FEATURES))
+        assert(matrix[2].nnz == 0)
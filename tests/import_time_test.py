@@ -0,0 +1,31 @@
+import os
+import unittest
+from utilities.import_utilities import get_import_times, get_imported_heavy_modules
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ImportTimeTests(unittest.TestCase):
+    '''
+    Heavy dependencies (pandas, spaCy, NLTK, SciPy) must only be imported
+    once a stage needs them. Run `python -m utilities.import_utilities`
+    to see what an import spends its time on.
+    '''
+    def setUp(self) -> None:
+        self._cwd = os.getcwd()
+        os.chdir(PACKAGE_DIRECTORY)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        os.chdir(self._cwd)
+        return super().tearDown()
+
+    def test_module_imports(self):
+        for module_name in ['dataset_runner', 'pipeline', 'utilities.worker_utilities']:
+            import_times = get_import_times(f'import {module_name}')
+            assert(module_name in [m for m, _ in import_times])
+            assert(get_imported_heavy_modules(import_times) == [])
+
+    def test_script_help(self):
+        import_times = get_import_times('', python_args=['sst_script.py', '--help'])
+        assert('dataset_runner' in [m for m, _ in import_times])
+        assert(get_imported_heavy_modules(import_times) == [])
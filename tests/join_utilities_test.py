@@ -0,0 +1,40 @@
+import unittest
+import pandas as pd
+from utilities.join_utilities import join_by_index
+
+class JoinUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.primary_df = pd.DataFrame({'text': [f'text {i}' for i in range(10)]})
+        # The secondary source is missing indices 3 and 7.
+        self.secondary_df = pd.DataFrame({'a': [i * 10 for i in range(10) if i not in [3, 7]]}, index=[i for i in range(10) if i not in [3, 7]])
+        return super().setUp()
+
+    @staticmethod
+    def chunk(df: pd.DataFrame, chunk_sizes):
+        start = 0
+        for size in chunk_sizes:
+            yield df.iloc[start:start + size]
+            start += size
+
+    def test_join_with_different_chunk_sizes(self):
+        expected = self.primary_df.join(self.secondary_df, how='inner')
+
+        for primary_sizes, secondary_sizes in [([10], [8]), ([3, 3, 4], [8]), ([4, 6], [1, 1, 5, 1]), ([1] * 10, [3, 3, 2])]:
+            result = list(join_by_index(
+                JoinUtilitiesTests.chunk(self.primary_df, primary_sizes),
+                [JoinUtilitiesTests.chunk(self.secondary_df, secondary_sizes)]))
+            assert(len(result) == len(primary_sizes))
+            assert(pd.concat(result).equals(expected))
+
+    def test_join_multiple_sources(self):
+        tertiary_df = pd.DataFrame({'b': range(5)}, index=range(5))
+        expected = self.primary_df.join([self.secondary_df, tertiary_df], how='inner')
+
+        result = list(join_by_index(
+            JoinUtilitiesTests.chunk(self.primary_df, [2, 2, 6]),
+            [JoinUtilitiesTests.chunk(self.secondary_df, [5, 3]), iter([tertiary_df])]))
+        assert(pd.concat(result).equals(expected))
+
+    def test_unsorted_input(self):
+        with self.assertRaises(ValueError):
+            list(join_by_index([self.primary_df.iloc[::-1]], [iter([self.secondary_df])]))
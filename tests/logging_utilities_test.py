@@ -0,0 +1,42 @@
+from multiprocessing import Pool
+import os
+import tempfile
+import unittest
+from utilities.logging_utilities import append_log_record, read_log_records
+
+def _append_records(args):
+    log_path, writer_id, num_records = args
+    for i in range(num_records):
+        append_log_record(log_path, {'run_name': f'writer-{writer_id}', 'record': i, 'padding': 'x' * 1000})
+
+class LoggingUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._log_path = os.path.join(self._temp_dir.name, 'logs', 'run_log.jsonl')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_append_log_record(self):
+        append_log_record(self._log_path, {'run_name': 'a', 'value': 1})
+        append_log_record(self._log_path, {'run_name': 'b', 'value': 2})
+        append_log_record(self._log_path, {'run_name': 'a', 'value': 3})
+
+        assert(len(read_log_records(self._log_path)) == 3)
+        assert([r['value'] for r in read_log_records(self._log_path, run_name='a')] == [1, 3])
+
+    def test_concurrent_appends(self):
+        num_writers = 4
+        num_records = 50
+        with Pool(num_writers) as p:
+            p.map(_append_records, [(self._log_path, i, num_records) for i in range(num_writers)])
+
+        # Every line must be a complete record.
+        with open(self._log_path) as fp:
+            num_lines = sum(1 for _ in fp)
+        assert(num_lines == num_writers * num_records)
+        for i in range(num_writers):
+            records = read_log_records(self._log_path, run_name=f'writer-{i}')
+            assert([r['record'] for r in records] == list(range(num_records)))
@@ -72,6 +72,25 @@ class NgramGenerationTests(unittest.TestCase):
 
         assert(((result == result_metadata_list).all()).all())
 
+    def test_generate_corpus_metadata(self):
+        test_col_name = 'test'
+        test_df = pd.DataFrame({test_col_name: self.test_docs, 'metadata_col': self.test_metadata, 'other': ['a', 'b', 'c']}, index=[5, 6, 7])
+
+        metadata_df = ngram_generation.generate_corpus_metadata(test_df, test_col_name)
+        assert(list(metadata_df.columns) == ['sent_id', 'metadata_col', 'other'])
+        assert(list(metadata_df.loc[:, 'sent_id']) == [5, 6, 7])
+        metadata_df = ngram_generation.generate_corpus_metadata(test_df, test_col_name, include_metadata=['other'])
+        assert(list(metadata_df.columns) == ['sent_id', 'other'])
+
+        # Joining the metadata to the ngrams reproduces the joined output.
+        expected = ngram_generation.generate_corpus_ngrams(test_df, test_col_name, n=[1, 2], include_metadata=True)
+        ngrams_df = ngram_generation.generate_corpus_ngrams(test_df, test_col_name, n=[1, 2])
+        metadata_df = ngram_generation.generate_corpus_metadata(test_df, test_col_name)
+        result = ngrams_df.merge(metadata_df, on='sent_id', how='inner')
+        sort_cols = [ngram_generation.WINDOW_SIZE_COLUMN_NAME, 'sent_id']
+        assert(result.sort_values(sort_cols, kind='stable').reset_index(drop=True).equals(
+            expected.sort_values(sort_cols, kind='stable').reset_index(drop=True)))
+
     def test_ngram_generation_at_position_no_padding(self):
         result = ngram_generation.generate_ngram_at_position(self.test_docs[0], 3)
         expected = "publishing and graphic design Lorem"
@@ -94,3 +113,42 @@ class NgramGenerationTests(unittest.TestCase):
         assert(len(result) == len(self.test_strings[0].split()))
         for i, s in expected_ngrams.items():
             assert(result[i] == s)
+
+    def test_generate_corpus_ngrams_multiple_window_sizes(self):
+        test_col_name = 'test'
+        metadata_col_name = 'metadata_col'
+        test_df = pd.DataFrame({test_col_name: self.test_docs, metadata_col_name: self.test_metadata})
+        window_sizes = [1, 2, 3]
+
+        result = ngram_generation.generate_corpus_ngrams(test_df, test_col_name, n=window_sizes, include_metadata=True)
+        assert(result.shape[0] == len(window_sizes) * sum([len(x.split()) for x in self.test_strings]))
+
+        # Each window size must match a separate, single-size run.
+        for n in window_sizes:
+            expected = ngram_generation.generate_corpus_ngrams(test_df, test_col_name, n=n, include_metadata=True)
+            window_result = result[result[ngram_generation.WINDOW_SIZE_COLUMN_NAME] == n]
+            window_result = window_result.drop(columns=ngram_generation.WINDOW_SIZE_COLUMN_NAME).reset_index(drop=True)
+            assert(window_result.equals(expected))
+
+    def test_generate_corpus_ngrams_with_pos(self):
+        test_col_name = 'test'
+        for d in self.test_docs:
+            for i, w in enumerate(d):
+                w.pos_ = 'NOUN' if i % 2 == 0 else 'VERB'
+        test_df = pd.DataFrame({test_col_name: self.test_docs})
+        test_idx_filter = [[0, 3, 4], [1, 2], []]
+
+        result = ngram_generation.generate_corpus_ngrams(
+            test_df, test_col_name, n=[1, 2], idx_filter=test_idx_filter, include_pos=True)
+        assert(list(result[ngram_generation.POS_COLUMN_NAME]) == ['NOUN', 'VERB', 'NOUN', 'VERB', 'NOUN'] * 2)
+
+    def test_generate_corpus_ngrams_with_position(self):
+        test_col_name = 'test'
+        test_df = pd.DataFrame({test_col_name: self.test_docs})
+        test_idx_filter = [[0, 3, 4], [1, 2], []]
+
+        result = ngram_generation.generate_corpus_ngrams(test_df, test_col_name, idx_filter=test_idx_filter, include_position=True)
+        assert(list(result[ngram_generation.POSITION_COLUMN_NAME]) == [0, 3, 4, 1, 2])
+
+        result = ngram_generation.generate_corpus_ngrams(test_df, test_col_name, include_position=True)
+        assert(not result.duplicated(['sent_id', ngram_generation.POSITION_COLUMN_NAME]).any())
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from utilities import parse_scheduling_utilities as psu
+from utilities.spacy_utilities import Spacy_Manager
+
+class ParseSchedulingUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_strings = [
+            'a b c d e f g h i j',
+            'x',
+            'hello world',
+            ' '.join(['long'] * 40),
+            'y z',
+            '',
+            'one two three four five six seven eight nine',
+        ]
+        return super().setUp()
+
+    def test_schedule_batches(self):
+        token_counts = psu.estimate_token_counts(self.test_strings)
+        assert(list(token_counts) == [10, 1, 2, 40, 2, 1, 9])
+        assert(list(psu.get_length_buckets(token_counts)) == [3, 0, 1, 5, 1, 0, 3])
+
+        batches = psu.schedule_batches(token_counts, max_batch_tokens=12)
+        # Batches are ordered by length bucket, then by input position.
+        assert([list(b) for b in batches] == [[1, 5, 2, 4], [0], [6], [3]])
+        for b in batches:
+            assert(token_counts[b].sum() <= 12 or len(b) == 1)
+
+        batches = psu.schedule_batches(token_counts, max_batch_tokens=1000, max_batch_size=3)
+        assert([len(b) for b in batches] == [3, 3, 1])
+        assert(sorted(np.concatenate(batches)) == list(range(len(self.test_strings))))
+
+    def test_restore_order(self):
+        batches = psu.schedule_batches(psu.estimate_token_counts(self.test_strings), max_batch_tokens=12)
+        scheduled = [self.test_strings[i] for b in batches for i in b]
+        assert(psu.restore_order(scheduled, batches) == self.test_strings)
+
+    def test_generate_docs(self):
+        expected = [d.text for d in Spacy_Manager.generate_docs(self.test_strings, n_threads=1, length_bucketing=False)]
+        assert(expected == self.test_strings)
+        docs = Spacy_Manager.generate_docs(self.test_strings, n_threads=1, max_batch_tokens=12, length_bucketing=True)
+        assert([d.text for d in docs] == expected)
+
+        # Length bucketing needs a single spaCy process.
+        with self.assertRaises(ValueError):
+            Spacy_Manager.generate_docs(self.test_strings, n_threads=2, length_bucketing=True)
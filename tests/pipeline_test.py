@@ -1,10 +1,21 @@
+import asyncio
+import gc
 import math
 import os
+import shutil
+import sqlite3
+import tempfile
+import time
 import unittest
-from pipeline import Pipeline
+from pipeline import FeatureOutput, Pipeline
+from processing_functions import ngram_generation
+from processing_functions import text_preprocessing as tp
 import pandas as pd
 from spacy.tokens.doc import Doc as sp_Doc
+from utilities.database_utilities import RangeReader, load_index_ranges, save_df
+from utilities.logging_utilities import read_log_records
 from utilities.spacy_utilities import Spacy_Manager
+from utilities.worker_utilities import WorkerPool, supports_memory_recycling
 
 class PipelineTests(unittest.TestCase):
     # Set up and helper functions
@@ -28,7 +39,7 @@ class PipelineTests(unittest.TestCase):
         self.test_df = pd.DataFrame(test_data, columns=['test_col', 'm1', 'm2', 'm3', 'm4'])
         self.secondary_test_df = pd.DataFrame(test_secondary_data, columns=['a'])
 
-        self._log_path = './test_logs.json'
+        self._log_path = './test_logs.jsonl'
         return super().setUp()
 
     def tearDown(self) -> None:
@@ -42,6 +53,41 @@ class PipelineTests(unittest.TestCase):
     def simple_extraction_fn(data):
         return data
 
+    @staticmethod
+    def docs_to_text_fn(data):
+        return pd.DataFrame({
+            'text': data.loc[:, 'text'],
+            'tokens': [' '.join(t.text for t in d) for d in data.loc[:, 'text_spdocs']]
+        })
+
+    @staticmethod
+    def docs_to_lengths_fn(data):
+        return pd.DataFrame({'num_tokens': [len(d) for d in data.loc[:, 'text_spdocs']]})
+
+    @staticmethod
+    def docs_to_ngrams_fn(data):
+        return ngram_generation.generate_corpus_ngrams(data, 'text_spdocs', n=1, include_position=True)
+
+    @staticmethod
+    def increment_fn(data):
+        return data + 1
+
+    @staticmethod
+    def double_fn(data):
+        return data * 2
+
+    @staticmethod
+    def poison_extraction_fn(data):
+        if (data.loc[:, 'test_col'] == 3).any():
+            raise ValueError('poison row')
+        return data
+
+    @staticmethod
+    def hanging_extraction_fn(data):
+        if (data.loc[:, 'test_col'] == 4).any():
+            time.sleep(60)
+        return data
+
     # Test functions
     def test_standard_configuration(self):
         pre_extraction_fns = [
@@ -167,4 +213,559 @@ class PipelineTests(unittest.TestCase):
         assert(res_concat.shape[1] == self.test_df.shape[1])
         assert((res_concat == self.test_df).all(axis=None))
 
-        
\ No newline at end of file
+    def test_memory_budget(self):
+        post_extraction_fns = [
+            lambda x: x - 1
+        ]
+        batch_size = 2
+        saved_dfs = []
+
+        def save_fn(df: pd.DataFrame):
+            saved_dfs.append(df.copy(deep=True))
+
+        # A tiny budget forces every sub-batch's output to be spilled to disk.
+        p = Pipeline(
+            data_save_fn=save_fn,
+            pre_extraction_fns=[],
+            feature_extraction_fn=PipelineTests.simple_extraction_fn,
+            post_extraction_fns=post_extraction_fns,
+            text_column_name='test_col',
+            ngram_column_name='test_col',
+            batch_size=batch_size,
+            memory_budget=1,
+            log_filepath=self._log_path
+        )
+        p.start([self.test_df.copy(deep=True), self.test_df.copy(deep=True)])
+
+        result = pd.concat(saved_dfs, axis=0)
+        expected = pd.concat([self.test_df, self.test_df], axis=0, ignore_index=True)
+        expected.loc[:, 'test_col'] = expected.loc[:, 'test_col'] - 1
+        assert(len(saved_dfs) > 2)
+        assert(list(result.index) == list(range(expected.shape[0])))
+        assert((result == expected).all(axis=None))
+
+    def test_executors(self):
+        post_extraction_fns = [
+            lambda x: x - 1
+        ]
+        batch_size = 2
+        expected = self.test_df.copy(deep=True)
+        expected.loc[:, 'test_col'] = expected.loc[:, 'test_col'] - 1
+
+        for executor in ['process', 'thread', 'serial']:
+            saved_dfs = []
+            p = Pipeline(
+                data_save_fn=saved_dfs.append,
+                pre_extraction_fns=[],
+                feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                post_extraction_fns=post_extraction_fns,
+                text_column_name='test_col',
+                ngram_column_name='test_col',
+                batch_size=batch_size,
+                num_processes=2,
+                executor=executor,
+                log_filepath=self._log_path
+            )
+            p.start([self.test_df.copy(deep=True)])
+            assert((pd.concat(saved_dfs, axis=0) == expected).all(axis=None))
+
+        with self.assertRaises(ValueError):
+            Pipeline(
+                data_save_fn=None,
+                pre_extraction_fns=[],
+                feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                post_extraction_fns=[],
+                text_column_name='test_col',
+                ngram_column_name='test_col',
+                executor='unknown',
+                log_filepath=self._log_path
+            )
+
+    def test_preloaded_workers(self):
+        saved_dfs = []
+        log_dict = {}
+        p = Pipeline(
+            data_save_fn=saved_dfs.append,
+            pre_extraction_fns=[],
+            feature_extraction_fn=PipelineTests.simple_extraction_fn,
+            post_extraction_fns=[],
+            text_column_name='test_col',
+            ngram_column_name='test_col',
+            batch_size=2,
+            num_processes=2,
+            start_method='fork',
+            preload_workers=True,
+            log_filepath=self._log_path,
+            log_dict=log_dict
+        )
+        p.start([self.test_df.copy(deep=True)])
+        assert((pd.concat(saved_dfs, axis=0) == self.test_df).all(axis=None))
+        assert(log_dict['Pipeline Settings']['Start Method'] == 'fork')
+        assert(log_dict['Worker Startup']['Workers Started'] == '2')
+
+        # A pool that fails to start unfreezes the garbage collector.
+        with self.assertRaises(ValueError):
+            WorkerPool(0, start_method='fork', preload=True)
+        assert(gc.get_freeze_count() == 0)
+
+    def test_profiling(self):
+        post_extraction_fns = [
+            lambda x: x - 1
+        ]
+        profile_directory = tempfile.mkdtemp()
+        try:
+            for executor in ['process', 'serial']:
+                log_dict = {}
+                p = Pipeline(
+                    data_save_fn=lambda x: x,
+                    pre_extraction_fns=[lambda x: x + 1],
+                    feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                    post_extraction_fns=post_extraction_fns,
+                    text_column_name='test_col',
+                    ngram_column_name='test_col',
+                    batch_size=2,
+                    num_processes=2,
+                    executor=executor,
+                    profile=True,
+                    profile_directory=profile_directory,
+                    log_filepath=self._log_path,
+                    log_dict=log_dict,
+                    run_name=f'profiled {executor} run'
+                )
+                p.start([self.test_df.copy(deep=True)])
+
+                summary = log_dict['Profile']
+                run_directory = os.path.join(profile_directory, f'profiled_{executor}_run')
+                assert(summary['Directory'] == run_directory)
+                for stage in ['pre_extraction', 'feature_extraction', 'post_extraction', 'save']:
+                    assert(len(summary[stage]) > 0)
+                    assert(os.path.exists(os.path.join(run_directory, f'merged_{stage}.prof')))
+        finally:
+            shutil.rmtree(profile_directory)
+
+    def test_run_log(self):
+        for run_name in ['first run', 'second run']:
+            p = Pipeline(
+                data_save_fn=lambda x: x,
+                pre_extraction_fns=[],
+                feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                post_extraction_fns=[],
+                text_column_name='test_col',
+                ngram_column_name='test_col',
+                batch_size=2,
+                num_processes=2,
+                executor='serial',
+                log_filepath=self._log_path,
+                run_name=run_name
+            )
+            p.start([self.test_df.iloc[:4].copy(deep=True), self.test_df.iloc[4:].copy(deep=True)])
+
+        # Earlier runs are kept as they were written.
+        assert(len(read_log_records(self._log_path)) == 8)
+        records = read_log_records(self._log_path, run_name='second run')
+        assert([r['event'] for r in records] == ['start', 'chunk', 'chunk', 'end'])
+        assert([r['input_rows'] for r in records[1:3]] == [4, 2])
+        assert([r['output_rows'] for r in records[1:3]] == [4, 2])
+        assert(records[-1]['log']['Pipeline Settings']['Executor'] == 'serial')
+
+    def test_preprocess_in_workers(self):
+        test_df = pd.DataFrame({'text': [
+            'Hello,   World!',
+            'This is  an article.',
+            'It is an article; this is it',
+            'Hello world',
+            'x',
+        ]})
+        pre_extraction_fns = [
+            tp.remove_punctuation,
+            tp.lowercase_words,
+            tp.normalize_spacing
+        ]
+
+        outputs = []
+        for executor, preprocess_in_workers in [('serial', False), ('serial', True), ('thread', True), ('process', True)]:
+            saved_dfs = []
+            p = Pipeline(
+                data_save_fn=saved_dfs.append,
+                pre_extraction_fns=pre_extraction_fns,
+                feature_extraction_fn=PipelineTests.docs_to_text_fn,
+                post_extraction_fns=[],
+                text_column_name='text',
+                ngram_column_name='tokens',
+                batch_size=2,
+                num_processes=2,
+                use_spacy=True,
+                executor=executor,
+                preprocess_in_workers=preprocess_in_workers,
+                log_filepath=self._log_path
+            )
+            p.start([test_df.copy(deep=True)])
+            outputs.append(pd.concat(saved_dfs, axis=0))
+
+        assert(list(outputs[0].loc[:, 'text']) == ['hello world', 'this is an article', 'it is an article this is it', 'hello world', 'x'])
+        for output in outputs[1:]:
+            assert(output.equals(outputs[0]))
+
+    def test_segmentation(self):
+        long_text = ' '.join(f'Word{i}, more words.' for i in range(30))
+        test_df = pd.DataFrame({'text': ['A short text.', long_text, 'Another short one.']})
+
+        temp_dir = tempfile.mkdtemp()
+        database_path = os.path.join(temp_dir, 'test.db')
+        conn = sqlite3.connect(database_path)
+        save_df(test_df, conn, 'primary')
+
+        outputs = []
+        for executor, preprocess_in_workers, max_segment_tokens, reads_in_workers in [
+            ('serial', False, None, False), ('serial', False, 20, False), ('thread', True, 20, False),
+            ('process', True, 20, False), ('process', True, 20, True)]:
+            saved_dfs = []
+            p = Pipeline(
+                data_save_fn=saved_dfs.append,
+                pre_extraction_fns=[tp.lowercase_words],
+                feature_extraction_fn=PipelineTests.docs_to_ngrams_fn,
+                post_extraction_fns=[],
+                text_column_name='text',
+                ngram_column_name='ngram',
+                batch_size=2,
+                num_processes=2,
+                use_spacy=True,
+                executor=executor,
+                preprocess_in_workers=preprocess_in_workers,
+                input_reader=RangeReader(database_path, 'primary') if reads_in_workers else None,
+                max_segment_tokens=max_segment_tokens,
+                segment_overlap=2,
+                log_filepath=self._log_path
+            )
+            chunks = load_index_ranges(conn, 'primary', rows_per_range=2) if reads_in_workers else [test_df.copy(deep=True)]
+            p.start(chunks)
+            outputs.append(pd.concat(saved_dfs, axis=0).sort_values(['sent_id', 'position'], kind='stable').reset_index(drop=True))
+
+        assert(outputs[0].shape[0] == 4 + 30 * 5 + 4)
+        for output in outputs[1:]:
+            assert(output.equals(outputs[0]))
+
+        # Segments made in the workers are re-split into sub-batches of batch_size rows.
+        sub_batch_sizes = []
+        def extraction_fn(data):
+            sub_batch_sizes.append(data.shape[0])
+            return PipelineTests.docs_to_ngrams_fn(data)
+        p = Pipeline(
+            data_save_fn=lambda df: None,
+            pre_extraction_fns=[],
+            feature_extraction_fn=extraction_fn,
+            post_extraction_fns=[],
+            text_column_name='text',
+            ngram_column_name='ngram',
+            batch_size=2,
+            use_spacy=True,
+            executor='serial',
+            preprocess_in_workers=True,
+            max_segment_tokens=20,
+            segment_overlap=2,
+            log_filepath=self._log_path
+        )
+        p.start([test_df.copy(deep=True)])
+        assert(len(sub_batch_sizes) > 2)
+        assert(max(sub_batch_sizes) == 2)
+
+        conn.close()
+        shutil.rmtree(temp_dir)
+
+        with self.assertRaises(ValueError):
+            Pipeline(
+                data_save_fn=print,
+                pre_extraction_fns=[],
+                feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                post_extraction_fns=[],
+                text_column_name='text',
+                ngram_column_name='ngram',
+                use_spacy=True,
+                max_segment_tokens=4,
+                segment_overlap=2
+            )
+
+    def test_estimate(self):
+        test_df = pd.DataFrame({'text': [' '.join(['Word,'] * (i % 7 + 1)) for i in range(40)]})
+        saved_dfs = []
+        p = Pipeline(
+            data_save_fn=saved_dfs.append,
+            pre_extraction_fns=[tp.remove_punctuation],
+            feature_extraction_fn=PipelineTests.docs_to_ngrams_fn,
+            post_extraction_fns=[],
+            text_column_name='text',
+            ngram_column_name='ngram',
+            batch_size=10,
+            num_processes=2,
+            use_spacy=True,
+            executor='serial',
+            log_filepath=self._log_path
+        )
+        estimate = p.estimate(test_df, 4 * test_df.shape[0], disk_size_fns={'default': lambda df: 1000})
+        assert(len(saved_dfs) == 0)
+        p.start([test_df.copy(deep=True)])
+        num_output_rows = pd.concat(saved_dfs, axis=0).shape[0]
+
+        # Every sample row was parsed, so the projection is exact.
+        assert(estimate.num_tokens == 4 * num_output_rows)
+        assert(estimate.output_rows == {'default': 4 * num_output_rows})
+        assert(estimate.output_disk_bytes == {'default': 4000})
+        assert(estimate.batch_size == 10)
+        assert(estimate.peak_sub_batch_bytes > 0)
+
+        # Parsing a sample of the rows.
+        estimate = p.estimate(test_df, 4 * test_df.shape[0], parse_sample_size=7)
+        assert(estimate.num_tokens == 4 * num_output_rows)
+        assert(estimate.output_rows['default'] > 0)
+
+        estimate = p.estimate(test_df, 4 * test_df.shape[0], max_sub_batch_bytes=10 ** 12)
+        assert(estimate.batch_size == 2 * test_df.shape[0])
+        with self.assertRaises(ValueError):
+            p.estimate(test_df.iloc[:0], 100)
+
+    def test_start_async(self):
+        post_extraction_fns = [
+            lambda x: x - 1
+        ]
+        expected = self.test_df.copy(deep=True)
+        expected.loc[:, 'test_col'] = expected.loc[:, 'test_col'] - 1
+
+        async def read_chunks(queue: asyncio.Queue):
+            while True:
+                df = await queue.get()
+                if df is None: return
+                yield df
+
+        async def run(executor, max_in_flight):
+            queue = asyncio.Queue()
+            for i in range(0, self.test_df.shape[0], 2):
+                queue.put_nowait(self.test_df.iloc[i:i + 2].copy(deep=True))
+            queue.put_nowait(None)
+
+            saved_dfs = []
+            async def save(df):
+                await asyncio.sleep(0)
+                saved_dfs.append(df)
+
+            p = Pipeline(
+                data_save_fn=save,
+                pre_extraction_fns=[],
+                feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                post_extraction_fns=post_extraction_fns,
+                text_column_name='test_col',
+                ngram_column_name='test_col',
+                batch_size=1,
+                num_processes=2,
+                executor=executor,
+                log_filepath=self._log_path
+            )
+            await p.start_async(read_chunks(queue), max_in_flight=max_in_flight)
+            return saved_dfs
+
+        for executor, max_in_flight in [('serial', 1), ('thread', 3), ('process', 2)]:
+            saved_dfs = asyncio.run(run(executor, max_in_flight))
+            assert(len(saved_dfs) == 3)
+            assert((pd.concat(saved_dfs, axis=0) == expected).all(axis=None))
+
+    def test_feature_outputs(self):
+        test_df = pd.DataFrame({'text': ['Hello,   World!', 'This is  an article.', 'x']})
+        for executor, preprocess_in_workers, memory_budget in [('serial', False, None), ('thread', True, None), ('process', True, 1)]:
+            log_dict = {}
+            saved_tokens, saved_lengths = [], []
+            p = Pipeline(
+                data_save_fn=saved_tokens.append,
+                pre_extraction_fns=[tp.remove_punctuation, tp.normalize_spacing],
+                feature_extraction_fn=PipelineTests.docs_to_text_fn,
+                post_extraction_fns=[lambda x: x.str.upper()],
+                text_column_name='text',
+                ngram_column_name='tokens',
+                feature_outputs={
+                    'lengths': FeatureOutput(
+                        PipelineTests.docs_to_lengths_fn,
+                        saved_lengths.append,
+                        post_extraction_fns=[lambda x: x * 10],
+                        column_name='num_tokens')
+                },
+                batch_size=2,
+                num_processes=2,
+                use_spacy=True,
+                executor=executor,
+                preprocess_in_workers=preprocess_in_workers,
+                memory_budget=memory_budget,
+                log_filepath=self._log_path,
+                log_dict=log_dict
+            )
+            p.start([test_df.copy(deep=True)])
+
+            tokens_df = pd.concat(saved_tokens, axis=0)
+            lengths_df = pd.concat(saved_lengths, axis=0)
+            assert(list(tokens_df.loc[:, 'tokens']) == ['HELLO WORLD', 'THIS IS AN ARTICLE', 'X'])
+            assert(list(lengths_df.loc[:, 'num_tokens']) == [20, 40, 10])
+            assert(list(lengths_df.index) == [0, 1, 2])
+            assert(log_dict['Feature Outputs']['lengths']['Output Column Name'] == 'num_tokens')
+
+        # The default output is optional when named outputs are provided.
+        saved_lengths = []
+        p = Pipeline(
+            data_save_fn=None,
+            pre_extraction_fns=[tp.remove_punctuation, tp.normalize_spacing],
+            feature_extraction_fn=None,
+            post_extraction_fns=[],
+            text_column_name='text',
+            ngram_column_name=None,
+            feature_outputs={'lengths': FeatureOutput(PipelineTests.docs_to_lengths_fn, saved_lengths.append)},
+            use_spacy=True,
+            executor='serial',
+            log_filepath=self._log_path
+        )
+        p.start([test_df.copy(deep=True)])
+        assert(list(pd.concat(saved_lengths, axis=0).loc[:, 'num_tokens']) == [2, 4, 1])
+
+    def test_fault_isolation(self):
+        expected = self.test_df.drop(index=3).reset_index(drop=True)
+        for executor in ['process', 'thread', 'serial']:
+            saved_dfs, quarantined_dfs = [], []
+            log_dict = {}
+            p = Pipeline(
+                data_save_fn=saved_dfs.append,
+                pre_extraction_fns=[],
+                feature_extraction_fn=PipelineTests.poison_extraction_fn,
+                post_extraction_fns=[],
+                text_column_name='test_col',
+                ngram_column_name='test_col',
+                batch_size=4,
+                num_processes=2,
+                executor=executor,
+                max_retries=1,
+                quarantine_fn=quarantined_dfs.append,
+                log_filepath=self._log_path,
+                log_dict=log_dict
+            )
+            p.start([self.test_df.copy(deep=True)])
+
+            result = pd.concat(saved_dfs, axis=0)
+            quarantined = pd.concat(quarantined_dfs, axis=0)
+            assert(list(result.index) == list(range(expected.shape[0])))
+            assert((result == expected).all(axis=None))
+            assert(list(quarantined.index) == [3])
+            assert('poison row' in quarantined.loc[3, 'error'])
+            assert(log_dict['Quarantined Rows'] == '1')
+            # 2 attempts on the first sub-batch, then its halves and quarters.
+            assert(log_dict['Failed Sub-Batch Attempts'] == '4')
+
+        # Without a quarantine, the error is raised once the retries are used up.
+        p = Pipeline(
+            data_save_fn=saved_dfs.append,
+            pre_extraction_fns=[],
+            feature_extraction_fn=PipelineTests.poison_extraction_fn,
+            post_extraction_fns=[],
+            text_column_name='test_col',
+            ngram_column_name='test_col',
+            batch_size=4,
+            executor='serial',
+            max_retries=1,
+            log_filepath=self._log_path
+        )
+        with self.assertRaises(ValueError):
+            p.start([self.test_df.copy(deep=True)])
+
+    def test_task_timeout(self):
+        saved_dfs, quarantined_dfs = [], []
+        log_dict = {}
+        p = Pipeline(
+            data_save_fn=saved_dfs.append,
+            pre_extraction_fns=[],
+            feature_extraction_fn=PipelineTests.hanging_extraction_fn,
+            post_extraction_fns=[],
+            text_column_name='test_col',
+            ngram_column_name='test_col',
+            batch_size=2,
+            num_processes=2,
+            task_timeout=2,
+            quarantine_fn=quarantined_dfs.append,
+            log_filepath=self._log_path,
+            log_dict=log_dict
+        )
+        start = time.perf_counter()
+        p.start([self.test_df.copy(deep=True)])
+        assert(time.perf_counter() - start < 30)
+
+        result = pd.concat(saved_dfs, axis=0)
+        assert(list(result.loc[:, 'test_col']) == [0, 1, 2, 3, 5])
+        assert(list(pd.concat(quarantined_dfs, axis=0).index) == [4])
+
+    def test_worker_recycling(self):
+        # Fails on Python versions whose multiprocessing.pool has not been checked.
+        assert(supports_memory_recycling())
+        saved_dfs = []
+        log_dict = {}
+        # Every worker is replaced after its first task.
+        p = Pipeline(
+            data_save_fn=saved_dfs.append,
+            pre_extraction_fns=[],
+            feature_extraction_fn=PipelineTests.simple_extraction_fn,
+            post_extraction_fns=[],
+            text_column_name='test_col',
+            ngram_column_name='test_col',
+            batch_size=1,
+            num_processes=2,
+            max_worker_memory_mb=0,
+            log_filepath=self._log_path,
+            log_dict=log_dict
+        )
+        p.start([self.test_df.copy(deep=True), self.test_df.copy(deep=True)])
+        expected = pd.concat([self.test_df, self.test_df], axis=0, ignore_index=True)
+        assert((pd.concat(saved_dfs, axis=0) == expected).all(axis=None))
+        assert(int(log_dict['Recycled Workers']) > 0)
+
+    def test_input_reader(self):
+        temp_dir = tempfile.mkdtemp()
+        database_path = os.path.join(temp_dir, 'test.db')
+        conn = sqlite3.connect(database_path)
+        save_df(self.test_df, conn, 'primary')
+        expected = self.test_df.copy(deep=True)
+        expected.loc[:, 'test_col'] = (expected.loc[:, 'test_col'] + 1) * 2
+
+        for executor in ['process', 'thread', 'serial']:
+            saved_dfs = []
+            log_dict = {}
+            p = Pipeline(
+                data_save_fn=saved_dfs.append,
+                pre_extraction_fns=[PipelineTests.increment_fn, PipelineTests.double_fn],
+                feature_extraction_fn=PipelineTests.simple_extraction_fn,
+                post_extraction_fns=[],
+                text_column_name='test_col',
+                ngram_column_name='test_col',
+                num_processes=2,
+                executor=executor,
+                input_reader=RangeReader(database_path, 'primary'),
+                log_filepath=self._log_path,
+                log_dict=log_dict
+            )
+            p.start(load_index_ranges(conn, 'primary', rows_per_range=2, ranges_per_chunk=2))
+            result = pd.concat(saved_dfs, axis=0)
+            assert(len(saved_dfs) == 2)
+            assert(list(result.index) == list(range(expected.shape[0])))
+            assert((result.reset_index(drop=True) == expected).all(axis=None))
+            assert(log_dict['Pipeline Settings']['Reading in Workers'] == 'True')
+
+        # Failing ranges are bisected by row.
+        saved_dfs, quarantined_dfs = [], []
+        p = Pipeline(
+            data_save_fn=saved_dfs.append,
+            pre_extraction_fns=[],
+            feature_extraction_fn=PipelineTests.poison_extraction_fn,
+            post_extraction_fns=[],
+            text_column_name='test_col',
+            ngram_column_name='test_col',
+            executor='serial',
+            input_reader=RangeReader(database_path, 'primary'),
+            quarantine_fn=quarantined_dfs.append,
+            log_filepath=self._log_path
+        )
+        p.start(load_index_ranges(conn, 'primary', rows_per_range=4))
+        assert(list(pd.concat(saved_dfs, axis=0).loc[:, 'test_col']) == [0, 1, 2, 4, 5])
+        assert(list(pd.concat(quarantined_dfs, axis=0).index) == [3])
+
+        conn.close()
+        shutil.rmtree(temp_dir)
@@ -0,0 +1,70 @@
+import unittest
+import pandas as pd
+from processing_functions import ngram_generation
+from utilities import segmentation_utilities as su
+from utilities.spacy_utilities import Spacy_Manager
+
+class SegmentationUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tokenizer = Spacy_Manager.get_nlp().tokenizer
+        long_words = [f'w{i}' for i in range(40)]
+        long_words[9] = 'x,y'
+        long_words[22] = 'p-q'
+        self.test_df = pd.DataFrame({
+            'text': ['a short text', ' '.join(long_words), 'another short one', ' '.join(long_words[:15])],
+            'meta': [1, 2, 3, 4],
+        }, index=[10, 11, 12, 13])
+        return super().setUp()
+
+    def test_get_segment_spans(self):
+        tokens = self.tokenizer(' '.join(f'w{i}' for i in range(20)))
+        spans = su.get_segment_spans(tokens, max_tokens=8, overlap=2)
+        assert(spans == [(0, 0, 4, 6), (2, 4, 8, 10), (6, 8, 12, 14), (10, 12, 16, 18), (14, 16, 20, 20)])
+
+        # Segments only start and end at whitespace.
+        tokens = self.tokenizer('a b c,d e f g')
+        assert([t.text for t in tokens] == ['a', 'b', 'c', ',', 'd', 'e', 'f', 'g'])
+        spans = su.get_segment_spans(tokens, max_tokens=4, overlap=1)
+        assert(spans[:3] == [(0, 0, 2, 5), (1, 2, 4, 5), (2, 4, 6, 7)])
+
+        with self.assertRaises(ValueError):
+            su.get_segment_spans(tokens, max_tokens=4, overlap=2)
+
+    def test_segment_long_texts(self):
+        segmented_df = su.segment_long_texts(self.test_df, 'text', max_tokens=12, overlap=2)
+        assert(list(segmented_df.index) == list(range(segmented_df.shape[0])))
+        sent_ids = list(su.get_sent_ids(segmented_df))
+        assert([sent_ids.count(i) for i in [10, 11, 12, 13]] == [1, 6, 1, 3])
+        assert(sent_ids == sorted(sent_ids))
+        assert(list(segmented_df.loc[:, 'meta']) == [{10: 1, 11: 2, 12: 3, 13: 4}[i] for i in sent_ids])
+
+        # Short texts are unchanged.
+        assert(su.segment_long_texts(self.test_df, 'text', max_tokens=50, overlap=2) is self.test_df)
+
+    def test_concat_segments(self):
+        dfs = [su.segment_long_texts(self.test_df.iloc[i:j], 'text', max_tokens=12, overlap=2) for i, j in [(0, 2), (2, 3), (3, 4)]]
+        assert([su.is_segmented(df) for df in dfs] == [True, False, True])
+        result = su.concat_segments(dfs)
+        expected = su.segment_long_texts(self.test_df, 'text', max_tokens=12, overlap=2)
+        assert(result.equals(expected))
+
+    def test_segmented_ngrams(self):
+        segmented_df = su.segment_long_texts(self.test_df, 'text', max_tokens=12, overlap=2)
+        for df in [self.test_df, segmented_df]:
+            df['docs'] = list(Spacy_Manager.generate_docs(df.loc[:, 'text'], n_threads=1))
+
+        kwargs = {'n': [1, 2], 'include_position': True, 'include_metadata': ['meta']}
+        expected = ngram_generation.generate_corpus_ngrams(self.test_df, 'docs', **kwargs)
+        result = ngram_generation.generate_corpus_ngrams(segmented_df, 'docs', **kwargs)
+        assert(expected.equals(result))
+
+        # Segments' metadata is only joined once per text.
+        result = ngram_generation.generate_corpus_ngrams(segmented_df, 'docs', n=2, include_metadata=True)
+        assert(list(result.columns) == ['ngram', 'sent_id', 'text', 'meta'])
+        assert(result.shape[0] == expected.shape[0] // 2)
+
+        # Each text's metadata is kept once, even when its segments are in different batches.
+        metadata_dfs = [ngram_generation.generate_corpus_metadata(df, 'docs', ['meta']) for df in [segmented_df.iloc[:3], segmented_df.iloc[3:]]]
+        metadata_df = pd.concat(metadata_dfs, ignore_index=True)
+        assert(list(metadata_df.loc[:, 'sent_id']) == [10, 11, 12, 13])
+        assert(list(metadata_df.loc[:, 'meta']) == [1, 2, 3, 4])
@@ -0,0 +1,63 @@
+import sqlite3
+import unittest
+import pandas as pd
+from utilities.database_utilities import load_df, load_df_range, save_df
+from utilities.sharding_utilities import get_shard_ranges, get_shard_table_name, merge_shards
+
+class ShardingUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.conn = sqlite3.connect(':memory:')
+        self.input_df = pd.DataFrame({'text': [f'text {i}' for i in range(10)]}, index=range(100, 110))
+        save_df(self.input_df, self.conn, 'input')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        return super().tearDown()
+
+    def test_shard_ranges_cover_table(self):
+        for num_shards in [1, 3, 4, 10, 12]:
+            ranges = get_shard_ranges(self.conn, 'input', num_shards)
+            assert(len(ranges) == num_shards)
+
+            shard_dfs = [df for (s, e) in ranges for df in load_df_range(self.conn, 'input', s, e, chunksize=3)]
+            result = pd.concat(shard_dfs)
+            assert(list(result.index) == list(self.input_df.index))
+            assert(list(result.loc[:, 'text']) == list(self.input_df.loc[:, 'text']))
+
+    def test_merge_shards(self):
+        num_shards = 3
+        ranges = get_shard_ranges(self.conn, 'input', num_shards)
+
+        # Each shard writes its own output, indexed from 0, as an independent Pipeline run would.
+        for shard_id, (start_index, end_index) in enumerate(ranges):
+            start_idx = 0
+            for chunk in load_df_range(self.conn, 'input', start_index, end_index, chunksize=2):
+                output_df = pd.DataFrame({'ngram': chunk.loc[:, 'text'].str.upper(), 'sent_id': chunk.index})
+                output_df.index = range(start_idx, start_idx + output_df.shape[0])
+                save_df(output_df, self.conn, get_shard_table_name('output', shard_id, num_shards))
+                start_idx += output_df.shape[0]
+
+        merge_shards(self.conn, 'output', num_shards, chunksize=2)
+
+        result = pd.concat(load_df(self.conn, 'output', chunksize=100))
+        assert(list(result.index) == list(range(self.input_df.shape[0])))
+        assert(list(result.loc[:, 'sent_id']) == list(self.input_df.index))
+        assert(list(result.loc[:, 'ngram']) == list(self.input_df.loc[:, 'text'].str.upper()))
+
+        tables = self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'").fetchall()
+        assert(set(t[0] for t in tables) == {'input', 'output'})
+
+    def test_shard_ranges_with_max_index(self):
+        num_shards = 3
+        ranges = get_shard_ranges(self.conn, 'input', num_shards, max_index=109)
+        assert(ranges[-1][1] == 110)
+
+        # Rows appended after the run was planned do not move the ranges and are left out.
+        save_df(pd.DataFrame({'text': ['appended'] * 5}, index=range(110, 115)), self.conn, 'input')
+        assert(get_shard_ranges(self.conn, 'input', num_shards, max_index=109) == ranges)
+        assert(get_shard_ranges(self.conn, 'input', num_shards) != ranges)
+
+        shard_dfs = [df for (s, e) in ranges for df in load_df_range(self.conn, 'input', s, e, chunksize=3)]
+        result = pd.concat(shard_dfs)
+        assert(list(result.index) == list(self.input_df.index))
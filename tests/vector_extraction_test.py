@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from processing_functions import vector_extraction
+from utilities.spacy_utilities import Spacy_Manager
+
+class VectorExtractionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_strings = [
+            "hello world this is it",
+            "an article",
+            "x",
+            "world hello"
+        ]
+        self.test_docs = list(Spacy_Manager.generate_docs(self.test_strings))
+        self.test_df = pd.DataFrame({'test': self.test_docs}, index=[4, 7, 8, 12])
+        self.vector_size = Spacy_Manager.get_vector_size()
+
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._temp_dir.name
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self._temp_dir.cleanup()
+        return super().tearDown()
+
+    def test_generate_corpus_doc_vectors(self):
+        store = vector_extraction.DocVectorStore(self.output_dir, self.test_df.index, self.vector_size)
+
+        # Batches are written out of order to check that rows are keyed by sent_id.
+        for batch_df in [self.test_df.iloc[2:], self.test_df.iloc[:2]]:
+            result = vector_extraction.generate_corpus_doc_vectors(batch_df, 'test', self.output_dir)
+            assert(list(result.loc[:, 'sent_id']) == list(batch_df.index))
+            store(result)
+        store.finalize()
+        assert(store.num_written == self.test_df.shape[0])
+
+        doc_vectors = np.load(os.path.join(self.output_dir, vector_extraction.DOC_VECTORS_FILENAME))
+        sent_ids = np.load(os.path.join(self.output_dir, vector_extraction.SENT_IDS_FILENAME))
+        assert(list(sent_ids) == list(self.test_df.index))
+        for i, d in enumerate(self.test_docs):
+            assert(np.allclose(doc_vectors[i], d.vector, atol=1e-5))
+
+    def test_generate_corpus_ngram_vectors(self):
+        n = 1
+        pad_word = 'inv'
+        store = vector_extraction.DocVectorStore(self.output_dir, self.test_df.index, self.vector_size, dtype='float16')
+        for batch_df in [self.test_df.iloc[:3], self.test_df.iloc[3:]]:
+            store(vector_extraction.generate_corpus_doc_vectors(
+                batch_df, 'test', self.output_dir, include_ngram_vectors=True, n=n, pad_word=pad_word))
+        store.finalize()
+
+        ngram_vectors = np.load(os.path.join(self.output_dir, vector_extraction.NGRAM_VECTORS_FILENAME))
+        offsets = np.load(os.path.join(self.output_dir, vector_extraction.NGRAM_OFFSETS_FILENAME))
+        assert(ngram_vectors.dtype == np.float16)
+        assert(list(np.diff(offsets)) == [len(d) for d in self.test_docs])
+
+        # Each ngram vector is the mean of the token vectors in its (padded) window.
+        pad_vector = self.test_docs[0].vocab.get_vector(pad_word)
+        for i, d in enumerate(self.test_docs):
+            padded = [pad_vector] * n + [t.vector for t in d] + [pad_vector] * n
+            for pos in range(len(d)):
+                expected = np.mean(padded[pos:pos + 2 * n + 1], axis=0)
+                assert(np.allclose(ngram_vectors[offsets[i] + pos], expected, atol=1e-2))
+
+    def test_window_mean_vectors(self):
+        rng = np.random.default_rng(0)
+        token_vectors = rng.random((9, 5)).astype(np.float32)
+        pad_vector = rng.random(5).astype(np.float32)
+
+        for n in [0, 1, 2, 6]:
+            padded = [pad_vector] * n + list(token_vectors) + [pad_vector] * n
+            for positions in [list(range(token_vectors.shape[0])), [0, 4, 8], []]:
+                result = vector_extraction.generate_window_mean_vectors(token_vectors, pad_vector, n, positions)
+                assert(result.shape == (len(positions), token_vectors.shape[1]))
+                for i, pos in enumerate(positions):
+                    expected = np.mean(padded[pos:pos + 2 * n + 1], axis=0)
+                    assert(np.allclose(result[i], expected, atol=1e-6))
@@ -0,0 +1,35 @@
+import sqlite3
+import unittest
+from utilities.watermark_utilities import get_config_fingerprint, load_watermark, remove_watermark, save_watermark
+
+class WatermarkUtilitiesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.conn = sqlite3.connect(':memory:')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        return super().tearDown()
+
+    def test_config_fingerprint(self):
+        config = {'n': 2, 'pos_filter': ['NOUN', 'VERB'], 'model': 'en_core_web_lg-3.8.0'}
+        reordered_config = {'model': 'en_core_web_lg-3.8.0', 'pos_filter': ['NOUN', 'VERB'], 'n': 2}
+        assert(get_config_fingerprint(config) == get_config_fingerprint(reordered_config))
+        assert(get_config_fingerprint(config) != get_config_fingerprint({**config, 'n': 3}))
+
+    def test_watermarks(self):
+        assert(load_watermark(self.conn, 'out=1') is None)
+
+        save_watermark(self.conn, 'out=1', 'input', 10, 'abc')
+        save_watermark(self.conn, 'out=2', 'input', 10, 'def')
+        save_watermark(self.conn, 'out=1', 'input', 25, 'abc')
+
+        watermark = load_watermark(self.conn, 'out=1')
+        assert(watermark['input_table_name'] == 'input')
+        assert(watermark['max_input_index'] == 25)
+        assert(watermark['config_fingerprint'] == 'abc')
+        assert(load_watermark(self.conn, 'out=2')['max_input_index'] == 10)
+
+        remove_watermark(self.conn, 'out=1')
+        assert(load_watermark(self.conn, 'out=1') is None)
+        assert(load_watermark(self.conn, 'out=2') is not None)
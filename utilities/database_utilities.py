@@ -3,23 +3,291 @@ This file contains a few simple functions useful for loading
 tables from a SQLite database.
 '''
 
+from __future__ import annotations
+import os
+import pathlib
 import sqlite3
-import pandas as pd
+import threading
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Union
+import numpy as np
+from utilities.import_utilities import lazy_import
+
+pd = lazy_import('pandas')
+
+# Seconds a shared connection waits for another writer to finish.
+SHARED_CONNECTION_TIMEOUT = 300
+# Name of the column `save_df` stores a DataFrame's index in.
+INDEX_COLUMN_NAME = 'index'
+# Bytes of the database file read-only connections map into memory.
+DEFAULT_MMAP_SIZE = 2 ** 30
+
+# The read-only connections of `RangeReader`s, per thread (and process).
+_read_connections = threading.local()
+
+def open_connection(database_path: str, shared: bool = False) -> sqlite3.Connection:
+    '''
+    Opens a connection to a SQLite3 database.
+
+    Set `shared` to True when other connections will read from and write to the
+    same database at the same time. The database is switched to write-ahead
+    logging, so an open reader (e.g. from `load_df`) no longer blocks another
+    connection's writes, and writers wait for each other instead of failing.
+    '''
+    if not shared:
+        return sqlite3.connect(database_path)
+
+    conn = sqlite3.connect(database_path, timeout=SHARED_CONNECTION_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL;')
+    return conn
+
+def open_read_only_connection(database_path: str, mmap_size: int = DEFAULT_MMAP_SIZE) -> sqlite3.Connection:
+    '''
+    Opens a read-only connection to a SQLite3 database (URI `mode=ro`),
+    which reads up to `mmap_size` bytes of the file through memory-mapped
+    I/O instead of copying pages into its own cache.
+    '''
+    uri = pathlib.Path(database_path).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute('PRAGMA mmap_size={};'.format(int(mmap_size)))
+    return conn
 
 def load_table(conn: sqlite3.Connection, table_name: str) -> sqlite3.Cursor:
     cur = conn.cursor()
-    return cur.execute("SELECT * FROM {}".format(table_name))
+    return cur.execute('SELECT * FROM "{}"'.format(table_name))
 
 def load_df(conn: sqlite3.Connection, table_name: str, index_col = 'index', chunksize: int = 1) -> sqlite3.Cursor:
     '''
     Returns an iterator of DataFrames.
     '''
     return pd.read_sql(
-        'SELECT * FROM {}'.format(table_name), 
+        'SELECT * FROM "{}"'.format(table_name), 
         conn, 
         index_col = index_col,
         chunksize = chunksize)
 
+def load_df_range(
+    conn: sqlite3.Connection,
+    table_name: str,
+    start_index=None,
+    end_index=None,
+    index_col = 'index',
+    chunksize: int = 1):
+    '''
+    Returns an iterator of DataFrames containing the rows of `table_name`
+    with `start_index <= index < end_index`, ordered by index.
+    Either bound can be None to leave that side of the range open.
+    '''
+    conditions = []
+    sql_params = []
+    if start_index is not None:
+        conditions.append('"{}" >= ?'.format(index_col))
+        sql_params.append(start_index)
+    if end_index is not None:
+        conditions.append('"{}" < ?'.format(index_col))
+        sql_params.append(end_index)
+    where_clause = ' WHERE {}'.format(' AND '.join(conditions)) if len(conditions) > 0 else ''
+
+    return pd.read_sql(
+        'SELECT * FROM "{}"{} ORDER BY "{}"'.format(table_name, where_clause, index_col),
+        conn,
+        index_col = index_col,
+        params = sql_params,
+        chunksize = chunksize)
+
+def load_index_values(conn: sqlite3.Connection, table_name: str, index_col = 'index') -> np.ndarray:
+    '''
+    Returns the values of a table's index column, in increasing order.
+    '''
+    cur = conn.cursor()
+    rows = cur.execute('SELECT "{0}" FROM "{1}" ORDER BY "{0}"'.format(index_col, table_name))
+    return np.fromiter((r[0] for r in rows), dtype=np.int64)
+
+def load_joined_df(
+    conn: sqlite3.Connection,
+    table_name: str,
+    additional_table_names: List[str],
+    start_index=None,
+    end_index=None,
+    index_col = 'index',
+    chunksize: int = 1):
+    '''
+    Returns an iterator of DataFrames containing the rows of `table_name`
+    joined (inner join, by index) with every table in `additional_table_names`.
+
+    The join runs inside SQLite, so none of the tables need to be loaded
+    into memory. All tables must be in the database behind `conn`. Columns
+    are returned in table order; the index column of the additional tables
+    is not repeated. As with `load_df_range`, the rows can be limited to
+    `start_index <= index < end_index` and are ordered by index.
+
+    Raises a `ValueError` if a column other than the index appears in more
+    than one table, as `DataFrame.join` would.
+    '''
+    select_cols = ['"t0".*']
+    join_clauses = []
+    seen_cols = set(_get_column_names(conn, table_name))
+    for i, additional_table_name in enumerate(additional_table_names, start=1):
+        additional_cols = [col for col in _get_column_names(conn, additional_table_name) if col != index_col]
+        overlapping_cols = [col for col in additional_cols if col in seen_cols]
+        if len(overlapping_cols) > 0:
+            raise ValueError(f'Columns {overlapping_cols} of "{additional_table_name}" already appear in the joined tables.')
+        seen_cols.update(additional_cols)
+        for col in additional_cols:
+            select_cols.append('"t{}"."{}"'.format(i, col))
+        join_clauses.append('JOIN "{0}" AS "t{1}" ON "t{1}"."{2}" = "t0"."{2}"'.format(
+            additional_table_name, i, index_col))
+
+    conditions = []
+    sql_params = []
+    if start_index is not None:
+        conditions.append('"t0"."{}" >= ?'.format(index_col))
+        sql_params.append(start_index)
+    if end_index is not None:
+        conditions.append('"t0"."{}" < ?'.format(index_col))
+        sql_params.append(end_index)
+    where_clause = ' WHERE {}'.format(' AND '.join(conditions)) if len(conditions) > 0 else ''
+
+    sql_str = 'SELECT {} FROM "{}" AS "t0" {}{} ORDER BY "t0"."{}"'.format(
+        ', '.join(select_cols), table_name, ' '.join(join_clauses), where_clause, index_col)
+    return pd.read_sql(
+        sql_str,
+        conn,
+        index_col = index_col,
+        params = sql_params,
+        chunksize = chunksize)
+
+class IndexRange(NamedTuple):
+    '''
+    The rows of a table with `start_index <= index < end_index`, of which
+    there are `num_rows`.
+    '''
+    start_index: int
+    end_index: int
+    num_rows: int
+
+def load_index_ranges(
+    conn: sqlite3.Connection,
+    table_name: str,
+    rows_per_range: int,
+    ranges_per_chunk: int = 1,
+    start_index=None,
+    end_index=None,
+    index_col = 'index') -> Iterator[List[IndexRange]]:
+    '''
+    Returns an iterator of lists of `ranges_per_chunk` `IndexRange`s, each
+    holding `rows_per_range` consecutive rows of `table_name` (the last
+    range may hold fewer), so the rows themselves can be read elsewhere
+    (see `RangeReader`). As with `load_df_range`, the rows can be limited
+    to `start_index <= index < end_index`.
+
+    Only the index column is read, as it is iterated over.
+    '''
+    conditions = []
+    sql_params = []
+    if start_index is not None:
+        conditions.append('"{}" >= ?'.format(index_col))
+        sql_params.append(start_index)
+    if end_index is not None:
+        conditions.append('"{}" < ?'.format(index_col))
+        sql_params.append(end_index)
+    where_clause = ' WHERE {}'.format(' AND '.join(conditions)) if len(conditions) > 0 else ''
+
+    cur = conn.cursor()
+    rows = cur.execute(
+        'SELECT "{0}" FROM "{1}"{2} ORDER BY "{0}"'.format(index_col, table_name, where_clause),
+        sql_params)
+    chunk = []
+    range_start, num_rows, index_value = None, 0, None
+    for (index_value,) in rows:
+        if num_rows == rows_per_range:
+            chunk.append(IndexRange(range_start, index_value, num_rows))
+            range_start, num_rows = None, 0
+            if len(chunk) == ranges_per_chunk:
+                yield chunk
+                chunk = []
+        if range_start is None: range_start = index_value
+        num_rows += 1
+    if num_rows > 0:
+        chunk.append(IndexRange(range_start, index_value + 1, num_rows))
+    if len(chunk) > 0:
+        yield chunk
+
+class RangeReader:
+    '''
+    Reads the rows of an `IndexRange` of `table_name`, joined with every
+    table in `additional_table_names` as in `load_joined_df`, through a
+    read-only connection (see `open_read_only_connection`) opened by each
+    process and thread that uses the reader.
+
+    Passed to a Pipeline as its `input_reader`, the reader is sent to the
+    workers with each range (from `load_index_ranges`), so every worker
+    reads its own rows and the parent only reads the index column.
+    '''
+    def __init__(
+        self,
+        database_path: str,
+        table_name: str,
+        additional_table_names: List[str] = [],
+        index_col = 'index',
+        mmap_size: int = DEFAULT_MMAP_SIZE):
+        self.__name__ = 'read_index_range'
+        self._database_path = database_path
+        self._table_name = table_name
+        self._additional_table_names = list(additional_table_names)
+        self._index_col = index_col
+        self._mmap_size = mmap_size
+
+    def __call__(self, index_range: IndexRange) -> pd.DataFrame:
+        conn = self._get_connection()
+        if len(self._additional_table_names) > 0:
+            return load_joined_df(
+                conn,
+                self._table_name,
+                self._additional_table_names,
+                index_range.start_index,
+                index_range.end_index,
+                self._index_col,
+                chunksize=None)
+        return load_df_range(
+            conn, self._table_name, index_range.start_index, index_range.end_index, self._index_col, chunksize=None)
+
+    def split(self, index_range: IndexRange) -> List[IndexRange]:
+        '''
+        Splits `index_range` into two ranges holding half of its rows each.
+        '''
+        cur = self._get_connection().cursor()
+        rows = cur.execute(
+            'SELECT "{0}" FROM "{1}" WHERE "{0}" >= ? AND "{0}" < ? ORDER BY "{0}"'.format(self._index_col, self._table_name),
+            (index_range.start_index, index_range.end_index))
+        index_values = [r[0] for r in rows]
+        middle = len(index_values) // 2
+        if middle == 0: return [index_range]
+        return [
+            IndexRange(index_range.start_index, index_values[middle], middle),
+            IndexRange(index_values[middle], index_range.end_index, len(index_values) - middle),
+        ]
+
+    def _get_connection(self) -> sqlite3.Connection:
+        # A forked worker must not use the connections it inherited from its parent.
+        if getattr(_read_connections, 'pid', None) != os.getpid():
+            _read_connections.pid = os.getpid()
+            _read_connections.connections = dict()
+        key = (self._database_path, self._mmap_size)
+        if key not in _read_connections.connections:
+            _read_connections.connections[key] = open_read_only_connection(self._database_path, self._mmap_size)
+        return _read_connections.connections[key]
+
+def _get_column_names(conn: sqlite3.Connection, table_name: str) -> List[str]:
+    cur = conn.cursor()
+    return [row[1] for row in cur.execute('PRAGMA table_info("{}")'.format(table_name))]
+
+def table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    cur = conn.cursor()
+    row = cur.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (table_name,)).fetchone()
+    return row is not None
+
 def save_df(df: pd.DataFrame, conn: sqlite3.Connection, table_name: str):
     '''
     Saves incoming `pd.DataFrame` to a SQLite3 database.
@@ -27,6 +295,161 @@ def save_df(df: pd.DataFrame, conn: sqlite3.Connection, table_name: str):
     '''
     df.to_sql(table_name, conn, if_exists='append')
 
+class TableSaver:
+    '''
+    Saves incoming `pd.DataFrame`s to a SQLite3 table, like `save_df`, but
+    creates the table's indexes only once every DataFrame has been saved.
+
+    Building an index over a loaded table is much faster than updating it on
+    every insert, so `finalize` (called by the Pipeline after the last batch)
+    creates an index for the `index` column (as `save_df` does) and for every
+    entry of `indexes`, which can be a column name or a list of column names
+    for a multi-column index. It then runs `ANALYZE` so SQLite's query planner
+    can choose between the indexes.
+
+    If `clustered` is True, the table is created `WITHOUT ROWID` with the
+    `clustered_columns` as its primary key, so rows are stored in that order
+    (e.g. each sentence's ngrams next to each other, by position). The
+    clustered columns must be unique across the table.
+
+    If the table already exists, rows are appended to it (keeping its layout).
+    `start_index` is added to the index of every saved row, e.g. so rows
+    appended to an existing table continue its index.
+    '''
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        table_name: str,
+        indexes: Sequence[Union[str, List[str]]] = (),
+        clustered: bool = False,
+        clustered_columns: List[str] = ['sent_id', 'position'],
+        start_index: int = 0):
+        self.__name__ = 'save_df'
+        self._conn = conn
+        self._table_name = table_name
+        self._indexes = [INDEX_COLUMN_NAME] + list(indexes)
+        self._clustered = clustered
+        self._clustered_columns = clustered_columns
+        self._start_index = start_index
+        self._table_created = table_exists(conn, table_name)
+
+    def __call__(self, df: pd.DataFrame):
+        if self._start_index != 0:
+            df = df.set_axis(df.index + self._start_index, axis=0)
+        df = df.reset_index(names=INDEX_COLUMN_NAME)
+        if not self._table_created:
+            self._create_table(df)
+        df.to_sql(self._table_name, self._conn, if_exists='append', index=False)
+
+    def finalize(self):
+        if not self._table_created: return
+        create_indexes(self._conn, self._table_name, self._indexes)
+
+    def _create_table(self, df: pd.DataFrame):
+        # The table is created without any indexes; see `finalize`.
+        sql_str = pd.io.sql.get_schema(df, self._table_name, con=self._conn)
+        if self._clustered:
+            primary_key = ', '.join('"{}"'.format(c) for c in self._clustered_columns)
+            sql_str = '{},\n  PRIMARY KEY ({})\n) WITHOUT ROWID'.format(sql_str.rstrip()[:-1].rstrip(), primary_key)
+        self._conn.execute(sql_str)
+        self._conn.commit()
+        self._table_created = True
+
+def create_indexes(conn: sqlite3.Connection, table_name: str, indexes: Sequence[Union[str, List[str]]]):
+    '''
+    Creates an index on `table_name` for every entry of `indexes` (a column
+    name or a list of column names), then runs `ANALYZE` on the table.
+    Indexes that already exist are kept.
+    '''
+    cur = conn.cursor()
+    for index in indexes:
+        columns = [index] if isinstance(index, str) else list(index)
+        index_name = 'ix_{}_{}'.format(table_name, '_'.join(columns))
+        cur.execute('CREATE INDEX IF NOT EXISTS "{}" ON "{}" ({})'.format(
+            index_name, table_name, ', '.join('"{}"'.format(c) for c in columns)))
+    cur.execute('ANALYZE "{}"'.format(table_name))
+    conn.commit()
+
+def create_joined_view(conn: sqlite3.Connection, view_name: str, table_name: str, joined_table_name: str, on: str = 'sent_id'):
+    '''
+    Creates (or replaces) a view of the rows of `table_name` that have a
+    match in `joined_table_name` on column `on`, with every column of the
+    matching row (except its `index` and `on` columns) after their own.
+    '''
+    joined_cols = [c for c in _get_column_names(conn, joined_table_name) if c not in (INDEX_COLUMN_NAME, on)]
+    select_cols = ['"t0".*'] + ['"t1"."{}"'.format(c) for c in joined_cols]
+    cur = conn.cursor()
+    cur.execute('DROP VIEW IF EXISTS "{}"'.format(view_name))
+    cur.execute('CREATE VIEW "{}" AS SELECT {} FROM "{}" AS "t0" INNER JOIN "{}" AS "t1" ON "t0"."{}" = "t1"."{}"'.format(
+        view_name, ', '.join(select_cols), table_name, joined_table_name, on, on))
+    conn.commit()
+
+class PartitionedTableSaver:
+    '''
+    Saves incoming `pd.DataFrame`s to several SQLite3 tables, routing
+    each row by the value in its `partition_column_name` column.
+
+    `table_names` maps each partition value to an output table. The
+    partition column is dropped before saving and every table keeps its own
+    contiguous index, so each table matches what a separate run for that
+    partition would have saved.
+
+    Each table is written by a `TableSaver`; `table_saver_kwargs` (e.g.
+    `indexes` and `clustered`) are passed on to each of them.
+
+    `start_indices` can map partition values to the index their table's rows
+    start at (e.g. to continue an existing table). Indices start at 0 otherwise.
+    '''
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        table_names: dict,
+        partition_column_name: str,
+        start_indices: Optional[dict] = None,
+        **table_saver_kwargs):
+        self.__name__ = 'save_partitioned_df'
+        self._table_names = table_names
+        self._partition_column_name = partition_column_name
+        self._table_savers = {k: TableSaver(conn, v, **table_saver_kwargs) for k, v in table_names.items()}
+        self._next_idx = {k: (start_indices[k] if start_indices is not None else 0) for k in table_names}
+
+    def __call__(self, df: pd.DataFrame):
+        for partition in self._table_names:
+            partition_df = df.loc[df[self._partition_column_name] == partition]
+            partition_df = partition_df.drop(columns=self._partition_column_name)
+
+            start_idx = self._next_idx[partition]
+            partition_df.index = range(start_idx, start_idx + partition_df.shape[0])
+            self._table_savers[partition](partition_df)
+            self._next_idx[partition] += partition_df.shape[0]
+
+    def finalize(self):
+        for table_saver in self._table_savers.values():
+            table_saver.finalize()
+
+def get_saved_size(df: pd.DataFrame, create_saver: Callable[[sqlite3.Connection], Callable[[pd.DataFrame], None]]) -> int:
+    '''
+    Returns the bytes the rows of `df` take once saved to SQLite (with any
+    indexes the saver creates when finalized), by saving them to an
+    in-memory database with the saver `create_saver` returns for the
+    database's connection, e.g. a `TableSaver` or `PartitionedTableSaver`.
+    The pages of the tables' (empty) schema are not counted.
+    '''
+    return _get_saved_database_size(df, create_saver) - _get_saved_database_size(df.iloc[:0], create_saver)
+
+def _get_saved_database_size(df: pd.DataFrame, create_saver) -> int:
+    conn = sqlite3.connect(':memory:')
+    try:
+        saver = create_saver(conn)
+        saver(df)
+        finalize_fn = getattr(saver, 'finalize', None)
+        if callable(finalize_fn): finalize_fn()
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        conn.close()
+    return page_count * page_size
+
 def remove_existing_table(table_name: str, conn: sqlite3.Connection):
     '''
     Drops a table if it exists in the given SQLite3 database.
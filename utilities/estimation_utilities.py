@@ -0,0 +1,157 @@
+'''
+This file contains helpers used to plan a run before it starts: the
+costs measured on a sample of the input (see `Pipeline.estimate`) are
+extrapolated to the whole input, to predict the run's output size,
+memory use and duration, and to choose its `batch_size`.
+
+Ngram extraction emits about one row per (filtered) token, so every
+cost is measured per token and scaled by the input's estimated number
+of tokens. Estimates are only as good as the sample: they assume the
+sample's mix of text lengths and parts-of-speech holds for the whole
+input, and they do not include the time spent reading and saving rows.
+'''
+
+import math
+import tracemalloc
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+DEFAULT_SAMPLE_SIZE = 2000
+DEFAULT_PARSE_SAMPLE_SIZE = 200
+DEFAULT_BATCH_MEMORY_MB = 1024
+
+
+class SampleCosts(NamedTuple):
+    '''
+    The costs measured on a sample of the input. `num_rows` rows are
+    pre-processed and tokenized; the `num_parsed_rows` of them holding
+    `num_parsed_tokens` tokens are also parsed and featurized, and the
+    other fields describe those rows.
+    '''
+    num_rows: int
+    num_tokens: int
+    pre_extraction_seconds: float
+    num_parsed_rows: int
+    num_parsed_tokens: int
+    parse_seconds: float
+    extraction_seconds: float
+    peak_bytes: int
+    output_rows: Dict[str, int]
+    output_bytes: Dict[str, int]
+    output_disk_bytes: Dict[str, int]
+
+class RunEstimate(NamedTuple):
+    '''
+    The predicted totals of a run over `num_input_rows` rows. Output
+    totals are keyed by feature output name: `output_bytes` is an output's
+    size in memory and `output_disk_bytes` its size once saved (only for
+    outputs whose saved size was measured).
+    '''
+    num_input_rows: int
+    num_tokens: int
+    output_rows: Dict[str, int]
+    output_bytes: Dict[str, int]
+    output_disk_bytes: Dict[str, int]
+    batch_size: int
+    peak_sub_batch_bytes: int
+    seconds: float
+
+def measure_peak_memory(fn: Callable[[], object]) -> Tuple[object, int]:
+    '''
+    Runs `fn` and returns its result and the peak memory (in bytes) that
+    Python, NumPy and spaCy allocated while it ran, as traced by `tracemalloc`.
+    '''
+    was_tracing = tracemalloc.is_tracing()
+    if was_tracing:
+        tracemalloc.reset_peak()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+    else:
+        start_bytes = 0
+        tracemalloc.start()
+    try:
+        result = fn()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing: tracemalloc.stop()
+    return result, max(0, peak_bytes - start_bytes)
+
+def suggest_batch_size(costs: SampleCosts, max_sub_batch_bytes: int, num_input_rows: int, num_processes: int = 1) -> int:
+    '''
+    Returns the largest number of rows per sub-batch whose parsing and
+    feature extraction is projected to peak below `max_sub_batch_bytes`,
+    but no more than needed to give each of `num_processes` workers a
+    sub-batch.
+    '''
+    batch_size = math.ceil(num_input_rows / max(1, num_processes))
+    bytes_per_row = _get_peak_bytes_per_row(costs)
+    if bytes_per_row > 0:
+        batch_size = min(batch_size, math.floor(max_sub_batch_bytes / bytes_per_row))
+    return max(1, batch_size)
+
+def extrapolate(
+    costs: SampleCosts,
+    num_input_rows: int,
+    batch_size: Optional[int],
+    num_processes: int = 1,
+    preprocess_in_workers: bool = False,
+    parse_processes: int = 1) -> RunEstimate:
+    '''
+    Scales the costs measured on a sample to a run over `num_input_rows`
+    rows with sub-batches of `batch_size` rows (None for a single batch).
+
+    Parsing and feature extraction are divided between the `num_processes`
+    workers. Pre-extraction (and parsing, with `parse_processes` spaCy
+    processes) runs in the parent unless `preprocess_in_workers` is set.
+    '''
+    tokens_per_row = costs.num_tokens / costs.num_rows if costs.num_rows > 0 else 0.0
+    num_tokens = round(tokens_per_row * num_input_rows)
+    # Costs of the parsed rows are scaled by their share of the sample's tokens.
+    token_scale = num_tokens / costs.num_parsed_tokens if costs.num_parsed_tokens > 0 else 0.0
+    batch_size = batch_size if batch_size is not None else num_input_rows
+
+    pre_extraction_seconds = costs.pre_extraction_seconds / costs.num_rows * num_input_rows if costs.num_rows > 0 else 0.0
+    parse_seconds = costs.parse_seconds * token_scale
+    extraction_seconds = costs.extraction_seconds * token_scale
+    num_processes = max(1, num_processes)
+    if preprocess_in_workers:
+        seconds = (pre_extraction_seconds + parse_seconds + extraction_seconds) / num_processes
+    else:
+        seconds = pre_extraction_seconds + parse_seconds / max(1, parse_processes) + extraction_seconds / num_processes
+
+    return RunEstimate(
+        num_input_rows=num_input_rows,
+        num_tokens=num_tokens,
+        output_rows={name: round(rows * token_scale) for name, rows in costs.output_rows.items()},
+        output_bytes={name: round(size * token_scale) for name, size in costs.output_bytes.items()},
+        output_disk_bytes={name: round(size * token_scale) for name, size in costs.output_disk_bytes.items()},
+        batch_size=batch_size,
+        peak_sub_batch_bytes=round(_get_peak_bytes_per_row(costs) * min(batch_size, max(1, num_input_rows))),
+        seconds=seconds)
+
+def get_estimate_report(estimate: RunEstimate) -> Dict[str, str]:
+    '''
+    Returns the estimate as human-readable strings, keyed by description,
+    in the style of the Pipeline's log.
+    '''
+    report = {
+        'Input Rows': f'{estimate.num_input_rows:,}',
+        'Tokens': f'{estimate.num_tokens:,}',
+    }
+    for name, rows in estimate.output_rows.items():
+        report[f'Output Rows ({name})'] = f'{rows:,}'
+        report[f'Output Size in Memory ({name})'] = format_bytes(estimate.output_bytes[name])
+        if name in estimate.output_disk_bytes:
+            report[f'Output Size on Disk ({name})'] = format_bytes(estimate.output_disk_bytes[name])
+    report['Batch Size'] = f'{estimate.batch_size:,}'
+    report['Peak Memory per Sub-Batch'] = format_bytes(estimate.peak_sub_batch_bytes)
+    report['Wall Time'] = f'{estimate.seconds / 3600:.2f} hours ({estimate.seconds:,.0f} seconds)'
+    return report
+
+def format_bytes(num_bytes: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024: return f'{num_bytes:.1f} {unit}'
+        num_bytes /= 1024
+    return f'{num_bytes:.1f} TB'
+
+def _get_peak_bytes_per_row(costs: SampleCosts) -> float:
+    if costs.num_parsed_tokens == 0 or costs.num_rows == 0: return 0.0
+    return costs.peak_bytes / costs.num_parsed_tokens * costs.num_tokens / costs.num_rows
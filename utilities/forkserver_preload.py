@@ -0,0 +1,9 @@
+'''
+Imported by the fork server (see `worker_utilities.WorkerPool`) so the
+worker state is loaded once, before any worker is forked from it.
+'''
+
+from utilities.worker_utilities import freeze_gc, preload_worker_state
+
+preload_worker_state()
+freeze_gc()
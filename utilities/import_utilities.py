@@ -0,0 +1,104 @@
+'''
+This file contains helpers used to keep imports fast: heavy
+dependencies (pandas, spaCy, NLTK, SciPy) are only imported when
+the stage that needs them first runs, so `--help` and short runs
+do not pay for them.
+
+Run `python -m utilities.import_utilities [MODULE]` to print the
+slowest imports of MODULE (`dataset_runner` by default), measured
+with `python -X importtime`.
+'''
+
+import importlib
+import importlib.util
+import subprocess
+import sys
+import threading
+import types
+from typing import List, Optional, Tuple
+
+# Modules that must not be imported by `import dataset_runner` (or `--help`).
+HEAVY_MODULES = ('pandas', 'spacy', 'nltk', 'scipy')
+DEFAULT_REPORT_SIZE = 15
+
+
+class LazyModule(types.ModuleType):
+    '''
+    Stands in for a module until one of its attributes is first used,
+    which imports the module. The import is guarded by a lock, so threads
+    using the module for the first time at once all see it fully imported.
+    '''
+    def __init__(self, module_name: str):
+        super().__init__(module_name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_module'] = None
+
+    def __getattr__(self, attr: str):
+        # Only called for attributes not yet copied from the imported module.
+        module = self._lazy_load()
+        return getattr(module, attr)
+
+    def _lazy_load(self) -> types.ModuleType:
+        with self.__dict__['_lazy_lock']:
+            if self.__dict__['_lazy_module'] is None:
+                module = importlib.import_module(self.__name__)
+                # Later lookups find the module's attributes directly.
+                self.__dict__.update({k: v for k, v in module.__dict__.items() if k not in ('__name__', '__spec__')})
+                self.__dict__['_lazy_module'] = module
+        return self.__dict__['_lazy_module']
+
+def lazy_import(module_name: str) -> types.ModuleType:
+    '''
+    Returns `module_name` if it is already imported, or a `LazyModule`
+    that imports it when one of its attributes is first used.
+    '''
+    if module_name in sys.modules: return sys.modules[module_name]
+    return LazyModule(module_name)
+
+def is_module_available(module_name: str) -> bool:
+    '''
+    Returns whether `module_name` can be imported, without importing it
+    (parent packages of a submodule are imported).
+    '''
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except ImportError:
+        return False
+
+def get_import_times(statement: str, python_args: Optional[List[str]] = None) -> List[Tuple[str, int]]:
+    '''
+    Runs `statement` in a new interpreter with `-X importtime` and returns
+    every module it imported with its cumulative import time (in
+    microseconds), slowest first. `python_args` are passed to the interpreter
+    before `-c`, e.g. to run a script instead: `['script.py', '--help']`
+    replaces `-c statement`.
+    '''
+    command = [sys.executable, '-X', 'importtime']
+    command += python_args if python_args is not None else ['-c', statement]
+    result = subprocess.run(command, capture_output=True, text=True)
+
+    import_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, cumulative, module_name = line[len('import time:'):].split('|')
+        import_times.append((module_name.strip(), int(cumulative)))
+    return sorted(import_times, key=lambda t: t[1], reverse=True)
+
+def get_imported_heavy_modules(import_times: List[Tuple[str, int]]) -> List[str]:
+    '''
+    Returns the `HEAVY_MODULES` (top-level packages) found in `import_times`.
+    '''
+    imported = set(module_name.split('.')[0] for module_name, _ in import_times)
+    return [m for m in HEAVY_MODULES if m in imported]
+
+
+if __name__ == '__main__':
+    module_name = sys.argv[1] if len(sys.argv) > 1 else 'dataset_runner'
+    import_times = get_import_times(f'import {module_name}')
+    total = next((t for m, t in import_times if m == module_name), 0)
+    print(f'import {module_name}: {total / 1e6:.3f}s')
+    for m, t in import_times[:DEFAULT_REPORT_SIZE]:
+        print(f'{t / 1e6:>9.3f}s  {m}')
+    heavy_modules = get_imported_heavy_modules(import_times)
+    if len(heavy_modules) > 0:
+        print(f'Heavy modules imported: {", ".join(heavy_modules)}')
@@ -2,7 +2,7 @@
 Functions to help validate inputs.
 '''
 
-from typing import Iterable
+from typing import Iterable, List
 
 
 def validate_spacy_pos(pos_list: Iterable[str]):
@@ -14,4 +14,17 @@ def validate_spacy_pos(pos_list: Iterable[str]):
             invalid_pos.add(pos)
     
     if len(invalid_pos) > 0:
-        raise ValueError(f'Invalid part-of-speech provided: {invalid_pos}')
\ No newline at end of file
+        raise ValueError(f'Invalid part-of-speech provided: {invalid_pos}')
+
+def parse_window_sizes(window_sizes: str) -> List[int]:
+    '''
+    Parses a comma-separated list of ngram context sizes (e.g. "1,2,3").
+    Duplicate sizes are removed while preserving order.
+    '''
+    sizes = []
+    for size in window_sizes.split(','):
+        size = int(size)
+        if size < 0:
+            raise ValueError(f'Invalid ngram context size provided: {size}')
+        if size not in sizes: sizes.append(size)
+    return sizes
\ No newline at end of file
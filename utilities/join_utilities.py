@@ -0,0 +1,84 @@
+'''
+This file contains functions used to join several streams of
+DataFrames by index without loading them fully into memory.
+'''
+
+from __future__ import annotations
+from typing import Iterable, Iterator, List
+from utilities.import_utilities import lazy_import
+
+pd = lazy_import('pandas')
+
+def join_by_index(
+    df_generator: Iterable[pd.DataFrame],
+    additional_df_generators: List[Iterator[pd.DataFrame]]) -> Iterator[pd.DataFrame]:
+    '''
+    Performs a streaming, inner merge-join of `df_generator` with every
+    iterator in `additional_df_generators`, matching rows by index.
+
+    Yields one joined DataFrame per DataFrame from `df_generator`. The
+    additional iterators do not need to share the chunk boundaries (or
+    chunk sizes) of `df_generator`: each one is read only as far as the
+    largest index of the current chunk, and only its rows beyond that index
+    are buffered for the next chunk.
+
+    Every source must yield rows in increasing index order, as
+    `load_df_range` does, and indices must be unique within a source.
+    Rows without a match in every source are dropped, as with an inner
+    `DataFrame.join`.
+    '''
+    buffers = [_SortedBuffer(g) for g in additional_df_generators]
+    last_idx = None
+    for current_df in df_generator:
+        if current_df.shape[0] == 0:
+            yield current_df
+            continue
+
+        _validate_sorted(current_df, last_idx)
+        last_idx = current_df.index[-1]
+
+        current_additional_dfs = [b.pop_until(last_idx) for b in buffers]
+        yield current_df.join(current_additional_dfs, how='inner')
+
+class _SortedBuffer:
+    '''
+    Holds the rows read from an iterator of DataFrames that are not yet
+    needed by the primary source.
+    '''
+    def __init__(self, df_generator: Iterator[pd.DataFrame]):
+        self._df_generator = iter(df_generator)
+        self._buffered_dfs: List[pd.DataFrame] = []
+        self._exhausted = False
+        self._last_idx = None
+        self._columns = []
+
+    def pop_until(self, idx) -> pd.DataFrame:
+        '''
+        Returns (and removes from the buffer) every row with an index
+        less than or equal to `idx`.
+        '''
+        while not self._exhausted and (self._last_idx is None or self._last_idx < idx):
+            try:
+                df = next(self._df_generator)
+            except StopIteration:
+                self._exhausted = True
+                break
+            if df.shape[0] == 0: continue
+
+            _validate_sorted(df, self._last_idx)
+            self._last_idx = df.index[-1]
+            self._columns = df.columns
+            self._buffered_dfs.append(df)
+
+        if len(self._buffered_dfs) == 0:
+            return pd.DataFrame(columns=self._columns)
+
+        buffered_df = pd.concat(self._buffered_dfs, axis=0)
+        is_ready = buffered_df.index <= idx
+        remaining_df = buffered_df.loc[~is_ready]
+        self._buffered_dfs = [remaining_df] if remaining_df.shape[0] > 0 else []
+        return buffered_df.loc[is_ready]
+
+def _validate_sorted(df: pd.DataFrame, last_idx):
+    if not df.index.is_monotonic_increasing or (last_idx is not None and df.index[0] <= last_idx):
+        raise ValueError('DataFrames must be provided in increasing index order to be joined by index.')
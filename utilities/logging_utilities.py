@@ -2,8 +2,58 @@
 Contains functions to help with logging.
 '''
 
+import json
+import os
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where appends are not locked.
+    fcntl = None
+
 def get_fn_name(fn) -> str:
     try:
         return fn.__name__
     except:
-        return 'None'
\ No newline at end of file
+        return 'None'
+
+def append_log_record(log_path: str, record: dict):
+    '''
+    Appends `record` to the JSON-lines log at `log_path` as a single line.
+
+    The file is locked while the line is written, so records from several
+    processes (or threads) logging to the same file are never interleaved.
+    Earlier records are never read or rewritten, so each append takes the
+    same time regardless of the size of the log.
+    '''
+    line = json.dumps(record, default=str) + '\n'
+    log_dir = os.path.dirname(log_path)
+    if log_dir != '': os.makedirs(log_dir, exist_ok=True)
+
+    with open(log_path, mode='a') as fp:
+        if fcntl is not None: fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            fp.write(line)
+            fp.flush()
+        finally:
+            if fcntl is not None: fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+def read_log_records(log_path: str, run_name: Optional[str] = None) -> List[dict]:
+    '''
+    Returns the records of the JSON-lines log at `log_path`, in the order
+    they were written, optionally limited to the records of `run_name`.
+
+    Lines that cannot be parsed (e.g. a record that was still being
+    written) are skipped.
+    '''
+    records = []
+    with open(log_path, mode='r') as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if run_name is None or record.get('run_name') == run_name:
+                records.append(record)
+    return records
@@ -0,0 +1,70 @@
+'''
+This file contains functions used to schedule texts into spaCy
+batches by length, so each `nlp.pipe` batch holds texts of similar
+length and about the same number of tokens.
+
+Mixing short and very long texts in one batch wastes work in the
+model's padded batch computations, and a batch holding several long
+texts takes far longer than its neighbours.
+'''
+
+from typing import Iterable, List, Optional
+import numpy as np
+
+DEFAULT_MAX_BATCH_TOKENS = 50000
+
+
+def estimate_token_counts(texts: Iterable[str]) -> np.ndarray:
+    '''
+    Returns a cheap estimate of the number of tokens in each text: its
+    number of spaces plus one (punctuation is not counted separately).
+    Values that are not strings are estimated as a single token.
+    '''
+    return np.fromiter(
+        (t.count(' ') + 1 if isinstance(t, str) else 1 for t in texts),
+        dtype=np.int64)
+
+def get_length_buckets(token_counts: np.ndarray) -> np.ndarray:
+    '''
+    Returns the length bucket of each text: texts with `2 ** b` to
+    `2 ** (b + 1) - 1` estimated tokens are in bucket `b`.
+    '''
+    return np.floor(np.log2(np.maximum(token_counts, 1))).astype(np.int64)
+
+def schedule_batches(token_counts: np.ndarray, max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS, max_batch_size: Optional[int] = None) -> List[np.ndarray]:
+    '''
+    Groups texts into batches of similar length and returns the positions
+    (in the input) of the texts in each batch.
+
+    Texts are ordered by length bucket (see `get_length_buckets`), keeping
+    their input order within a bucket, and then split into consecutive
+    batches of at most `max_batch_tokens` estimated tokens and at most
+    `max_batch_size` texts. A text longer than `max_batch_tokens` is
+    batched on its own.
+    '''
+    token_counts = np.asarray(token_counts, dtype=np.int64)
+    order = np.argsort(get_length_buckets(token_counts), kind='stable')
+
+    batches = []
+    batch_start, batch_tokens = 0, 0
+    for i, num_tokens in enumerate(token_counts[order]):
+        batch_size = i - batch_start
+        if batch_size > 0 and (batch_tokens + num_tokens > max_batch_tokens or (max_batch_size is not None and batch_size >= max_batch_size)):
+            batches.append(order[batch_start:i])
+            batch_start, batch_tokens = i, 0
+        batch_tokens += num_tokens
+    if batch_start < len(order):
+        batches.append(order[batch_start:])
+    return batches
+
+def restore_order(scheduled_items: Iterable, batches: List[np.ndarray]) -> list:
+    '''
+    Returns the items produced for the texts of `batches` (e.g. parsed
+    Docs), given in the order they were scheduled, in the original order
+    of the texts.
+    '''
+    order = np.concatenate(batches) if len(batches) > 0 else np.empty(0, dtype=np.int64)
+    ordered = [None] * len(order)
+    for position, item in zip(order, scheduled_items):
+        ordered[position] = item
+    return ordered
@@ -0,0 +1,126 @@
+'''
+This file contains helpers used to profile each stage of a Pipeline
+run, in the parent process and in every worker, with cProfile.
+
+Every profile is written to a run directory as a `.prof` file named
+`{stage}_{process}.prof`, which can be read with `pstats` or tools such
+as snakeviz. `merge_profiles` combines the files of each stage.
+'''
+
+import cProfile
+from contextlib import contextmanager
+import os
+import pstats
+import re
+import threading
+from typing import Callable, Dict, List
+
+MERGED_PROFILE_PREFIX = 'merged_'
+DEFAULT_SUMMARY_SIZE = 10
+
+# Profilers of the tasks run by this (worker) process, keyed by stage and thread.
+_WORKER_PROFILERS: Dict[tuple, cProfile.Profile] = {}
+_WORKER_PROFILERS_LOCK = threading.Lock()
+
+
+def get_profile_directory(base_directory: str, run_name: str) -> str:
+    '''
+    Returns the directory a run's profiles are saved to: a subdirectory
+    of `base_directory` named after `run_name`.
+    '''
+    return os.path.join(base_directory, re.sub(r'[^\w.=-]+', '_', run_name))
+
+class StageProfiler:
+    '''
+    Profiles the Pipeline stages run in the parent process. Each stage
+    keeps one profiler, which is enabled every time the stage is run
+    (with `profile`) and saved to `profile_dir` by `dump`.
+    '''
+    def __init__(self, profile_dir: str):
+        self.profile_dir = profile_dir
+        self._profilers: Dict[str, cProfile.Profile] = {}
+        os.makedirs(profile_dir, exist_ok=True)
+
+    @contextmanager
+    def profile(self, stage: str):
+        if stage not in self._profilers:
+            self._profilers[stage] = cProfile.Profile()
+        profiler = self._profilers[stage]
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    def dump(self):
+        for stage, profiler in self._profilers.items():
+            profiler.dump_stats(os.path.join(self.profile_dir, f'{stage}_parent.prof'))
+
+class ProfiledTask:
+    '''
+    Wraps a function run by the worker pool so that every call is profiled
+    in the worker running it. A worker's calls accumulate into one profile
+    (per thread), which is saved to `profile_dir` after every call.
+
+    Instances can be pickled and sent to process workers.
+    '''
+    def __init__(self, fn: Callable, profile_dir: str, stage: str):
+        self._fn = fn
+        self._profile_dir = profile_dir
+        self._stage = stage
+        self.__name__ = getattr(fn, '__name__', 'None')
+
+    def __call__(self, *args, **kwargs):
+        key = (self._profile_dir, self._stage, os.getpid(), threading.get_ident())
+        with _WORKER_PROFILERS_LOCK:
+            if key not in _WORKER_PROFILERS:
+                _WORKER_PROFILERS[key] = cProfile.Profile()
+            profiler = _WORKER_PROFILERS[key]
+
+        profiler.enable()
+        try:
+            return self._fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profile_name = f'{self._stage}_worker-{os.getpid()}-{threading.get_ident()}.prof'
+            profiler.dump_stats(os.path.join(self._profile_dir, profile_name))
+
+def merge_profiles(profile_dir: str) -> Dict[str, pstats.Stats]:
+    '''
+    Merges the parent and worker profiles of each stage in `profile_dir`.
+
+    Each stage's merged profile is saved as `merged_{stage}.prof` and
+    returned, keyed by stage.
+    '''
+    stage_paths: Dict[str, List[str]] = {}
+    for filename in sorted(os.listdir(profile_dir)):
+        if not filename.endswith('.prof') or filename.startswith(MERGED_PROFILE_PREFIX): continue
+        stage = filename.rsplit('_', 1)[0]
+        stage_paths.setdefault(stage, []).append(os.path.join(profile_dir, filename))
+
+    merged = {}
+    for stage, paths in stage_paths.items():
+        stats = pstats.Stats(paths[0])
+        for path in paths[1:]:
+            stats.add(path)
+        stats.dump_stats(os.path.join(profile_dir, f'{MERGED_PROFILE_PREFIX}{stage}.prof'))
+        merged[stage] = stats
+    return merged
+
+def summarize_profile(stats: pstats.Stats, top_n: int = DEFAULT_SUMMARY_SIZE) -> List[dict]:
+    '''
+    Returns the `top_n` functions of a profile by cumulative time.
+    '''
+    rows = []
+    for (filename, line, fn_name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}({fn_name})',
+            'ncalls': ncalls,
+            'tottime': tottime,
+            'cumtime': cumtime,
+        })
+    rows = sorted(rows, key=lambda r: r['cumtime'], reverse=True)[:top_n]
+    for r in rows:
+        r['tottime'] = f"{r['tottime']:.3f}"
+        r['cumtime'] = f"{r['cumtime']:.3f}"
+    return rows
@@ -0,0 +1,184 @@
+'''
+This file contains functions used to split very long texts into
+overlapping segments, so each segment can be parsed and featurized
+separately (and by different workers), and to map the features of the
+segments back to their original texts.
+
+Every segment has a core: the tokens it "owns". Cores do not overlap
+and cover the whole text. Around its core, a segment holds at least
+`overlap` tokens of context on each side (unless the text ends first),
+so an ngram centered on a core token sees the same words as it would
+in the whole text when `overlap` is at least its context size.
+
+Segments are cut between whitespace-separated tokens, so spaCy's
+tokenizer produces the same tokens for a segment as for the same span
+of the whole text. The tagger and parser, however, only see the
+segment: the part-of-speech of a word close to the edge of a segment
+(and the sentence boundaries around it) can differ from the whole
+text's, which a larger `overlap` makes less likely.
+'''
+
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import numpy as np
+from utilities.import_utilities import lazy_import
+from utilities.parse_scheduling_utilities import estimate_token_counts
+
+pd = lazy_import('pandas')
+
+# Columns added to a DataFrame by `segment_long_texts`.
+SEGMENT_SENT_ID_COLUMN = 'segment_sent_id'
+SEGMENT_CORE_START_COLUMN = 'segment_core_start'
+SEGMENT_CORE_END_COLUMN = 'segment_core_end'
+SEGMENT_OFFSET_COLUMN = 'segment_offset'
+SEGMENT_COLUMNS = [SEGMENT_SENT_ID_COLUMN, SEGMENT_CORE_START_COLUMN, SEGMENT_CORE_END_COLUMN, SEGMENT_OFFSET_COLUMN]
+
+
+def get_segment_spans(tokens, max_tokens: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    '''
+    Splits a sequence of spaCy tokens (e.g. a Doc made by `nlp.tokenizer`)
+    into segments of about `max_tokens` tokens and returns the
+    `(start, core_start, core_end, end)` token positions of each segment.
+
+    Cores hold `max_tokens - 2 * overlap` tokens (the last one may hold
+    fewer). Segments extend their core by at least `overlap` tokens on each
+    side, and further where needed to start and end at whitespace.
+    '''
+    core_size = max_tokens - 2 * overlap
+    if core_size < 1:
+        raise ValueError('The maximum number of tokens per segment must be larger than twice the overlap.')
+
+    num_tokens = len(tokens)
+    # A segment can start (or end) before token `i` if whitespace separates it from token `i - 1`.
+    can_cut = np.zeros(num_tokens + 1, dtype=bool)
+    can_cut[0] = can_cut[num_tokens] = True
+    for i in range(1, num_tokens):
+        can_cut[i] = bool(tokens[i - 1].whitespace_) and not tokens[i].is_space
+
+    spans = []
+    core_start = 0
+    while core_start < num_tokens:
+        core_end = min(core_start + core_size, num_tokens)
+        start = max(0, core_start - overlap)
+        while not can_cut[start]: start -= 1
+        end = min(num_tokens, core_end + overlap)
+        while not can_cut[end]: end += 1
+        spans.append((start, core_start, core_end, end))
+        core_start = core_end
+    return spans
+
+def segment_long_texts(df: pd.DataFrame, column_name: str, max_tokens: int, overlap: int, tokenizer=None) -> pd.DataFrame:
+    '''
+    Replaces every row of `df` whose text (in column `column_name`) is
+    estimated to hold more than `max_tokens` tokens (see
+    `parse_scheduling_utilities.estimate_token_counts`) with one row per
+    segment (see `get_segment_spans`), in order. Other columns are copied
+    to every segment.
+
+    If any text is segmented, the returned DataFrame has a new index
+    (0, 1, ...) and the `SEGMENT_COLUMNS`: the index of the original row
+    (`segment_sent_id`), the positions of the segment's core in the
+    segment (`segment_core_start` and `segment_core_end`, -1 for the end
+    of the text) and the position of the segment's first token in the
+    original text (`segment_offset`). Rows that are not segmented are a
+    single segment whose core is the whole text. Otherwise, `df` is
+    returned unchanged.
+
+    `tokenizer` defaults to the spaCy model's tokenizer.
+    '''
+    texts = df.loc[:, column_name]
+    long_positions = np.flatnonzero(estimate_token_counts(texts) > max_tokens)
+    if len(long_positions) == 0: return df
+    if tokenizer is None:
+        from utilities.spacy_utilities import Spacy_Manager
+        tokenizer = Spacy_Manager.get_nlp().tokenizer
+
+    row_positions, segment_texts = [], []
+    core_starts, core_ends, offsets = [], [], []
+    segment_spans = {p: _split_text(texts.iloc[p], tokenizer, max_tokens, overlap) for p in long_positions}
+    for p in range(df.shape[0]):
+        spans = segment_spans[p] if p in segment_spans else [(texts.iloc[p], 0, -1, 0)]
+        for segment_text, core_start, core_end, offset in spans:
+            row_positions.append(p)
+            segment_texts.append(segment_text)
+            core_starts.append(core_start)
+            core_ends.append(core_end)
+            offsets.append(offset)
+
+    segmented_df = df.iloc[row_positions].copy()
+    segmented_df.loc[:, column_name] = segment_texts
+    segmented_df[SEGMENT_SENT_ID_COLUMN] = segmented_df.index
+    segmented_df[SEGMENT_CORE_START_COLUMN] = np.array(core_starts, dtype=np.int64)
+    segmented_df[SEGMENT_CORE_END_COLUMN] = np.array(core_ends, dtype=np.int64)
+    segmented_df[SEGMENT_OFFSET_COLUMN] = np.array(offsets, dtype=np.int64)
+    segmented_df.index = range(segmented_df.shape[0])
+    return segmented_df
+
+def _split_text(text: str, tokenizer, max_tokens: int, overlap: int) -> List[Tuple[str, int, int, int]]:
+    '''
+    Returns the text of each segment of `text`, with the positions of its
+    core (in the segment) and of its first token (in `text`).
+    '''
+    tokens = tokenizer(text)
+    if len(tokens) <= max_tokens:
+        return [(text, 0, -1, 0)]
+
+    segments = []
+    for start, core_start, core_end, end in get_segment_spans(tokens, max_tokens, overlap):
+        last_token = tokens[end - 1]
+        segment_text = text[tokens[start].idx:last_token.idx + len(last_token.text)]
+        segments.append((segment_text, core_start - start, core_end - start, start))
+    return segments
+
+def concat_segments(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    '''
+    Concatenates DataFrames returned by `segment_long_texts` (segmented or
+    not) into one segmented DataFrame with a new index (0, 1, ...). Rows
+    that were not segmented become a single segment whose core is the
+    whole text.
+    '''
+    segmented_dfs = []
+    for df in dfs:
+        if not is_segmented(df):
+            df = df.copy()
+            df[SEGMENT_SENT_ID_COLUMN] = df.index
+            df[SEGMENT_CORE_START_COLUMN] = np.zeros(df.shape[0], dtype=np.int64)
+            df[SEGMENT_CORE_END_COLUMN] = np.full(df.shape[0], -1, dtype=np.int64)
+            df[SEGMENT_OFFSET_COLUMN] = np.zeros(df.shape[0], dtype=np.int64)
+        segmented_dfs.append(df)
+    return pd.concat(segmented_dfs, ignore_index=True)
+
+def is_segmented(df: pd.DataFrame) -> bool:
+    return SEGMENT_SENT_ID_COLUMN in df.columns
+
+def get_sent_ids(df: pd.DataFrame) -> pd.Index:
+    '''
+    Returns the index of the original row of every row of `df`: its
+    `segment_sent_id` if `df` was segmented, or its index otherwise.
+    '''
+    if not is_segmented(df): return df.index
+    return pd.Index(df.loc[:, SEGMENT_SENT_ID_COLUMN])
+
+def get_core_idx_filters(df: pd.DataFrame, sp_docs, idx_filters: List[Optional[list]]) -> List[np.ndarray]:
+    '''
+    Restricts each Doc's `idx_filter` (None for every position) to the
+    positions in its segment's core.
+    '''
+    core_filters = []
+    for d, idx_filter, core_start, core_end in zip(
+        sp_docs, idx_filters, df.loc[:, SEGMENT_CORE_START_COLUMN], df.loc[:, SEGMENT_CORE_END_COLUMN]):
+        core_end = len(d) if core_end < 0 else min(core_end, len(d))
+        if idx_filter is None:
+            core_filters.append(np.arange(core_start, core_end, dtype=np.int64))
+        else:
+            idx_filter = np.asarray(idx_filter, dtype=np.int64)
+            core_filters.append(idx_filter[(idx_filter >= core_start) & (idx_filter < core_end)])
+    return core_filters
+
+def get_segment_offsets(df: pd.DataFrame) -> np.ndarray:
+    '''
+    Returns the position, in its original text, of the first token of each
+    segment in `df`.
+    '''
+    if not is_segmented(df): return np.zeros(df.shape[0], dtype=np.int64)
+    return df.loc[:, SEGMENT_OFFSET_COLUMN].to_numpy(dtype=np.int64)
@@ -0,0 +1,121 @@
+'''
+This file contains functions used to split an input table into
+index-range shards that can be processed independently (by separate
+process groups or hosts) and to merge the resulting output shards.
+'''
+
+import sqlite3
+from typing import List, Optional, Tuple
+from utilities.database_utilities import TableSaver, load_df, remove_existing_table, table_exists
+
+def get_shard_ranges(
+    conn: sqlite3.Connection,
+    table_name: str,
+    num_shards: int,
+    max_index: Optional[int] = None,
+    index_col = 'index') -> List[Tuple[Optional[int], Optional[int]]]:
+    '''
+    Splits `table_name` into `num_shards` contiguous index ranges holding
+    (roughly) the same number of rows.
+
+    Returns a list of `(start_index, end_index)` tuples, where each range
+    includes `start_index` and excludes `end_index`. The first range starts
+    at None. Ranges are ordered by index.
+
+    If `max_index` is provided, only rows up to and including it are split
+    and the last range ends just after it. Shards computed on different hosts
+    then agree on their ranges even if rows are appended in between; the
+    appended rows are left out of the run. Without `max_index`, the last
+    range ends at None and the ranges depend on the rows present when they
+    are computed.
+    '''
+    if num_shards < 1:
+        raise ValueError('The number of shards must be at least 1.')
+
+    cur = conn.cursor()
+    if max_index is None:
+        where, where_args = '', ()
+    else:
+        where, where_args = 'WHERE "{}" <= ?'.format(index_col), (max_index,)
+    num_rows = cur.execute(
+        'SELECT COUNT(*) FROM "{}" {}'.format(table_name, where), where_args).fetchone()[0]
+
+    boundaries = []
+    for shard_id in range(1, num_shards):
+        offset = (num_rows * shard_id) // num_shards
+        row = cur.execute(
+            'SELECT "{0}" FROM "{1}" {2} ORDER BY "{0}" LIMIT 1 OFFSET ?'.format(index_col, table_name, where),
+            where_args + (offset,)).fetchone()
+        if row is not None and (len(boundaries) == 0 or row[0] > boundaries[-1]):
+            boundaries.append(row[0])
+
+    starts = [None] + boundaries
+    ends = boundaries + [None if max_index is None else max_index + 1]
+    ranges = list(zip(starts, ends))
+
+    # Small tables can produce fewer distinct boundaries than shards; the
+    # remaining shards are given empty ranges so every shard id is valid.
+    while len(ranges) < num_shards:
+        ranges.append((0, 0))
+    return ranges
+
+def get_shard_table_name(table_name: str, shard_id: int, num_shards: int) -> str:
+    '''
+    Returns the name of the table a shard writes its output to.
+    '''
+    return f'{table_name}_shard-{shard_id}-of-{num_shards}'
+
+def merge_shards(
+    conn: sqlite3.Connection,
+    table_name: str,
+    num_shards: int,
+    shard_database_paths: Optional[List[str]] = None,
+    chunksize: int = 50000,
+    remove_shard_tables: bool = True,
+    **table_saver_kwargs):
+    '''
+    Concatenates the output shards of `table_name` (in shard order) into a
+    single table, `table_name`, in the database behind `conn`.
+
+    Each shard's rows are re-indexed so the merged table has globally
+    contiguous row indices, exactly as an unsharded `Pipeline.start` run
+    would have produced.
+
+    `shard_database_paths` can list a database for each shard, for shards
+    written on other hosts. By default, all shards are read from `conn`.
+    Shard tables are dropped once merged unless `remove_shard_tables` is False.
+
+    The merged table is written by a `TableSaver`, which receives any
+    `table_saver_kwargs` (e.g. `indexes` to create once the merge completes).
+    '''
+    if shard_database_paths is not None and len(shard_database_paths) != num_shards:
+        raise ValueError('A database path must be provided for every shard.')
+
+    remove_existing_table(table_name, conn)
+    table_saver = TableSaver(conn, table_name, **table_saver_kwargs)
+
+    start_idx = 0
+    for shard_id in range(num_shards):
+        shard_table_name = get_shard_table_name(table_name, shard_id, num_shards)
+        if shard_database_paths is not None:
+            shard_conn = sqlite3.connect(shard_database_paths[shard_id])
+        else:
+            shard_conn = conn
+
+        if not table_exists(shard_conn, shard_table_name):
+            # Shards with no input rows never create an output table.
+            print(f'Shard table {shard_table_name} does not exist. Continuing without it.')
+        else:
+            for shard_df in load_df(shard_conn, shard_table_name, chunksize=chunksize):
+                shard_df.index = range(start_idx, start_idx + shard_df.shape[0])
+                table_saver(shard_df)
+                start_idx += shard_df.shape[0]
+
+            if remove_shard_tables:
+                remove_existing_table(shard_table_name, shard_conn)
+
+        if shard_conn is not conn: shard_conn.close()
+
+    table_saver.finalize()
+
+    print(f'Merged {num_shards} shards into {table_name} ({start_idx} rows).')
@@ -1,34 +1,166 @@
 '''
 This file contains utilities for spaCy.
+
+spaCy is only imported, and the model only loaded, when a Doc is
+first parsed or the model is first used (see `Spacy_Manager.get_nlp`).
 '''
 
-import spacy
+from itertools import chain
+import threading
 import numpy as np
+from utilities.parse_scheduling_utilities import DEFAULT_MAX_BATCH_TOKENS, estimate_token_counts, restore_order, schedule_batches
 
 class Spacy_Manager:
-    _nlp = spacy.load('en_core_web_lg')
+    model_name = 'en_core_web_lg'
+    _nlp = None
+    _load_lock = threading.Lock()
+    # Held while parsing when several threads share the model.
+    lock = threading.Lock()
+
+    # `nlp.pipe` settings (see `configure`).
+    batch_size = 1000
+    n_process = 2
+    max_batch_tokens = DEFAULT_MAX_BATCH_TOKENS
+    length_bucketing = False
     def __init__(self):
         return
 
     @classmethod
-    def generate_docs(cls, texts, batch_size=1000, n_threads=2):
-        return cls._nlp.pipe(texts, batch_size=batch_size, n_process=n_threads)
+    def get_nlp(cls):
+        ''' Returns the spaCy model, loading it the first time it is used. '''
+        if cls._nlp is None:
+            with cls._load_lock:
+                if cls._nlp is None:
+                    import spacy
+                    cls._nlp = spacy.load(cls.model_name)
+        return cls._nlp
+
+    @classmethod
+    def configure(cls, batch_size=None, n_process=None, max_batch_tokens=None, length_bucketing=None):
+        '''
+        Sets the default parsing settings used by `generate_docs`, e.g. from
+        the "spacy" section of `parameters.json`. Settings left as None are
+        unchanged. `length_bucketing` requires `n_process` to be 1.
+        '''
+        n_process = cls.n_process if n_process is None else n_process
+        length_bucketing = cls.length_bucketing if length_bucketing is None else length_bucketing
+        _check_length_bucketing(n_process, length_bucketing)
+        if batch_size is not None: cls.batch_size = batch_size
+        cls.n_process = n_process
+        if max_batch_tokens is not None: cls.max_batch_tokens = max_batch_tokens
+        cls.length_bucketing = length_bucketing
+
+    @classmethod
+    def get_parse_settings(cls) -> dict:
+        ''' Returns the current batch settings, as keyword arguments of `generate_docs`. '''
+        return {
+            'batch_size': cls.batch_size,
+            'max_batch_tokens': cls.max_batch_tokens,
+            'length_bucketing': cls.length_bucketing,
+        }
+
+    @classmethod
+    def generate_docs(cls, texts, batch_size=None, n_threads=None, max_batch_tokens=None, length_bucketing=None):
+        '''
+        Parses `texts` with `nlp.pipe` and returns their Docs, in order.
+        Settings left as None use the values set with `configure`.
+
+        With `length_bucketing`, texts are grouped into batches of similar
+        length holding at most `max_batch_tokens` (estimated) tokens and at
+        most `batch_size` texts (see `utilities.parse_scheduling_utilities`),
+        instead of batches of `batch_size` texts in input order. Docs are
+        returned in the original order once every text is parsed.
+
+        Length bucketing requires a single process (`n_threads` of 1), as in
+        the Pipeline's workers: with several processes, `nlp.pipe` only takes
+        a single batch size, and spaCy would start and stop its processes for
+        every scheduled batch.
+        '''
+        batch_size = cls.batch_size if batch_size is None else batch_size
+        n_process = cls.n_process if n_threads is None else n_threads
+        max_batch_tokens = cls.max_batch_tokens if max_batch_tokens is None else max_batch_tokens
+        length_bucketing = cls.length_bucketing if length_bucketing is None else length_bucketing
+        _check_length_bucketing(n_process, length_bucketing)
+        if not length_bucketing:
+            return cls.get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process)
+
+        texts = list(texts)
+        batches = schedule_batches(estimate_token_counts(texts), max_batch_tokens, batch_size)
+        scheduled_docs = chain.from_iterable(
+            cls.get_nlp().pipe([texts[i] for i in b], batch_size=len(b)) for b in batches)
+        return iter(restore_order(scheduled_docs, batches))
+
+    @classmethod
+    def get_model_name(cls) -> str:
+        ''' Returns the name and version of the loaded model, e.g. "en_core_web_lg-3.8.0". '''
+        meta = cls.get_nlp().meta
+        return f"{meta['lang']}_{meta['name']}-{meta['version']}"
+
+    @classmethod
+    def get_vector_size(cls) -> int:
+        ''' Returns the length of the model's word vectors (300 for `en_core_web_lg`). '''
+        return cls.get_nlp().vocab.vectors_length
 
-def get_doc_vectors(docs):
-    ''' Returns word vectors for all texts in `docs` using spaCy '''
-    return np.stack([d.vector for d in docs])
+def _check_length_bucketing(n_process: int, length_bucketing: bool):
+    if length_bucketing and n_process != 1:
+        raise ValueError('Length bucketing requires spaCy\'s "n_process" to be 1; parse in the Pipeline\'s workers instead.')
+
+def get_doc_vectors(docs, dtype=np.float32):
+    '''
+    Returns word vectors for all texts in `docs` using spaCy.
+    The vectors are written into a single preallocated array of `dtype`.
+    '''
+    docs = list(docs)
+    vector_size = docs[0].vocab.vectors_length if len(docs) > 0 else 0
+    doc_vectors = np.empty((len(docs), vector_size), dtype=dtype)
+    for i, d in enumerate(docs):
+        doc_vectors[i] = get_token_vectors(d).mean(axis=0) if len(d) > 0 else 0
+    return doc_vectors
+
+def get_token_vectors(doc) -> np.ndarray:
+    '''
+    Returns a (`len(doc)`, vector size) matrix holding the word vector of
+    every token in `doc`, looked up from the vocabulary in a single step.
+    Tokens without a vector are given zeros, as with `Token.vector`.
+    '''
+    vectors = doc.vocab.vectors
+    if vectors.mode != 'default':
+        # Other vector modes (e.g. floret) compute vectors from subwords.
+        return np.array([t.vector for t in doc], dtype=np.float32).reshape(len(doc), -1)
+
+    if vectors.shape[0] == 0 or len(doc) == 0:
+        return np.zeros((len(doc), vectors.shape[1]), dtype=np.float32)
+
+    rows = vectors.find(keys=doc.to_array(vectors.attr))
+    token_vectors = np.asarray(vectors.data)[rows]
+    token_vectors[rows < 0] = 0
+    return token_vectors
 
 def get_doc_vector(doc):
     ''' spaCy `doc` returns mean of word vectors in `doc` '''
     return doc.vector
 
 def get_doc_tokens(docs):
+    ''' Returns the tag of every token in `docs`. All Docs must have the same length. '''
     tags = []
     for d in docs:
         doc_tags = [t.tag for t in d]
         tags.append(doc_tags)
     return np.stack(tags)
 
+def get_ragged_doc_tokens(docs):
+    '''
+    Returns the tag of every token in `docs` as a flat array, along with
+    an offsets array: the tags of the `i`th Doc are `tags[offsets[i]:offsets[i + 1]]`.
+    Unlike `get_doc_tokens`, Docs can have different lengths.
+    '''
+    from spacy.attrs import TAG
+    doc_tags = [d.to_array(TAG) for d in docs]
+    offsets = np.zeros(len(doc_tags) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(t) for t in doc_tags])
+    tags = np.concatenate(doc_tags) if len(doc_tags) > 0 else np.empty(0, dtype=np.uint64)
+    return tags, offsets
+
 '''
 Links:
 https://stackoverflow.com/questions/53118666/spacy-convert-token-type-into-list
@@ -0,0 +1,89 @@
+'''
+This file contains a helper used to collect large amounts of
+DataFrame output without holding all of it in memory.
+'''
+
+from __future__ import annotations
+import os
+import tempfile
+from typing import Iterator, List, Optional
+from utilities.import_utilities import lazy_import
+
+pd = lazy_import('pandas')
+
+class DataFrameSpool:
+    '''
+    Collects DataFrames (in order) while keeping at most `memory_budget`
+    bytes of them in memory. Whenever the DataFrames held in memory exceed
+    the budget, they are written to a temporary file on disk.
+
+    Iterating over the spool yields the collected data in its original
+    order, one piece at a time: consecutive in-memory DataFrames are yielded
+    together and each spilled file is read back (and deleted) on its own,
+    so the data never has to be concatenated into a single DataFrame.
+
+    Call `close` to remove any spilled files that were not read back.
+    '''
+    def __init__(self, memory_budget: int, spill_directory: Optional[str] = None):
+        self._memory_budget = memory_budget
+        self._spill_directory = spill_directory
+        self._temp_dir: Optional[tempfile.TemporaryDirectory] = None
+
+        # Each piece is either a list of in-memory DataFrames or a spill file path.
+        self._pieces: List = []
+        self._in_memory_dfs: List[pd.DataFrame] = []
+        self._in_memory_bytes = 0
+
+        self.total_bytes = 0
+        self.num_spills = 0
+
+    def append(self, df: pd.DataFrame):
+        df_bytes = get_df_size(df)
+        self._in_memory_dfs.append(df)
+        self._in_memory_bytes += df_bytes
+        self.total_bytes += df_bytes
+
+        if self._in_memory_bytes > self._memory_budget:
+            self._spill()
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        if len(self._in_memory_dfs) > 0:
+            self._pieces.append(self._in_memory_dfs)
+            self._in_memory_dfs = []
+            self._in_memory_bytes = 0
+
+        while len(self._pieces) > 0:
+            piece = self._pieces.pop(0)
+            if isinstance(piece, str):
+                df = pd.read_pickle(piece)
+                os.remove(piece)
+                yield df
+            else:
+                yield pd.concat(piece, ignore_index=True, axis=0)
+        self.close()
+
+    def close(self):
+        self._pieces = []
+        self._in_memory_dfs = []
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+            self._temp_dir = None
+
+    def _spill(self):
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.TemporaryDirectory(prefix='pipeline_spill_', dir=self._spill_directory)
+
+        spill_path = os.path.join(self._temp_dir.name, f'{self.num_spills}.pkl')
+        pd.concat(self._in_memory_dfs, ignore_index=True, axis=0).to_pickle(spill_path)
+        self._pieces.append(spill_path)
+        self.num_spills += 1
+
+        self._in_memory_dfs = []
+        self._in_memory_bytes = 0
+
+def get_df_size(df: pd.DataFrame) -> int:
+    '''
+    Returns the memory used by `df` in bytes, including the contents
+    of string (object) columns.
+    '''
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -0,0 +1,75 @@
+'''
+This file contains functions used to process only the rows appended
+to an input table since its output was last written.
+
+A watermark records, for an output table, the highest input `index`
+it includes and a fingerprint of the settings it was created with.
+Watermarks are stored in the output table's database.
+'''
+
+import datetime
+import hashlib
+import json
+import sqlite3
+from typing import Optional
+
+WATERMARK_TABLE_NAME = 'pipeline_watermarks'
+
+
+def get_config_fingerprint(config: dict) -> str:
+    '''
+    Returns a short hash of `config`, which must be JSON-serializable
+    (values that are not are converted to strings). Key order does not matter.
+    '''
+    config_str = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(config_str.encode('utf-8')).hexdigest()[:16]
+
+def load_watermark(conn: sqlite3.Connection, output_table_name: str) -> Optional[dict]:
+    '''
+    Returns the watermark of `output_table_name` as a dictionary with
+    `input_table_name`, `max_input_index`, `config_fingerprint` and
+    `updated_at` keys, or None if the table has no watermark.
+    '''
+    _create_watermark_table(conn)
+    row = conn.execute(
+        'SELECT input_table_name, max_input_index, config_fingerprint, updated_at FROM "{}" WHERE output_table_name = ?'.format(WATERMARK_TABLE_NAME),
+        (output_table_name,)).fetchone()
+    if row is None: return None
+    return {
+        'input_table_name': row[0],
+        'max_input_index': row[1],
+        'config_fingerprint': row[2],
+        'updated_at': row[3],
+    }
+
+def save_watermark(
+    conn: sqlite3.Connection,
+    output_table_name: str,
+    input_table_name: str,
+    max_input_index: int,
+    config_fingerprint: str):
+    '''
+    Records that `output_table_name` includes every row of `input_table_name`
+    up to (and including) `max_input_index`, created with the settings
+    behind `config_fingerprint`. Replaces any existing watermark.
+    '''
+    _create_watermark_table(conn)
+    conn.execute(
+        'INSERT OR REPLACE INTO "{}" VALUES (?, ?, ?, ?, ?)'.format(WATERMARK_TABLE_NAME),
+        (output_table_name, input_table_name, max_input_index, config_fingerprint, str(datetime.datetime.now())))
+    conn.commit()
+
+def remove_watermark(conn: sqlite3.Connection, output_table_name: str):
+    _create_watermark_table(conn)
+    conn.execute('DELETE FROM "{}" WHERE output_table_name = ?'.format(WATERMARK_TABLE_NAME), (output_table_name,))
+    conn.commit()
+
+def _create_watermark_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS "{}" (
+            output_table_name TEXT PRIMARY KEY,
+            input_table_name TEXT,
+            max_input_index INTEGER,
+            config_fingerprint TEXT,
+            updated_at TEXT
+        )'''.format(WATERMARK_TABLE_NAME))
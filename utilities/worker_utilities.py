@@ -0,0 +1,278 @@
+'''
+This file contains utilities for starting Pipeline worker processes
+from a preloaded parent, so that large, read-only state (the spaCy
+model, stopword sets and translate tables) is shared copy-on-write
+instead of being loaded or copied by every worker.
+'''
+
+import gc
+import inspect
+import multiprocessing
+from multiprocessing.pool import INIT, Pool as mp_Pool, worker as pool_worker
+import os
+import queue
+import signal
+import sys
+import time
+from processing_functions import text_preprocessing as tp
+from utilities.logging_utilities import get_fn_name
+from utilities.spacy_utilities import Spacy_Manager
+
+# Modules imported by the fork server before it forks any workers.
+FORKSERVER_PRELOAD_MODULES = ['utilities.forkserver_preload']
+WORKER_STARTUP_TIMEOUT = 300
+# Recycling workers by memory (see `_RecyclingQueue`) hooks into private parts
+# of `multiprocessing.pool`: the `Pool.Process` static method (which takes the
+# context since Python 3.8), the arguments of the `worker` loop, and the loop
+# putting each result on its outqueue before it takes the next task. It has
+# been checked on these Python versions (inclusive); on others,
+# `max_worker_memory_mb` is ignored.
+MEMORY_RECYCLING_PYTHON_VERSIONS = ((3, 8), (3, 13))
+
+# Set in each worker by `_initialize_worker`.
+_task_report_queue = None
+_max_worker_memory_mb = None
+
+
+def preload_worker_state():
+    '''
+    Loads the state every worker needs, so forked workers inherit it.
+    '''
+    Spacy_Manager.get_nlp()
+    tp.get_punctuation_table()
+    try:
+        tp.get_stopword_set()
+    except LookupError:
+        print('NLTK stopwords are not available. Continuing without preloading them.')
+
+def supports_memory_recycling() -> bool:
+    '''
+    Returns whether this Python's `multiprocessing.pool` matches the
+    internals that `max_worker_memory_mb` relies on.
+    '''
+    min_version, max_version = MEMORY_RECYCLING_PYTHON_VERSIONS
+    if not min_version <= sys.version_info[:2] <= max_version: return False
+    return list(inspect.signature(pool_worker).parameters)[:2] == ['inqueue', 'outqueue']
+
+def freeze_gc():
+    '''
+    Moves every object tracked by the garbage collector into a permanent
+    generation. Otherwise, collections in a forked worker write to the
+    reference counts and GC headers of inherited objects, which unshares
+    the memory pages holding them.
+    '''
+    gc.collect()
+    gc.freeze()
+
+class WorkerPool(mp_Pool):
+    '''
+    A `multiprocessing.Pool` that can start its workers from a preloaded
+    parent and reports how long each worker took to start and how much
+    private (unshared) memory it uses.
+
+    `start_method` is a `multiprocessing` start method:
+    - `"fork"`: with `preload`, the parent loads the worker state and freezes
+    the garbage collector before forking, so workers share the model's pages.
+    - `"forkserver"`: with `preload`, the fork server loads the worker state
+    once and every worker is forked from it.
+    - `"spawn"`: every worker starts a fresh interpreter and loads its own state.
+    - None: the platform's default start method.
+
+    Workers are replaced by new ones after `maxtasksperchild` tasks, or as
+    soon as a task leaves them using more than `max_worker_memory_mb` MB of
+    private memory (checked after the task's result is sent, so no work is
+    lost). Memory recycling is only available on the Python versions in
+    `MEMORY_RECYCLING_PYTHON_VERSIONS`. A worker running a `TrackedTask`
+    that hangs can be killed with `kill_task_worker`; the pool replaces it
+    as well.
+    '''
+    def __init__(self, processes: int, start_method=None, preload=False, maxtasksperchild=None, max_worker_memory_mb=None):
+        # `Pool.__del__` reads the state, even if the pool failed to start.
+        self._state = INIT
+        self._froze_gc = False
+        try:
+            context = multiprocessing.get_context(start_method)
+            if preload:
+                if context.get_start_method() == 'fork':
+                    preload_worker_state()
+                    freeze_gc()
+                    self._froze_gc = True
+                elif context.get_start_method() == 'forkserver':
+                    context.set_forkserver_preload(FORKSERVER_PRELOAD_MODULES)
+
+            self._startup_queue = context.Queue()
+            self._num_workers = processes
+            # Reports from `TrackedTask`s and recycled workers; see `_read_task_reports`.
+            self._task_queue = context.Queue()
+            self._task_pids = dict()
+            self._num_recycled = 0
+            if max_worker_memory_mb is not None:
+                if supports_memory_recycling():
+                    # Replaces `Pool.Process` for this pool only.
+                    self.Process = _create_recycling_process
+                else:
+                    print(f'Recycling workers by memory is not supported on Python {sys.version.split()[0]}. Ignoring max_worker_memory_mb.')
+                    max_worker_memory_mb = None
+            super().__init__(
+                processes,
+                initializer=_initialize_worker,
+                initargs=(self._startup_queue, time.time(), self._task_queue, max_worker_memory_mb, preload),
+                maxtasksperchild=maxtasksperchild,
+                context=context)
+        except BaseException:
+            # Otherwise the parent's garbage collector stays frozen.
+            if self._froze_gc:
+                gc.unfreeze()
+                self._froze_gc = False
+            raise
+
+    def get_startup_report(self, timeout: float = WORKER_STARTUP_TIMEOUT) -> dict:
+        '''
+        Waits for every worker to start and returns a summary of their
+        startup time (in seconds) and private memory (in MB).
+        '''
+        reports = []
+        deadline = time.time() + timeout
+        while len(reports) < self._num_workers:
+            try:
+                reports.append(self._startup_queue.get(timeout=max(0.0, deadline - time.time())))
+            except queue.Empty:
+                break
+
+        if len(reports) == 0:
+            return {'Workers Started': '0'}
+        startup_seconds = [r['startup_seconds'] for r in reports]
+        private_mb = [r['private_mb'] for r in reports]
+        return {
+            'Workers Started': f'{len(reports)}',
+            'Mean Startup Seconds': f'{sum(startup_seconds) / len(reports):.3f}',
+            'Max Startup Seconds': f'{max(startup_seconds):.3f}',
+            'Mean Private Memory (MB)': f'{sum(private_mb) / len(reports):.1f}',
+            'Max Private Memory (MB)': f'{max(private_mb):.1f}',
+        }
+
+    def kill_task_worker(self, task_id) -> bool:
+        '''
+        Kills the worker running the `TrackedTask` call `task_id` (e.g. after
+        it timed out) and returns whether a worker was killed. The pool starts
+        a replacement, but the call's result never arrives.
+        '''
+        self._read_task_reports()
+        pid = self._task_pids.pop(task_id, None)
+        if pid is None or pid not in [w.pid for w in self._pool if w.exitcode is None]:
+            return False
+        os.kill(pid, signal.SIGKILL)
+        print(f'Killed worker {pid}.')
+        return True
+
+    def forget_task(self, task_id):
+        '''
+        Stops tracking the worker of `task_id`, once its result has arrived.
+        '''
+        self._read_task_reports()
+        self._task_pids.pop(task_id, None)
+
+    def get_num_recycled_workers(self) -> int:
+        '''
+        Returns the number of workers replaced for using too much memory.
+        '''
+        self._read_task_reports()
+        return self._num_recycled
+
+    def _read_task_reports(self):
+        while True:
+            try:
+                report, task_id, pid = self._task_queue.get_nowait()
+            except queue.Empty:
+                return
+            if report == 'start':
+                self._task_pids[task_id] = pid
+            elif report == 'recycle':
+                self._num_recycled += 1
+
+    def terminate(self):
+        super().terminate()
+        if self._froze_gc:
+            gc.unfreeze()
+            self._froze_gc = False
+
+def get_private_memory_mb() -> float:
+    '''
+    Returns the memory used only by this process (not shared with its
+    parent or siblings), in MB. Falls back to the resident set size where
+    `/proc/self/smaps_rollup` is not available.
+    '''
+    try:
+        private_kb = 0
+        with open('/proc/self/smaps_rollup') as fp:
+            for line in fp:
+                if line.startswith('Private_Clean:') or line.startswith('Private_Dirty:'):
+                    private_kb += int(line.split()[1])
+        return private_kb / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class TrackedTask:
+    '''
+    Wraps a function run by a `WorkerPool`, so the pool knows which worker
+    runs each call: `TrackedTask(fn)(task_id, *args)` reports `task_id` and
+    the worker's pid, then returns `fn(*args)`. Outside a `WorkerPool`
+    worker (e.g. in a thread pool), nothing is reported.
+    '''
+    def __init__(self, fn):
+        self._fn = fn
+        self.__name__ = get_fn_name(fn)
+
+    def __call__(self, task_id, *args):
+        if _task_report_queue is not None:
+            _task_report_queue.put(('start', task_id, os.getpid()))
+        return self._fn(*args)
+
+class _RecyclingQueue:
+    '''
+    Stands in for a worker's result queue. Once a result is sent, the worker
+    exits if it uses more than `max_worker_memory_mb` MB of private memory.
+
+    The stdlib `worker` loop puts each result on this queue before it takes
+    the next task, so exiting here loses no work, and the pool replaces the
+    worker as it does after `maxtasksperchild` tasks. This relies on the
+    internals listed with `MEMORY_RECYCLING_PYTHON_VERSIONS`.
+    '''
+    def __init__(self, outqueue):
+        self._outqueue = outqueue
+
+    def __getattr__(self, attr: str):
+        return getattr(self._outqueue, attr)
+
+    def put(self, obj):
+        self._outqueue.put(obj)
+        if _max_worker_memory_mb is None: return
+        private_mb = get_private_memory_mb()
+        if private_mb > _max_worker_memory_mb:
+            print(f'Worker {os.getpid()} uses {private_mb:.1f} MB of private memory. Replacing it.')
+            _task_report_queue.put(('recycle', None, os.getpid()))
+            # Nothing is in flight: the result is sent and the next task not yet taken.
+            sys.exit(0)
+
+def _run_worker(inqueue, outqueue, *args):
+    pool_worker(inqueue, _RecyclingQueue(outqueue), *args)
+
+def _create_recycling_process(ctx, *args, **kwds):
+    # Workers run `pool_worker` through `_run_worker`, which can recycle them.
+    kwds['target'] = _run_worker
+    return ctx.Process(*args, **kwds)
+
+def _initialize_worker(startup_queue, pool_created_at: float, task_queue, max_worker_memory_mb, preload: bool = False):
+    # The worker state is loaded lazily, on the first parse. With `preload`, it
+    # is loaded now, so the startup report includes it; a worker forked from a
+    # preloaded parent or fork server already has it and loads nothing.
+    if preload: preload_worker_state()
+    global _task_report_queue, _max_worker_memory_mb
+    _task_report_queue = task_queue
+    _max_worker_memory_mb = max_worker_memory_mb
+    startup_queue.put({
+        'pid': os.getpid(),
+        'startup_seconds': time.time() - pool_created_at,
+        'private_mb': get_private_memory_mb(),
+    })